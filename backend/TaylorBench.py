@@ -12,6 +12,7 @@ from TaylorOCR import (
     extract_serial_number,
     easyocr
 )
+from ocr_scheduler import OCRScheduler
 
 def is_image_file(file_path):
     """Check if the file is a valid image file."""
@@ -35,8 +36,10 @@ def is_image_file(file_path):
         return False
 
 class TaylorBenchmark:
-    def __init__(self):
+    def __init__(self, batched=False):
         self.reader = easyocr.Reader(['en'])
+        # Optionally route recognition through the micro-batching scheduler
+        self.scheduler = OCRScheduler(self.reader) if batched else None
         self.stats = {
             'total_images': 0,
             'successful_identifications': 0,
@@ -75,7 +78,10 @@ class TaylorBenchmark:
                 image_path = convert_to_jpg(image_path)
             
             # Read text from image
-            text = self.reader.readtext(image_path, detail=0)
+            if self.scheduler is not None:
+                text = self.scheduler.readtext(image_path, detail=0)
+            else:
+                text = self.reader.readtext(image_path, detail=0)
             result['extracted_text'] = text  # Store the extracted text
             
             # Check if it's a Taylor guitar
@@ -253,8 +259,10 @@ def main():
         sys.exit(1)
     
     # Run the benchmark
-    benchmark = TaylorBenchmark()
+    benchmark = TaylorBenchmark(batched='--batched' in sys.argv)
     benchmark.run_benchmark(taylor_dir)
+    if benchmark.scheduler is not None:
+        benchmark.scheduler.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Async (ASGI) implementation of the read-only scan lookup routes.
+
+Serves the same paths, filters and response shapes as main.py, and records
+by-tag scans in the same scan log, but on an async
+SQLAlchemy engine (aiosqlite) with a connection pool, so a burst of
+concurrent scans doesn't tie up one worker thread per DB wait. It also
+serves the /nfc/changes event stream (change_feed.py), where each open
+stream would otherwise hold a gunicorn thread for as long as it's open.
+
+    uvicorn asgi_app:app --port 7102
+"""
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import scan_log
+import change_feed
+from config import Config
+from serializers import INSTRUMENT_SELECT, dumps, instrument_row_to_dict, instrument_table, listing_criteria
+
+engine = create_async_engine(
+    Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', 'sqlite+aiosqlite:///', 1),
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=Config.ASYNC_DB_POOL_SIZE,
+    max_overflow=Config.ASYNC_DB_MAX_OVERFLOW
+)
+
+# Same settings as the Flask app; None while SCAN_LOG_ENABLED is off
+scans = scan_log.configure(vars(Config))
+
+changes = change_feed.ChangeFeed(
+    engine,
+    poll_ms=Config.CHANGE_FEED_POLL_MS,
+    queue_size=Config.CHANGE_FEED_QUEUE_SIZE,
+    retention=Config.CHANGE_LOG_RETENTION
+)
+
+async def fetch_one(*criteria):
+    async with engine.connect() as conn:
+        result = await conn.execute(INSTRUMENT_SELECT.where(*criteria).limit(1))
+        row = result.first()
+    return instrument_row_to_dict(row) if row else None
+
+async def get_instruments(request):
+    """Get all instruments, optionally filtered by manufacturer, storage_id, year range and tagged."""
+    try:
+        criteria = listing_criteria(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    async with engine.connect() as conn:
+        result = await conn.execute(INSTRUMENT_SELECT.where(*criteria).order_by(instrument_table.c.dbid))
+        rows = result.all()
+    return Response(dumps([instrument_row_to_dict(row) for row in rows]), media_type='application/json')
+
+async def get_instrument(request):
+    """Get instrument by dbid or tag_id."""
+    id = request.path_params['id']
+    instrument = (await fetch_one(instrument_table.c.dbid == id)
+                  or await fetch_one(instrument_table.c.tag_id == id))
+    if request.url.path.startswith('/nfc/instrument_by_tag/'):
+        # As in main.py: the scan is of the instrument paired with the tag, not the dbid match
+        paired = (instrument if instrument and instrument['tag_id'] == id
+                  else await fetch_one(instrument_table.c.tag_id == id))
+        # Only a queue put; it waits at most SCAN_LOG_BLOCK_MS when the writer is far behind
+        scan_log.record(id, paired['dbid'] if paired else None,
+                        request.headers.get('X-Reader-Id', request.client.host if request.client else None))
+    if not instrument:
+        return JSONResponse({"error": "Instrument not found"}, status_code=404)
+    return JSONResponse(instrument)
+
+async def instrument_exists(request):
+    """Check if an instrument exists for a given tag_id."""
+    instrument = await fetch_one(instrument_table.c.tag_id == request.path_params['tag_id'])
+    if instrument:
+        return JSONResponse({"exists": True, "instrument": instrument})
+    return JSONResponse({"exists": False})
+
+async def check_tag(request):
+    """Check if a tag ID is already paired with an instrument."""
+    instrument = await fetch_one(instrument_table.c.tag_id == request.path_params['tag_id'])
+    if instrument:
+        return JSONResponse({"is_paired": True, "instrument": instrument})
+    return JSONResponse({"is_paired": False})
+
+async def search_instrument_by_serial(request):
+    """Search for an instrument by serial number (for pairing process)."""
+    instrument = await fetch_one(instrument_table.c.serial == request.path_params['serial'])
+    if instrument:
+        return JSONResponse({
+            "found": True,
+            "instrument": instrument,
+            "is_paired": instrument["tag_id"] is not None
+        })
+    return JSONResponse({"found": False})
+
+async def stream_changes(request):
+    """Server-sent events for pairings, images and storage moves; resume with ?since= or Last-Event-ID."""
+    since = request.query_params.get('since', request.headers.get('Last-Event-ID'))
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return JSONResponse({"error": "since must be an integer"}, status_code=400)
+    subscriber = await changes.subscribe()
+    # The stream's own cleanup doesn't run if the client leaves before the first event
+    return StreamingResponse(changes.stream(subscriber, since), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                             background=BackgroundTask(changes.unsubscribe, subscriber))
+
+async def metrics_view(request):
+    lines = changes.metrics_lines() + (scans.metrics_lines() if scans is not None else [])
+    return PlainTextResponse('\n'.join(lines) + '\n', media_type='text/plain; version=0.0.4')
+
+async def shutdown():
+    scan_log.drain()
+    await changes.close()
+    await engine.dispose()
+
+app = Starlette(
+    routes=[
+        Route('/nfc/instruments', get_instruments, methods=['GET']),
+        Route('/nfc/instrument/{id:int}', get_instrument, methods=['GET']),
+        Route('/nfc/instrument_by_tag/{id:int}', get_instrument, methods=['GET']),
+        Route('/nfc/instrument_exists/{tag_id:int}', instrument_exists, methods=['GET']),
+        Route('/nfc/check_tag/{tag_id:int}', check_tag, methods=['GET']),
+        Route('/nfc/search_serial/{serial:str}', search_instrument_by_serial, methods=['GET']),
+        Route('/nfc/changes', stream_changes, methods=['GET']),
+        Route('/metrics', metrics_view, methods=['GET'])
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+            allow_methods=["GET", "OPTIONS"],
+            allow_headers=["Content-Type", "Authorization"],
+            allow_credentials=True
+        )
+    ],
+    on_shutdown=[shutdown]
+)
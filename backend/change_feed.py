@@ -0,0 +1,202 @@
+"""
+Server-sent change feed for pairings, images and storage moves.
+
+Write routes in main.py call `record()` inside their own transaction, which
+appends a row to `change_log`. The row's autoincrement `seq` is the feed's
+position. The async app (asgi_app.py) streams those rows at /nfc/changes as
+SSE events, with `id: <seq>`, so a client that reconnects resumes where it
+left off: the browser sends Last-Event-ID, or a client can pass `?since=<seq>`.
+
+An open stream is an async generator waiting on a queue, not a thread, so a
+process can hold as many as it has sockets for. Each process runs one
+broadcaster task. It reads new rows every Config.CHANGE_FEED_POLL_MS, formats
+each event once and hands it to every subscriber's queue. Any number of open
+streams costs one query per poll. Only a stream's replay on (re)connect reads
+the table on its own.
+
+A subscriber that falls Config.CHANGE_FEED_QUEUE_SIZE events behind is
+disconnected, and resumes from its last event when it reconnects.
+`change_log` keeps the newest Config.CHANGE_LOG_RETENTION rows. A client
+resuming from before that gets a `reset` event and should reload everything.
+"""
+
+import json
+import time
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from models import ChangeLog
+
+CHANGE_TABLE = 'change_log'
+BATCH_SIZE = 500
+PRUNE_INTERVAL_S = 60.0
+
+logger = logging.getLogger('change_feed')
+
+NEW_CHANGES_SQL = text(f"""
+    SELECT seq, kind, dbid, tag_id, data, created_at FROM {CHANGE_TABLE}
+    WHERE seq > :after ORDER BY seq LIMIT :limit
+""")
+HEAD_SQL = text(f"SELECT coalesce(max(seq), 0) FROM {CHANGE_TABLE}")
+OLDEST_SQL = text(f"SELECT min(seq) FROM {CHANGE_TABLE}")
+PRUNE_SQL = text(f"DELETE FROM {CHANGE_TABLE} WHERE seq <= :cutoff")
+
+def record(session, kind, dbid=None, tag_id=None, **data):
+    """Append a change to the session's transaction; subscribers see it once the caller commits."""
+    session.execute(ChangeLog.__table__.insert().values(
+        kind=kind, dbid=dbid, tag_id=tag_id, data=json.dumps(data), created_at=time.time()))
+
+def format_event(row):
+    """SSE text for one change_log row."""
+    payload = {
+        "seq": row.seq,
+        "kind": row.kind,
+        "dbid": row.dbid,
+        "tag_id": row.tag_id,
+        "data": json.loads(row.data) if row.data else {},
+        "at": row.created_at
+    }
+    return f"id: {row.seq}\nevent: {row.kind}\ndata: {json.dumps(payload)}\n\n"
+
+class _Subscriber:
+    __slots__ = ('queue', 'overflowed')
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+class ChangeFeed:
+    """Fan-out of change_log rows to SSE streams, on an async engine; one per process."""
+
+    def __init__(self, engine, poll_ms=500, queue_size=1000, retention=100000, heartbeat_s=15.0):
+        self._engine = engine
+        self.poll_interval = poll_ms / 1000.0
+        self.queue_size = queue_size
+        self.retention = retention
+        self.heartbeat = heartbeat_s
+        self._task = None
+        self._head = 0
+        self._subscribers = set()
+        self.stats = {'events': 0, 'polls': 0, 'overflows': 0}
+
+    async def _ensure_started(self):
+        if self._task is None:
+            # Read the head before anyone subscribes, so nothing after it can be missed
+            async with self._engine.connect() as conn:
+                head = (await conn.execute(HEAD_SQL)).scalar()
+            # Another stream may have started it while we waited
+            if self._task is None:
+                self._head = head
+                self._task = asyncio.create_task(self._run())
+
+    async def subscribe(self):
+        """A new subscriber queue."""
+        await self._ensure_started()
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            # Let a poll that was mid-query return its connection before the engine is disposed
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async with self._engine.connect() as conn:
+                    while True:
+                        result = await conn.execute(NEW_CHANGES_SQL, {"after": self._head, "limit": BATCH_SIZE})
+                        rows = result.all()
+                        self.stats['polls'] += 1
+                        if rows:
+                            self._publish([(row.seq, format_event(row)) for row in rows])
+                        if len(rows) < BATCH_SIZE:
+                            break
+                if time.monotonic() - last_prune > PRUNE_INTERVAL_S:
+                    last_prune = time.monotonic()
+                    async with self._engine.begin() as conn:
+                        await conn.execute(PRUNE_SQL, {"cutoff": self._head - self.retention})
+            except Exception:
+                logger.exception("Change feed poll failed")
+
+    def _publish(self, events):
+        self._head = events[-1][0]
+        self.stats['events'] += len(events)
+        for subscriber in list(self._subscribers):
+            try:
+                for item in events:
+                    subscriber.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Too far behind: drop it; it resumes from its last event on reconnect
+                subscriber.overflowed = True
+                self.stats['overflows'] += 1
+                self.unsubscribe(subscriber)
+
+    async def replay(self, since):
+        """(events after `since`, whether older changes were already pruned)."""
+        async with self._engine.connect() as conn:
+            oldest = (await conn.execute(OLDEST_SQL)).scalar()
+            rows = []
+            after = since
+            while True:
+                batch = (await conn.execute(NEW_CHANGES_SQL, {"after": after, "limit": BATCH_SIZE})).all()
+                rows += batch
+                if len(batch) < BATCH_SIZE:
+                    break
+                after = batch[-1].seq
+        pruned = oldest is not None and since < oldest - 1
+        return [(row.seq, format_event(row)) for row in rows], pruned
+
+    async def stream(self, subscriber, since=None):
+        """SSE text for one client: the replay after `since`, then live events and keep-alives."""
+        try:
+            yield f"retry: {int(self.poll_interval * 1000) + 1000}\n\n"
+            last = self._head if since is None else since
+            if since is not None:
+                events, pruned = await self.replay(since)
+                if pruned:
+                    yield f"event: reset\ndata: {json.dumps({'since': since})}\n\n"
+                for seq, message in events:
+                    yield message
+                    last = seq
+            while True:
+                try:
+                    seq, message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Its queue filled up; the client reconnects and resumes from `last`
+                if subscriber.overflowed:
+                    break
+                # Already sent as part of the replay
+                if seq > last:
+                    yield message
+                    last = seq
+        finally:
+            self.unsubscribe(subscriber)
+
+    def metrics_lines(self):
+        return [
+            "# HELP nfc_change_feed_subscribers Open /nfc/changes streams in this process.",
+            "# TYPE nfc_change_feed_subscribers gauge",
+            f"nfc_change_feed_subscribers {len(self._subscribers)}",
+            "# HELP nfc_change_feed_events_total Changes read from change_log and fanned out.",
+            "# TYPE nfc_change_feed_events_total counter",
+            f"nfc_change_feed_events_total {self.stats['events']}",
+            "# HELP nfc_change_feed_overflows_total Subscribers disconnected for falling behind.",
+            "# TYPE nfc_change_feed_overflows_total counter",
+            f"nfc_change_feed_overflows_total {self.stats['overflows']}"
+        ]
@@ -3,5 +3,102 @@ import os
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'iotxnfcguitar.db')
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'sqlite:///' + os.path.join(BASE_DIR, 'iotxnfcguitar.db'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # OCR micro-batching (see ocr_scheduler.py). Raising the wait time or batch
+    # size trades per-request latency for recognizer throughput.
+    OCR_BATCH_MAX_SIZE = int(os.environ.get('OCR_BATCH_MAX_SIZE', 8))
+    OCR_BATCH_MAX_WAIT_MS = float(os.environ.get('OCR_BATCH_MAX_WAIT_MS', 5))
+    OCR_BATCH_SIZE_BUCKET = int(os.environ.get('OCR_BATCH_SIZE_BUCKET', 64))
+
+    # OCR worker processes (see ocr_workers.py). With preload enabled the
+    # reader weights are loaded once and shared copy-on-write with workers.
+    # Unset means the autotuned count from OCR_TUNING_FILE, or 4 without one
+    OCR_WORKERS = int(os.environ['OCR_WORKERS']) if os.environ.get('OCR_WORKERS') else None
+    OCR_PRELOAD = os.environ.get('OCR_PRELOAD', '1') == '1'
+    # Written by ocr_autotune.py; its worker count applies unless OCR_WORKERS is set
+    OCR_TUNING_FILE = os.environ.get('OCR_TUNING_FILE', os.path.join(BASE_DIR, 'ocr_tuning.json'))
+
+    # Load the OCR stack in a background thread when the API starts, so the
+    # first OCR request doesn't pay for it. /nfc/ready reports when it's done.
+    # Off by default: the API serves no OCR route, and the OCR packages aren't
+    # in requirements.txt. Turn it on for processes that run OCR.
+    OCR_WARMUP = os.environ.get('OCR_WARMUP', '0') == '1'
+    # Cold-start budget for `import main`, checked by startup_bench.py
+    STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 1500))
+
+    # Connection pool for the async lookup app (asgi_app.py)
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+    ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 20))
+
+    # Directory where each process writes its metrics for /metrics to sum across
+    # processes (see metrics.py); empty keeps metrics per process. gunicorn.conf.py sets one.
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_S = float(os.environ.get('METRICS_FLUSH_S', 1.0))
+
+    # Slow-query log (see slow_query_log.py). Statements on the hot routes are
+    # also checked once each for full-table scans regardless of duration.
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 50))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 200))
+    SLOW_QUERY_HOT_ROUTES = [r for r in os.environ.get('SLOW_QUERY_HOT_ROUTES', ','.join([
+        '/nfc/instrument_by_tag/<int:id>',
+        '/nfc/instrument/<int:id>',
+        '/nfc/instrument_exists/<int:tag_id>',
+        '/nfc/check_tag/<int:tag_id>',
+        '/nfc/search_serial/<string:serial>',
+        '/nfc/search',
+        '/nfc/pair_instrument'
+    ])).split(',') if r]
+
+    # Request tracing (see tracing.py). Spans go to the collector when an
+    # address is set, otherwise to a JSON-lines file.
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+    TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH', os.path.join(BASE_DIR, 'traces.jsonl'))
+    TRACE_COLLECTOR_ADDR = os.environ.get('TRACE_COLLECTOR_ADDR', '')
+
+    # Tag ids printed on our NFC labels, as inclusive ranges "lo-hi,lo-hi" (see
+    # tag_allocator.py). The allocator hands out free ids from these ranges and
+    # OCR only accepts ids inside them.
+    TAG_ID_RANGES = [tuple(int(n) for n in r.split('-', 1)) for r in
+                     os.environ.get('TAG_ID_RANGES', '1-350').replace(' ', '').split(',') if r]
+    # Labels print ids zero-padded to at least 5 digits, wider when the ranges need it
+    TAG_ID_DIGITS = max([5] + [len(str(hi)) for _, hi in TAG_ID_RANGES])
+    # Allocated ids still unpaired after this long go back to the free list
+    TAG_RESERVATION_TTL_S = float(os.environ.get('TAG_RESERVATION_TTL_S', 7 * 24 * 3600))
+
+    # Write-behind scan log (see scan_log.py). Scans are written in batches of up
+    # to SCAN_LOG_BATCH_SIZE, at most SCAN_LOG_FLUSH_MS after they're recorded. With
+    # SCAN_LOG_CAPACITY scans queued, lookups wait SCAN_LOG_BLOCK_MS for room, then drop the scan.
+    SCAN_LOG_ENABLED = os.environ.get('SCAN_LOG_ENABLED', '1') == '1'
+    SCAN_LOG_BATCH_SIZE = int(os.environ.get('SCAN_LOG_BATCH_SIZE', 500))
+    SCAN_LOG_FLUSH_MS = float(os.environ.get('SCAN_LOG_FLUSH_MS', 250))
+    SCAN_LOG_CAPACITY = int(os.environ.get('SCAN_LOG_CAPACITY', 20000))
+    SCAN_LOG_BLOCK_MS = float(os.environ.get('SCAN_LOG_BLOCK_MS', 2))
+
+    # Gate reader ingestion at /nfc/scan_events (see scan_ingest.py). Repeat reads of
+    # a tag by the same reader within SCAN_DEDUP_WINDOW_MS of the previous one are dropped.
+    SCAN_DEDUP_WINDOW_MS = float(os.environ.get('SCAN_DEDUP_WINDOW_MS', 2000))
+    SCAN_DEDUP_MAX_KEYS = int(os.environ.get('SCAN_DEDUP_MAX_KEYS', 100000))
+    SCAN_INGEST_MAX_LINES = int(os.environ.get('SCAN_INGEST_MAX_LINES', 50000))
+    # Reads timestamped more than this far ahead of or behind the server's clock are rejected
+    SCAN_MAX_FUTURE_S = float(os.environ.get('SCAN_MAX_FUTURE_S', 300))
+    SCAN_MAX_AGE_S = float(os.environ.get('SCAN_MAX_AGE_S', 7 * 24 * 3600))
+
+    # Change feed at /nfc/changes on the async app (see change_feed.py). New changes
+    # are picked up every CHANGE_FEED_POLL_MS; a stream CHANGE_FEED_QUEUE_SIZE events
+    # behind is closed and resumes on reconnect.
+    CHANGE_FEED_POLL_MS = float(os.environ.get('CHANGE_FEED_POLL_MS', 500))
+    CHANGE_FEED_QUEUE_SIZE = int(os.environ.get('CHANGE_FEED_QUEUE_SIZE', 1000))
+    CHANGE_LOG_RETENTION = int(os.environ.get('CHANGE_LOG_RETENTION', 100000))
+
+    # Image store garbage collection (see image_store.py): images no instrument has
+    # referenced for IMAGE_GC_GRACE_S are deleted by a check every IMAGE_GC_INTERVAL_S
+    IMAGE_GC_INTERVAL_S = float(os.environ.get('IMAGE_GC_INTERVAL_S', 300))
+    IMAGE_GC_GRACE_S = float(os.environ.get('IMAGE_GC_GRACE_S', 3600))
+
+    # Per-request profiling (see profiling.py); disabled while the token is empty
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 1))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic inventory generator for scale testing.
+
+Builds any number of instruments from the manufacturer/model tables and
+serial formats in seed_database.py, with a share of them paired to tags and
+a share assigned to storages. The same seed and options always give the same
+rows. SQLite targets are bulk loaded through sqlite3 in chunked executemany
+calls inside one transaction; other databases go through chunked SQLAlchemy
+Core inserts.
+
+    python generate_inventory.py --rows 1000000 --seed 42 --db /tmp/inventory.db
+    python generate_inventory.py --rows 350 --tagged-ratio 0 --storage-ratio 0 --reset
+"""
+
+import sys
+import time
+import random
+import argparse
+from itertools import islice
+
+from config import Config
+from inventory_stats import drop_inventory_counters, ensure_inventory_counters
+from search_index import drop_search_index, ensure_search_index
+from tag_allocator import drop_tag_allocator, ensure_tag_allocator
+from seed_database import manufacturers, generate_serial, generate_name
+
+COLUMNS = ('dbid', 'tag_id', 'name', 'manufacturer', 'model', 'serial', 'manufacture_date', 'storage_id')
+STORAGE_ADDRESSES = [
+    "123 Main St, Suite A, Anytown, CA 12345",
+    "456 Oak Ave, Building B, Somewhere, CA 67890",
+    "789 Pine Dr, Warehouse C, Otherplace, CA 54321"
+]
+
+def storage_rows(count):
+    """(id, name, address) for `count` storages; the first three match seed_database.py."""
+    return [(i, f"Storage {i}", STORAGE_ADDRESSES[i - 1] if i <= len(STORAGE_ADDRESSES)
+             else f"{i} Warehouse Rd, Unit {i}, Anytown, CA 12345") for i in range(1, count + 1)]
+
+def generate_rows(rows, seed=0, tagged_ratio=0.8, storage_ratio=0.75, storages=3, first_tag=1):
+    """Yield `rows` instrument tuples in COLUMNS order.
+
+    Tagged instruments get consecutive tag ids from `first_tag`, so every id
+    above the last one handed out is free.
+    """
+    rng = random.Random(seed)
+    rand = rng.random
+    catalog = [(m, models) for m, models in manufacturers.items()]
+    next_tag = first_tag
+    for dbid in range(1, rows + 1):
+        manufacturer, models = catalog[int(rand() * len(catalog))]
+        model = models[int(rand() * len(models))]
+        year = 1980 + int(rand() * 44)
+        if rand() < tagged_ratio:
+            tag_id = next_tag
+            next_tag += 1
+        else:
+            tag_id = None
+        storage_id = 1 + int(rand() * storages) if storages and rand() < storage_ratio else None
+        yield (dbid, tag_id, generate_name(manufacturer, model, rng), manufacturer, model,
+               generate_serial(manufacturer, year, rng), year, storage_id)
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def generate_inventory(database_url, rows, seed=0, tagged_ratio=0.8, storage_ratio=0.75, storages=3,
+                       reset=False, chunk_size=50000, search_index=True):
+    """Create the schema and load `rows` synthetic instruments; returns load and index timings.
+
+    On SQLite, secondary indexes, inventory counters, the tag free list and the
+    search index are dropped for the load (they would be maintained row by row) and rebuilt in
+    one pass afterwards; the search index only if `search_index` is True.
+    """
+    from models import db, ensure_indexes
+    from sqlalchemy import create_engine, func, select
+
+    engine = create_engine(database_url)
+    metadata = db.Model.metadata
+    instrument = metadata.tables['instrument']
+    storage = metadata.tables['storage']
+    if reset:
+        metadata.drop_all(engine)
+    metadata.create_all(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(instrument)).scalar()
+    if existing:
+        engine.dispose()
+        raise RuntimeError(f"{database_url} already has {existing} instruments; pass reset=True to replace them")
+    drop_search_index(engine)
+    drop_inventory_counters(engine)
+    drop_tag_allocator(engine)
+
+    start = time.perf_counter()
+    generated = generate_rows(rows, seed, tagged_ratio, storage_ratio, storages)
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        with engine.begin() as conn:
+            for index in instrument.indexes:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+        engine.dispose()
+        _bulk_load_sqlite(engine.url.database, storage_rows(storages), generated, chunk_size)
+    else:
+        with engine.begin() as conn:
+            if storages:
+                conn.execute(storage.insert(), [dict(zip(('id', 'name', 'address'), s))
+                                                for s in storage_rows(storages)])
+            for chunk in _chunks(generated, chunk_size):
+                conn.execute(instrument.insert(), [dict(zip(COLUMNS, row)) for row in chunk])
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ensure_indexes(engine)
+    ensure_inventory_counters(engine)
+    ensure_tag_allocator(engine, Config.TAG_ID_RANGES)
+    if search_index:
+        ensure_search_index(engine)
+    engine.dispose()
+    return {
+        "rows_per_second": rows / load_seconds if load_seconds else 0.0,
+        "load_seconds": load_seconds,
+        "index_seconds": time.perf_counter() - start
+    }
+
+def _bulk_load_sqlite(path, storages, generated, chunk_size):
+    import sqlite3
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # A fresh dataset can simply be regenerated if the load is interrupted
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO storage (id, name, address) VALUES (?, ?, ?)", storages)
+        sql = f"INSERT INTO instrument ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        for chunk in _chunks(generated, chunk_size):
+            conn.executemany(sql, chunk)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic inventory")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tagged-ratio', type=float, default=0.8, help='share of instruments paired to a tag')
+    parser.add_argument('--storage-ratio', type=float, default=0.75, help='share of instruments in a storage')
+    parser.add_argument('--storages', type=int, default=3)
+    parser.add_argument('--db', default=Config.SQLALCHEMY_DATABASE_URI,
+                        help='SQLite file or database URL (default: DATABASE_URL / the app database)')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate the tables first')
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--no-search-index', action='store_true', help='skip building the full-text index')
+    args = parser.parse_args()
+
+    database_url = args.db if '://' in args.db else 'sqlite:///' + args.db
+    try:
+        timings = generate_inventory(database_url, args.rows, args.seed, args.tagged_ratio, args.storage_ratio,
+                                  args.storages, args.reset, args.chunk_size, not args.no_search_index)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    print(f"Wrote {args.rows} instruments to {database_url} in {timings['load_seconds']:.1f}s "
+          f"({timings['rows_per_second']:,.0f} rows/s), indexes built in {timings['index_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Production server configuration for the NFC API.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+All settings can be overridden with environment variables. The app is
+preloaded in the master: the database schema is created and the OCR weights
+are loaded once, then workers are forked and share them copy-on-write.
+
+Reloading:
+    kill -HUP <master pid>    re-read this file and gracefully replace workers
+    kill -USR2 <master pid>   start a new master with new code (needed for
+                              code changes while GUNICORN_PRELOAD=1), then
+                              kill -TERM the old master once it's up
+"""
+
+import gc
+import os
+import sys
+import shutil
+import tempfile
+import multiprocessing
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, BASE_DIR)
+
+# Workers write their metrics here and /metrics sums them (see metrics.py); one
+# directory per master, so a USR2 replacement starts its own
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'nfc-metrics-{os.getpid()}'))
+
+from config import Config
+
+chdir = BASE_DIR
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:7100')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Time a worker gets to finish in-flight requests on reload/shutdown
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers periodically; jitter stops them all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# Preload hook (OCR_WARMUP=1 only): load the OCR reader in the master before the app module is
+# imported (main.py's own background warm-up is then a no-op). Inference is
+# skipped so no torch thread pool is alive when workers fork.
+if preload_app and Config.OCR_WARMUP:
+    from process_example_tags import start_ocr_warmup
+    start_ocr_warmup(background=False, run_inference=False)
+
+def on_starting(server):
+    # Files left by an earlier master with the same pid would be summed in
+    shutil.rmtree(Config.METRICS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(Config.METRICS_MULTIPROC_DIR, exist_ok=True)
+
+def on_exit(server):
+    shutil.rmtree(Config.METRICS_MULTIPROC_DIR, ignore_errors=True)
+
+def when_ready(server):
+    # Everything loaded so far is shared with the workers; freezing it keeps
+    # the cyclic GC from touching (and so copying) those pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded app, forking %d workers x %d threads", workers, threads)
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared across processes
+    if preload_app:
+        from main import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose()
+
+def worker_exit(server, worker):
+    # Write scans still queued in this worker's scan log before it goes away
+    import scan_log
+    import metrics
+    if not scan_log.drain():
+        server.log.warning("Scan log did not drain before worker %s exited", worker.pid)
+    # Its final counts stay in the sums after it's gone
+    metrics.write_snapshot()
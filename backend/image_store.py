@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store for instrument photos.
+
+Each distinct image is stored once, under its SHA-256, in a two-level sharded
+tree (`blobs/ab/cd/abcd...`), so no directory holds more than a few hundred
+files however many photos there are. `image_blob` has one row per stored file
+with its reference count. `instrument_image` maps an instrument's dbid to its
+current blob and is the only lookup /nfc/check_image does.
+
+Uploads are hashed while they stream to a temp file in the same filesystem.
+The blob row and mapping are written first, which takes the database's write
+lock, and the temp file is then renamed into place before the commit. The
+garbage collector deletes an unreferenced blob's row and its file inside one
+write transaction. So an upload of the same content either waits for the
+collector and writes the file again, or gets there first and keeps the blob
+alive. If the upload's commit then fails, its file is left with no row; the
+collector also removes blob files older than the grace period that have no
+row, re-checking under the write lock so it never races a commit.
+
+Replacing or deleting an instrument's image drops the old blob's count.
+Blobs unreferenced for longer than Config.IMAGE_GC_GRACE_S are collected by a
+background thread every Config.IMAGE_GC_INTERVAL_S. init_app() starts it, and
+every process forked afterwards starts its own.
+
+    python image_store.py migrate      # move legacy userImages/<dbid>.jpg files in
+    python image_store.py gc           # collect unreferenced blobs now
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import mimetypes
+
+from sqlalchemy import bindparam, create_engine, text
+
+BLOB_DIR = 'blobs'
+TMP_DIR = 'tmp'
+CHUNK_SIZE = 1024 * 1024
+GC_BATCH_SIZE = 500
+LEGACY_NAME = re.compile(r'^(\d+)\.jpg$')
+
+logger = logging.getLogger('image_store')
+
+INSERT_BLOB_SQL = text("""
+    INSERT INTO image_blob (sha256, size, mimetype, refcount, created_at, orphaned_at)
+    VALUES (:sha256, :size, :mimetype, 0, :now, :now)
+    ON CONFLICT (sha256) DO NOTHING
+""")
+CURRENT_SQL = text("SELECT sha256 FROM instrument_image WHERE dbid = :dbid")
+MAP_SQL = text("""
+    INSERT INTO instrument_image (dbid, sha256) VALUES (:dbid, :sha256)
+    ON CONFLICT (dbid) DO UPDATE SET sha256 = excluded.sha256
+""")
+UNMAP_SQL = text("DELETE FROM instrument_image WHERE dbid = :dbid")
+ACQUIRE_SQL = text("UPDATE image_blob SET refcount = refcount + 1, orphaned_at = NULL WHERE sha256 = :sha256")
+RELEASE_SQL = text("""
+    UPDATE image_blob SET refcount = refcount - 1,
+        orphaned_at = CASE WHEN refcount = 1 THEN :now ELSE orphaned_at END
+    WHERE sha256 = :sha256
+""")
+RESOLVE_SQL = text("""
+    SELECT b.sha256, b.mimetype FROM instrument_image m
+    JOIN image_blob b ON b.sha256 = m.sha256
+    WHERE m.dbid = :dbid
+""")
+GARBAGE_SQL = text("""
+    SELECT sha256 FROM image_blob WHERE refcount = 0 AND orphaned_at < :cutoff LIMIT :limit
+""")
+COLLECT_SQL = text("DELETE FROM image_blob WHERE sha256 = :sha256 AND refcount = 0")
+KNOWN_SQL = text("SELECT sha256 FROM image_blob WHERE sha256 IN :shas").bindparams(bindparam('shas', expanding=True))
+# Deletes nothing, but takes the write lock, so uploads in flight commit (or fail) first
+WRITE_LOCK_SQL = text("DELETE FROM image_blob WHERE 0")
+LEGACY_OWNER_SQL = text("""
+    SELECT coalesce((SELECT dbid FROM instrument WHERE dbid = :id),
+                    (SELECT dbid FROM instrument WHERE tag_id = :id LIMIT 1))
+""")
+
+class ImageStore:
+    def __init__(self, root, database_url=None, gc_interval_s=300.0, gc_grace_s=3600.0):
+        self.root = root
+        self.database_url = database_url
+        self.gc_interval = gc_interval_s
+        self.gc_grace = gc_grace_s
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, BLOB_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, TMP_DIR), exist_ok=True)
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+    def legacy_path(self, dbid):
+        return os.path.join(self.root, f"{dbid}.jpg")
+
+    def start_gc(self):
+        """Start this process's collector thread, once per pid."""
+        # Threads don't survive fork, so each process starts its own collector
+        if self.database_url and self.gc_interval > 0 and self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    threading.Thread(target=self._run_gc, name='image-gc', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def stage(self, stream):
+        """Copy `stream` to a temp file, hashing it on the way: (sha256, size, temp path)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, TMP_DIR))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest.hexdigest(), size, tmp_path
+
+    def put(self, conn, dbid, stream, mimetype):
+        """Store `stream` as dbid's image and point dbid at it; the caller commits. Returns the sha256."""
+        sha256, size, tmp_path = self.stage(stream)
+        try:
+            conn.execute(INSERT_BLOB_SQL, {"sha256": sha256, "size": size, "mimetype": mimetype, "now": time.time()})
+            self.attach(conn, dbid, sha256)
+            path = self.blob_path(sha256)
+            if os.path.exists(path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return sha256
+
+    def attach(self, conn, dbid, sha256):
+        """Point dbid at a stored blob, moving the reference from its previous one."""
+        previous = conn.execute(CURRENT_SQL, {"dbid": dbid}).scalar()
+        if previous == sha256:
+            return
+        conn.execute(MAP_SQL, {"dbid": dbid, "sha256": sha256})
+        conn.execute(ACQUIRE_SQL, {"sha256": sha256})
+        if previous is not None:
+            conn.execute(RELEASE_SQL, {"sha256": previous, "now": time.time()})
+
+    def release(self, conn, dbid):
+        """Drop dbid's image reference, e.g. when the instrument is deleted; the caller commits."""
+        previous = conn.execute(CURRENT_SQL, {"dbid": dbid}).scalar()
+        if previous is not None:
+            conn.execute(UNMAP_SQL, {"dbid": dbid})
+            conn.execute(RELEASE_SQL, {"sha256": previous, "now": time.time()})
+        return previous
+
+    def resolve(self, conn, dbid):
+        """(sha256, path, mimetype) of dbid's image, or None."""
+        row = conn.execute(RESOLVE_SQL, {"dbid": dbid}).first()
+        if row is None:
+            return None
+        return row.sha256, self.blob_path(row.sha256), row.mimetype
+
+    def collect(self, engine, grace_s=None):
+        """Delete blobs unreferenced for longer than the grace period, with their files; returns the count.
+
+        Blob files with no row at all, left by uploads whose commit failed,
+        are removed once older than the grace period too and are counted.
+        """
+        cutoff = time.time() - (self.gc_grace if grace_s is None else grace_s)
+        collected = 0
+        while True:
+            with engine.begin() as conn:
+                garbage = conn.execute(GARBAGE_SQL, {"cutoff": cutoff, "limit": GC_BATCH_SIZE}).scalars().all()
+                for sha256 in garbage:
+                    # Re-checked under the write lock: an upload may have just referenced it again
+                    if conn.execute(COLLECT_SQL, {"sha256": sha256}).rowcount:
+                        try:
+                            os.unlink(self.blob_path(sha256))
+                        except FileNotFoundError:
+                            pass
+                        collected += 1
+            if len(garbage) < GC_BATCH_SIZE:
+                break
+        collected += self._sweep_orphans(engine, cutoff)
+        self._sweep_tmp(cutoff)
+        return collected
+
+    def _sweep_orphans(self, engine, cutoff):
+        # Files renamed into place by uploads whose transaction then rolled back
+        removed = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, BLOB_DIR)):
+            old = []
+            for name in filenames:
+                try:
+                    if os.stat(os.path.join(dirpath, name)).st_mtime < cutoff:
+                        old.append(name)
+                except FileNotFoundError:
+                    pass
+            if not old:
+                continue
+            # One read per directory finds the candidates without holding the lock
+            with engine.connect() as conn:
+                known = set(conn.execute(KNOWN_SQL, {"shas": old}).scalars())
+            candidates = [name for name in old if name not in known]
+            if not candidates:
+                continue
+            with engine.begin() as conn:
+                conn.execute(WRITE_LOCK_SQL)
+                known = set(conn.execute(KNOWN_SQL, {"shas": candidates}).scalars())
+                for name in candidates:
+                    if name not in known:
+                        try:
+                            os.unlink(os.path.join(dirpath, name))
+                        except FileNotFoundError:
+                            pass
+                        removed += 1
+        return removed
+
+    def _sweep_tmp(self, cutoff):
+        # Temp files left by uploads that died between staging and commit
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        for entry in os.scandir(tmp_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _run_gc(self):
+        engine = create_engine(self.database_url)
+        while True:
+            time.sleep(self.gc_interval)
+            try:
+                collected = self.collect(engine)
+                if collected:
+                    logger.info("Removed %d unreferenced images", collected)
+            except Exception:
+                logger.exception("Image GC failed")
+
+    def migrate_legacy(self, engine):
+        """Move flat <id>.jpg files into the store; returns (migrated, deduplicated, unmatched).
+
+        The old routes saved files under the id in the URL, which clients set
+        to the tag id, so each name is resolved like the routes do: dbid first,
+        then tag id. Files matching no instrument are left where they are.
+        """
+        migrated = deduplicated = unmatched = 0
+        with engine.connect() as conn:
+            seen = set(conn.execute(text("SELECT sha256 FROM image_blob")).scalars())
+        for entry in os.scandir(self.root):
+            match = LEGACY_NAME.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            with engine.begin() as conn:
+                dbid = conn.execute(LEGACY_OWNER_SQL, {"id": int(match.group(1))}).scalar()
+                if dbid is None:
+                    unmatched += 1
+                    continue
+                with open(entry.path, 'rb') as f:
+                    sha256 = self.put(conn, dbid, f, 'image/jpeg')
+            os.unlink(entry.path)
+            migrated += 1
+            if sha256 in seen:
+                deduplicated += 1
+            seen.add(sha256)
+        return migrated, deduplicated, unmatched
+
+def guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+# Set by init_app()
+store = None
+_fork_hook_registered = False
+
+def _start_gc_after_fork():
+    if store is not None:
+        store.start_gc()
+
+def init_app(app):
+    """Create the app's image store under UPLOAD_FOLDER and start collecting in this and forked processes."""
+    global store, _fork_hook_registered
+    store = ImageStore(
+        app.config['UPLOAD_FOLDER'],
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        gc_interval_s=app.config['IMAGE_GC_INTERVAL_S'],
+        gc_grace_s=app.config['IMAGE_GC_GRACE_S']
+    )
+    store.start_gc()
+    # Gunicorn forks its workers after the preloaded app is set up
+    if not _fork_hook_registered:
+        os.register_at_fork(after_in_child=_start_gc_after_fork)
+        _fork_hook_registered = True
+    return store
+
+def main():
+    from config import Config
+    from models import db
+
+    parser = argparse.ArgumentParser(description="Image store maintenance")
+    parser.add_argument('command', choices=['migrate', 'gc'])
+    parser.add_argument('--root', default=os.environ.get(
+        'UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'userImages')))
+    parser.add_argument('--db', default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument('--grace', type=float, default=Config.IMAGE_GC_GRACE_S,
+                        help='seconds a blob must have been unreferenced (gc)')
+    args = parser.parse_args()
+
+    engine = create_engine(args.db)
+    db.Model.metadata.create_all(engine)
+    image_store = ImageStore(args.root)
+    if args.command == 'migrate':
+        migrated, deduplicated, unmatched = image_store.migrate_legacy(engine)
+        print(f"Migrated {migrated} images ({deduplicated} duplicates stored once, "
+              f"{unmatched} matching no instrument left in place)")
+    else:
+        print(f"Removed {image_store.collect(engine, args.grace)} unreferenced images")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
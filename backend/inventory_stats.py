@@ -0,0 +1,165 @@
+"""
+Inventory counters for dashboards, kept current by the database itself.
+
+`inventory_counter` holds one row per counter: total instruments, tagged
+instruments, instruments per manufacturer and per storage. Triggers on the
+instrument table adjust them inside the same transaction as every insert,
+delete, pairing, unpairing and storage move, so /nfc/stats reads a handful of
+rows however large the inventory is.
+
+Counter names: 'instruments', 'tagged', 'manufacturer:<name>', 'storage:<id>'
+and 'storage_tagged:<id>' ('none' in place of the id for unassigned
+instruments). 'schema_version' records which set of triggers built them.
+"""
+
+from sqlalchemy import text
+
+COUNTER_TABLE = 'inventory_counter'
+# Bump when the counter keys change; ensure_inventory_counters() then replaces the triggers and recounts
+COUNTERS_VERSION = 2
+
+# Counter keys of a row, as SQL over new./old. in a trigger body
+def _keys(row):
+    return f"'manufacturer:' || {row}.manufacturer, 'storage:' || coalesce({row}.storage_id, 'none')"
+
+def _tagged_keys(row):
+    return f"'tagged', 'storage_tagged:' || coalesce({row}.storage_id, 'none')"
+
+def _adjust(row, sign):
+    """Trigger statements adding `sign` (+1/-1) for one instrument row."""
+    return f"""
+        INSERT OR IGNORE INTO {COUNTER_TABLE} (name, value)
+        VALUES ('instruments', 0), ('tagged', 0), ('manufacturer:' || {row}.manufacturer, 0),
+               ('storage:' || coalesce({row}.storage_id, 'none'), 0),
+               ('storage_tagged:' || coalesce({row}.storage_id, 'none'), 0);
+        UPDATE {COUNTER_TABLE} SET value = value {sign} 1 WHERE name IN ('instruments', {_keys(row)});
+        UPDATE {COUNTER_TABLE} SET value = value {sign} 1
+            WHERE name IN ({_tagged_keys(row)}) AND {row}.tag_id IS NOT NULL;"""
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {COUNTER_TABLE} (
+        name VARCHAR(80) PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_ai AFTER INSERT ON instrument BEGIN
+        {_adjust('new', '+')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_ad AFTER DELETE ON instrument BEGIN
+        {_adjust('old', '-')}
+    END""",
+    # Name/model/serial edits don't touch any counter and skip this
+    f"""CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_au AFTER UPDATE OF tag_id, storage_id, manufacturer
+        ON instrument BEGIN
+        {_adjust('old', '-')}
+        {_adjust('new', '+')}
+    END"""
+]
+
+RECOUNT = [
+    f"DELETE FROM {COUNTER_TABLE}",
+    f"""INSERT INTO {COUNTER_TABLE} (name, value)
+        SELECT 'instruments', count(*) FROM instrument
+        UNION ALL SELECT 'tagged', count(tag_id) FROM instrument
+        UNION ALL SELECT 'manufacturer:' || manufacturer, count(*) FROM instrument GROUP BY manufacturer
+        UNION ALL SELECT 'storage:' || coalesce(storage_id, 'none'), count(*) FROM instrument GROUP BY storage_id
+        UNION ALL SELECT 'storage_tagged:' || coalesce(storage_id, 'none'), count(tag_id)
+            FROM instrument GROUP BY storage_id
+        UNION ALL SELECT 'schema_version', {COUNTERS_VERSION}"""
+]
+
+# Same numbers computed from the instrument table, for databases without the triggers
+AGGREGATE_SQL = text(f"""
+    SELECT 'instruments' AS name, count(*) AS value FROM instrument
+    UNION ALL SELECT 'tagged', count(tag_id) FROM instrument
+    UNION ALL SELECT 'manufacturer:' || manufacturer, count(*) FROM instrument GROUP BY manufacturer
+    UNION ALL SELECT 'storage:' || coalesce(CAST(storage_id AS VARCHAR), 'none'), count(*)
+        FROM instrument GROUP BY storage_id
+""")
+
+COUNTERS_SQL = text(f"SELECT name, value FROM {COUNTER_TABLE}")
+STORAGE_COUNTERS_SQL = text(f"""
+    SELECT (SELECT value FROM {COUNTER_TABLE} WHERE name = 'storage:' || :key),
+           (SELECT value FROM {COUNTER_TABLE} WHERE name = 'storage_tagged:' || :key)
+""")
+STORAGE_AGGREGATE_SQL = text("SELECT count(*), count(tag_id) FROM instrument WHERE storage_id = :storage_id")
+STORAGE_NAMES_SQL = text("SELECT id, name FROM storage")
+
+# Set by ensure_inventory_counters(); None until then
+_available = None
+
+def ensure_inventory_counters(engine):
+    """Create the counter table and triggers, recounting when missing or outdated; False if not SQLite."""
+    global _available
+    if engine.dialect.name != 'sqlite':
+        _available = False
+        return False
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (COUNTER_TABLE,)).first()
+        version = conn.exec_driver_sql(
+            f"SELECT value FROM {COUNTER_TABLE} WHERE name = 'schema_version'").scalar() if exists else None
+        if exists and version != COUNTERS_VERSION:
+            _drop_triggers(conn)
+        for statement in SCHEMA:
+            conn.exec_driver_sql(statement)
+        if version != COUNTERS_VERSION:
+            for statement in RECOUNT:
+                conn.exec_driver_sql(statement)
+    _available = True
+    return True
+
+def drop_inventory_counters(engine):
+    """Remove the counters and their triggers, e.g. before a bulk load."""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        _drop_triggers(conn)
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {COUNTER_TABLE}")
+
+def _drop_triggers(conn):
+    for suffix in ('ai', 'ad', 'au'):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {COUNTER_TABLE}_{suffix}")
+
+def recount(engine):
+    """Recompute every counter from the instrument table."""
+    with engine.begin() as conn:
+        for statement in RECOUNT:
+            conn.exec_driver_sql(statement)
+
+def inventory_stats(conn):
+    """Dashboard totals; `conn` is a SQLAlchemy Connection or Session."""
+    counters = dict(conn.execute(COUNTERS_SQL if _available else AGGREGATE_SQL).all())
+    storage_names = dict(conn.execute(STORAGE_NAMES_SQL).all())
+    total = counters.get('instruments', 0)
+    tagged = counters.get('tagged', 0)
+    by_manufacturer = {}
+    by_storage = []
+    for name, value in sorted(counters.items()):
+        if not value:
+            continue
+        kind, _, key = name.partition(':')
+        if kind == 'manufacturer':
+            by_manufacturer[key] = value
+        elif kind == 'storage':
+            storage_id = None if key == 'none' else int(key)
+            by_storage.append({
+                "storage_id": storage_id,
+                "name": storage_names.get(storage_id) if storage_id is not None else "Unassigned",
+                "instruments": value
+            })
+    return {
+        "instruments": total,
+        "tagged": tagged,
+        "untagged": total - tagged,
+        "by_manufacturer": by_manufacturer,
+        "by_storage": by_storage
+    }
+
+def storage_counts(conn, storage_id):
+    """Instruments and tagged instruments in one storage."""
+    if _available:
+        total, tagged = conn.execute(STORAGE_COUNTERS_SQL, {"key": str(storage_id)}).first()
+    else:
+        total, tagged = conn.execute(STORAGE_AGGREGATE_SQL, {"storage_id": storage_id}).first()
+    total, tagged = total or 0, tagged or 0
+    return {"instruments": total, "tagged": tagged, "untagged": total - tagged}
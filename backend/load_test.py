@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+HTTP load generator that simulates NFC scan traffic against the API.
+
+Scenario profiles:
+
+    stock_check  warehouse sweep: mostly instrument_by_tag, some instrument_exists
+    onboarding   pair a free tag to an untagged instrument by serial, upload its
+                 photo, then look it up the way the app does
+    mixed_day    stock checks with serial searches, listings and onboarding
+
+By default a server is started locally against a freshly seeded temporary
+database and upload folder, driven by concurrent keep-alive clients for a
+fixed duration, and stopped. Throughput, p50/p95/p99 latency, status counts
+and error rate are reported per route, and written as JSON with --output.
+
+    python load_test.py --scenario stock_check --server gunicorn --output report.json
+    python load_test.py --scenario mixed_day --url http://127.0.0.1:7100 --db iotxnfcguitar.db
+    python load_test.py --compare                 # dev server vs gunicorn
+    python load_test.py --async-compare --levels 16,64,256,1024
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import defaultdict
+from urllib.parse import urlparse, quote
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+class Inventory:
+    """What the scenarios need to know about the database under test."""
+
+    def __init__(self, tags, serials, untagged, max_tag):
+        self.tags = tags
+        self.serials = serials
+        self._lock = threading.Lock()
+        # Each untagged instrument is paired once, with a tag id nobody holds yet
+        self._pairings = iter([(dbid, serial, max_tag + 1 + n) for n, (dbid, serial) in enumerate(untagged)])
+
+    @classmethod
+    def from_db(cls, db_path, sample=20000):
+        conn = sqlite3.connect(db_path)
+        try:
+            tags = [r[0] for r in conn.execute(
+                "SELECT tag_id FROM instrument WHERE tag_id IS NOT NULL ORDER BY random() LIMIT ?", (sample,))]
+            serials = [r[0] for r in conn.execute(
+                "SELECT serial FROM instrument ORDER BY random() LIMIT ?", (sample,))]
+            untagged = conn.execute(
+                "SELECT dbid, serial FROM instrument WHERE tag_id IS NULL ORDER BY random() LIMIT ?",
+                (sample,)).fetchall()
+            max_tag = conn.execute("SELECT coalesce(max(tag_id), 0) FROM instrument").fetchone()[0]
+        finally:
+            conn.close()
+        return cls(tags or [1], serials or ['0'], untagged, max_tag)
+
+    @classmethod
+    def synthetic(cls, max_tag=350):
+        """Plausible ids only, for a remote server whose database isn't readable here."""
+        return cls(list(range(1, max_tag + 1)), ['0'], [], max_tag)
+
+    def next_pairing(self):
+        with self._lock:
+            return next(self._pairings, None)
+
+# A step is (method, path, body, headers, route label)
+def _get(path, route):
+    return ('GET', path, None, None, route)
+
+def _image_upload(dbid):
+    boundary = uuid.uuid4().hex
+    # Phone-photo sized payload; the server only stores it
+    photo = b'\xff\xd8\xff\xe0' + os.urandom(256 * 1024) + b'\xff\xd9'
+    body = (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; name=\"file\"; filename=\"{dbid}.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + photo + f"\r\n--{boundary}--\r\n".encode()
+    headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    return ('POST', f'/nfc/upload_image/{dbid}', body, headers, 'upload_image')
+
+def stock_check(inventory, rng):
+    while True:
+        tag_id = rng.choice(inventory.tags)
+        if rng.random() < 0.95:
+            yield _get(f'/nfc/instrument_by_tag/{tag_id}', 'instrument_by_tag')
+        else:
+            yield _get(f'/nfc/instrument_exists/{tag_id}', 'instrument_exists')
+
+def onboarding_session(inventory):
+    """One tag pairing as the app performs it; nothing once every instrument is tagged."""
+    pairing = inventory.next_pairing()
+    if pairing is None:
+        return
+    dbid, serial, tag_id = pairing
+    yield _get(f'/nfc/instrument_exists/{tag_id}', 'instrument_exists')
+    yield _get(f'/nfc/search_serial/{quote(serial)}', 'search_serial')
+    body = json.dumps({"tag_id": tag_id, "serial": serial}).encode()
+    yield ('POST', '/nfc/pair_instrument', body, {'Content-Type': 'application/json'}, 'pair_instrument')
+    yield _image_upload(dbid)
+    yield _get(f'/nfc/check_image/{dbid}', 'check_image')
+    yield _get(f'/nfc/instrument_by_tag/{tag_id}', 'instrument_by_tag')
+
+def onboarding(inventory, rng):
+    while True:
+        steps = list(onboarding_session(inventory))
+        if not steps:
+            # Everything is paired; keep the client busy with lookups
+            yield from stock_check(inventory, rng)
+        yield from steps
+
+def mixed_day(inventory, rng):
+    scans = stock_check(inventory, rng)
+    while True:
+        roll = rng.random()
+        if roll < 0.75:
+            yield next(scans)
+        elif roll < 0.90:
+            yield _get(f'/nfc/search_serial/{quote(rng.choice(inventory.serials))}', 'search_serial')
+        elif roll < 0.92:
+            yield _get('/nfc/instruments', 'instruments')
+        else:
+            yield from onboarding_session(inventory)
+
+SCENARIOS = {
+    'stock_check': stock_check,
+    'onboarding': onboarding,
+    'mixed_day': mixed_day
+}
+
+def summarize(latencies, statuses, elapsed):
+    # 404/409 are normal answers (unknown tag, already paired); 5xx and transport failures are errors
+    errors = sum(count for status, count in statuses.items() if status == 'transport_error' or status >= 500)
+    total = sum(statuses.values())
+    return {
+        "requests": total,
+        "requests_per_second": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": errors,
+        "error_rate": round(errors / total, 5) if total else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda kv: str(kv[0]))}
+    }
+
+def run_load(base_url, scenario, inventory, concurrency=16, duration=10.0, seed=0):
+    """Drive `scenario` from `concurrency` keep-alive clients for `duration` seconds."""
+    target = urlparse(base_url)
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        steps = SCENARIOS[scenario](inventory, random.Random(seed * 100003 + n))
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local = defaultdict(list)
+        local_statuses = defaultdict(lambda: defaultdict(int))
+        while time.perf_counter() < deadline:
+            method, path, body, headers, route = next(steps)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 'transport_error'
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            local[route].append(time.perf_counter() - start)
+            local_statuses[route][status] += 1
+        conn.close()
+        with lock:
+            for route, values in local.items():
+                latencies[route].extend(values)
+            for route, counts in local_statuses.items():
+                for status, count in counts.items():
+                    statuses[route][status] += count
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    all_statuses = defaultdict(int)
+    for counts in statuses.values():
+        for status, count in counts.items():
+            all_statuses[status] += count
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "total": summarize([v for values in latencies.values() for v in values], all_statuses, elapsed),
+        "routes": {route: summarize(latencies[route], statuses[route], elapsed) for route in sorted(latencies)}
+    }
+
+def wait_for_server(base_url, timeout=60.0):
+    """Wait until the server answers anything on /nfc/ready."""
+    target = urlparse(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=2)
+            conn.request('GET', '/nfc/ready')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout:.0f}s")
+
+def start_server(kind, port, env=None):
+    """Start the dev server ('dev'), gunicorn ('gunicorn') or uvicorn ('asgi') on `port`."""
+    env = dict(os.environ, **(env or {}))
+    # OCR isn't on these routes; don't let its warm-up skew the numbers
+    env.setdefault('OCR_WARMUP', '0')
+    if kind == 'dev':
+        # main.py always binds 7100 in development mode
+        cmd = [sys.executable, 'main.py']
+    elif kind == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1',
+               '--port', str(port), '--no-access-log']
+    else:
+        env['GUNICORN_BIND'] = f"127.0.0.1:{port}"
+        env.setdefault('GUNICORN_ACCESS_LOG', '/dev/null')
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    # Own process group, so the debug reloader's child is stopped with it
+    return subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+def stop_server(proc):
+    os.killpg(proc.pid, signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+
+def seed_server_env(tmp, rows, seed):
+    """Seed a database and an empty upload folder under `tmp`; returns (db path, server env)."""
+    from generate_inventory import generate_inventory
+    db_path = os.path.join(tmp, 'load_test.db')
+    generate_inventory('sqlite:///' + db_path, rows, seed)
+    upload_dir = os.path.join(tmp, 'userImages')
+    os.makedirs(upload_dir)
+    return db_path, {'DATABASE_URL': 'sqlite:///' + db_path, 'UPLOAD_FOLDER': upload_dir}
+
+def print_report(label, report):
+    print(f"\n{label}: {report['scenario']}, {report['concurrency']} clients, {report['duration_s']:.1f}s")
+    print(f"  {'route':<20} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>8}")
+    for route, r in list(report['routes'].items()) + [('TOTAL', report['total'])]:
+        print(f"  {route:<20} {r['requests_per_second']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['error_rate']:>8.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the NFC API with scan scenarios")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='stock_check')
+    parser.add_argument('--server', choices=['gunicorn', 'dev', 'asgi'], default='gunicorn',
+                        help='server to start against a seeded database')
+    parser.add_argument('--rows', type=int, default=10000, help='instruments in the seeded database')
+    parser.add_argument('--url', help='test an already running server instead of starting one')
+    parser.add_argument('--db', help='with --url: the server\'s SQLite file, to pick real tags and serials')
+    parser.add_argument('--compare', action='store_true', help='run the scenario on the dev server and gunicorn')
+    parser.add_argument('--async-compare', action='store_true',
+                        help='compare one sync gunicorn process with one async process across --levels')
+    parser.add_argument('--levels', default='16,64,256,1024', help='concurrency levels for --async-compare')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    reports = {}
+    if args.url:
+        inventory = Inventory.from_db(args.db) if args.db else Inventory.synthetic()
+        reports[args.url] = run_load(args.url, args.scenario, inventory, args.concurrency, args.duration, args.seed)
+        print_report(args.url, reports[args.url])
+    else:
+        if args.async_compare:
+            if args.scenario != 'stock_check':
+                parser.error("the async app only serves lookups; use --scenario stock_check")
+            levels = [int(n) for n in args.levels.split(',')]
+            # One process each: sync gunicorn with its default thread count vs one event loop
+            servers = [('gunicorn', 7101, {'GUNICORN_WORKERS': '1'}, levels), ('asgi', 7102, {}, levels)]
+        elif args.compare:
+            servers = [('dev', 7100, {}, [args.concurrency]), ('gunicorn', 7101, {}, [args.concurrency])]
+        else:
+            servers = [(args.server, 7100 if args.server == 'dev' else 7101, {}, [args.concurrency])]
+
+        for kind, port, env, levels in servers:
+            # A fresh database per server, so writes from one run don't change the next
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path, server_env = seed_server_env(tmp, args.rows, args.seed)
+                base_url = f"http://127.0.0.1:{port}"
+                proc = start_server(kind, port, dict(server_env, **env))
+                try:
+                    wait_for_server(base_url)
+                    inventory = Inventory.from_db(db_path)
+                    for level in levels:
+                        label = f"{kind} c={level}" if len(levels) > 1 else kind
+                        reports[label] = run_load(base_url, args.scenario, inventory, level,
+                                                  args.duration, args.seed)
+                        print_report(label, reports[label])
+                finally:
+                    stop_server(proc)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,32 @@
 import os
+import metrics
+import change_feed
+import image_store
+import tracing
+import profiling
+import scan_log
+import scan_ingest
+import search_index
+import inventory_stats
+import tag_allocator
+import serializers
+import slow_query_log
 from config import Config
 from flask_cors import CORS
-from models import db, Instrument, Storage
-from werkzeug.utils import secure_filename
+from models import db, ensure_indexes, Instrument, InstrumentLastSeen, Storage
+from process_example_tags import WARMUP_STATUS, start_ocr_warmup
+from singleflight import SingleFlight
+from sqlalchemy import select
 from flask import Flask, request, jsonify, send_file
 
 # Constants
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'userImages')
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), '..', 'userImages'))
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+STORAGE_PAGE_SIZE = 50
+MAX_STORAGE_PAGE_SIZE = 500
+MAX_BULK_MOVE = 10000
+# Ids per IN (...) list, under SQLite's 999 bound-parameter limit on older builds
+MOVE_CHUNK_SIZE = 500
 
 # Flask App Setup
 app = Flask(__name__)
@@ -27,9 +46,45 @@ CORS(app, resources={
 # Database Setup
 db.init_app(app)
 
+# Request/SQL instrumentation, exposed at /metrics
+metrics.init_app(app)
+# Slow statements and full scans on hot routes, at /nfc/debug/slow_queries
+slow_query_log.init_app(app)
+# Sampled request/DB/file/OCR spans (see tracing.py)
+tracing.init_app(app)
+# Single-request profiles on an authorized X-Profile header
+profiling.init_app(app)
+# Tag scan history, written behind the lookups in batches
+scan_log.init_app(app)
+
 # Ensure upload folder exists
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
+# Content-addressed image files under it (see image_store.py)
+images = image_store.init_app(app)
+
+# Identical lookups that arrive while one is in flight share its result
+instrument_lookups = SingleFlight('instrument_lookups')
+image_lookups = SingleFlight('image_lookups')
+
+def singleflight_metrics():
+    lines = [
+        "# HELP nfc_singleflight_total Single-flight calls, executions and coalesced duplicates.",
+        "# TYPE nfc_singleflight_total counter"
+    ]
+    for flight in (instrument_lookups, image_lookups):
+        stats = flight.snapshot()
+        for outcome in ('calls', 'executions', 'coalesced', 'errors'):
+            lines.append(f'nfc_singleflight_total{{flight="{flight.name}",outcome="{outcome}"}} {stats[outcome]}')
+    return lines
+
+metrics.registry.add_collector(singleflight_metrics)
+
+# Gate reader batches, de-duplicated per (tag, reader) before they reach the database
+scan_ingestor = scan_ingest.ScanIngestor(
+    app.config['SCAN_DEDUP_WINDOW_MS'], app.config['SCAN_DEDUP_MAX_KEYS'], app.config['SCAN_INGEST_MAX_LINES'],
+    max_future_s=app.config['SCAN_MAX_FUTURE_S'], max_age_s=app.config['SCAN_MAX_AGE_S'])
+metrics.registry.add_collector(scan_ingestor.metrics_lines)
 
 # Helper Functions
 def allowed_file(filename):
@@ -40,9 +95,59 @@ def get_instrument_by_id_or_tag(id):
     """Get instrument by dbid or tag_id."""
     return Instrument.query.get(id) or Instrument.query.filter_by(tag_id=id).first()
 
+def lookup_instrument_dict(id):
+    """Serialized instrument by dbid or tag_id, coalescing concurrent lookups."""
+    def load():
+        instrument = get_instrument_by_id_or_tag(id)
+        return instrument.to_dict() if instrument else None
+    return instrument_lookups.do(('id_or_tag', id), load)
+
+def lookup_tag_dict(tag_id):
+    """Serialized instrument paired with tag_id, coalescing concurrent lookups."""
+    def load():
+        instrument = Instrument.query.filter_by(tag_id=tag_id).first()
+        return instrument.to_dict() if instrument else None
+    return instrument_lookups.do(('tag', tag_id), load)
+
+def lookup_image(id, dbid):
+    """(sha256 or None, path, mimetype) of an instrument's image file, or None; coalesces concurrent lookups."""
+    def load():
+        image = images.resolve(db.session, dbid)
+        if image is None:
+            # Saved under the URL's id before the image store; `python image_store.py migrate` moves these in
+            image = (None, images.legacy_path(id), 'image/jpeg')
+        with tracing.span('file.stat', path=image[1]):
+            return image if os.path.isfile(image[1]) else None
+    return image_lookups.do((id, dbid), load)
+
 # Database Initialization
 with app.app_context():
     db.create_all()
+    ensure_indexes(db.engine)
+    inventory_stats.ensure_inventory_counters(db.engine)
+    tag_allocator.ensure_tag_allocator(db.engine, app.config['TAG_ID_RANGES'])
+    search_index.ensure_search_index(db.engine)
+
+# OCR weights load in the background; /nfc/ready reports when they're in
+if app.config['OCR_WARMUP']:
+    start_ocr_warmup()
+
+# Health Routes
+@app.route('/nfc/ready', methods=['GET'])
+def ready():
+    """Report whether the service, including OCR warm-up, is ready for traffic."""
+    ocr_ready = not app.config['OCR_WARMUP'] or WARMUP_STATUS["state"] == "ready"
+    return jsonify({
+        "ready": ocr_ready,
+        "ocr": WARMUP_STATUS
+    }), 200 if ocr_ready else 503
+
+@app.route('/nfc/debug/singleflight', methods=['GET'])
+def singleflight_stats():
+    """Counters for coalesced duplicate lookups."""
+    return jsonify({
+        flight.name: flight.snapshot() for flight in (instrument_lookups, image_lookups)
+    }), 200
 
 # Instrument Management Routes
 @app.route('/nfc/add_instrument', methods=['POST'])
@@ -66,6 +171,9 @@ def add_instrument():
             manufacture_date=int(data['manufacture_date'])
         )
         db.session.add(new_instrument)
+        if new_instrument.tag_id is not None:
+            db.session.flush()
+            change_feed.record(db.session, 'paired', new_instrument.dbid, new_instrument.tag_id)
         db.session.commit()
         return jsonify({
             "message": "Instrument added successfully!",
@@ -76,18 +184,34 @@ def add_instrument():
 
 @app.route('/nfc/instruments', methods=['GET'])
 def get_instruments():
-    """Get all instruments."""
-    instruments = Instrument.query.all()
-    return jsonify([instrument.to_dict() for instrument in instruments])
+    """Get all instruments, optionally filtered by manufacturer, storage_id, year range and tagged."""
+    # Column tuples rather than ORM objects; see serializers.py
+    try:
+        criteria = serializers.listing_criteria(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = serializers.INSTRUMENT_SELECT.where(*criteria).order_by(Instrument.dbid)
+    rows = db.session.execute(query)
+    return serializers.json_response([serializers.instrument_row_to_dict(row) for row in rows])
+
+@app.route('/nfc/stats', methods=['GET'])
+def get_stats():
+    """Instrument totals, tagged/untagged and per manufacturer/storage, from maintained counters."""
+    return jsonify(inventory_stats.inventory_stats(db.session)), 200
 
 @app.route('/nfc/instrument/<int:id>', methods=['GET'])
 @app.route('/nfc/instrument_by_tag/<int:id>', methods=['GET'])
 def get_instrument(id):
     """Get instrument by dbid or tag_id."""
-    instrument = get_instrument_by_id_or_tag(id)
+    instrument = lookup_instrument_dict(id)
+    if request.url_rule.rule == '/nfc/instrument_by_tag/<int:id>':
+        # The response resolves a dbid first, but the scan is of the instrument paired with the tag
+        paired = instrument if instrument and instrument['tag_id'] == id else lookup_tag_dict(id)
+        scan_log.record(id, paired['dbid'] if paired else None,
+                        request.headers.get('X-Reader-Id', request.remote_addr))
     if not instrument:
         return jsonify({"error": "Instrument not found"}), 404
-    return jsonify(instrument.to_dict()), 200
+    return jsonify(instrument), 200
 
 @app.route('/nfc/delete_instrument/<int:dbid>', methods=['DELETE'])
 def delete_instrument(dbid):
@@ -95,14 +219,16 @@ def delete_instrument(dbid):
     instrument = Instrument.query.get(dbid)
     if not instrument:
         return jsonify({"error": "Instrument not found"}), 404
+    change_feed.record(db.session, 'instrument_deleted', instrument.dbid, instrument.tag_id)
+    images.release(db.session, instrument.dbid)
     db.session.delete(instrument)
     db.session.commit()
     return jsonify({"message": "Instrument deleted successfully!"})
 
 # Image Management Routes
-@app.route('/nfc/upload_image/<int:dbid>', methods=['POST'])
-def upload_image(dbid):
-    """Upload an image for an instrument."""
+@app.route('/nfc/upload_image/<int:id>', methods=['POST'])
+def upload_image(id):
+    """Upload an image for an instrument, by dbid or tag_id."""
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     
@@ -111,19 +237,32 @@ def upload_image(dbid):
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(f"{dbid}.jpg")
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        return jsonify({"message": "Image uploaded successfully!"}), 201
+        instrument = get_instrument_by_id_or_tag(id)
+        if not instrument:
+            return jsonify({"error": "Instrument not found"}), 404
+        with tracing.span('file.write', filename=file.filename):
+            images.put(db.session, instrument.dbid, file.stream, image_store.guess_mimetype(file.filename))
+        change_feed.record(db.session, 'image_uploaded', instrument.dbid, instrument.tag_id)
+        db.session.commit()
+        return jsonify({"message": "Image uploaded successfully!", "dbid": instrument.dbid}), 201
     
     return jsonify({"error": "File type not allowed"}), 400
 
-@app.route('/nfc/check_image/<int:dbid>', methods=['GET'])
-def check_image(dbid):
-    """Check if an image exists for an instrument."""
-    filename = secure_filename(f"{dbid}.jpg")
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, mimetype='image/jpeg')
+@app.route('/nfc/check_image/<int:id>', methods=['GET'])
+def check_image(id):
+    """Check if an image exists for an instrument, by dbid or tag_id."""
+    instrument = lookup_instrument_dict(id)
+    if not instrument:
+        return jsonify({"error": "Instrument not found"}), 404
+    image = lookup_image(id, instrument['dbid'])
+    if image is not None:
+        sha256, path, mimetype = image
+        try:
+            # Streamed from disk with Range and If-None-Match support; a blob's
+            # content never changes, so its hash is a strong ETag
+            return send_file(path, mimetype=mimetype, etag=sha256 or True, conditional=True)
+        except FileNotFoundError:
+            pass
     return jsonify({"exists": False}), 404
 
 # Tag Management Routes
@@ -131,15 +270,15 @@ def check_image(dbid):
 def instrument_exists(tag_id):
     """Check if an instrument exists for a given tag_id."""
     try:
-        instrument = Instrument.query.filter_by(tag_id=tag_id).first()
+        instrument = lookup_tag_dict(tag_id)
         if instrument:
             return jsonify({
                 "exists": True,
-                "instrument": instrument.to_dict()
+                "instrument": instrument
             }), 200
         return jsonify({"exists": False}), 200
     except Exception as e:
-        print(f"Error in instrument_exists: {str(e)}")
+        app.logger.exception("Error in instrument_exists: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/nfc/pair_instrument', methods=['POST', 'OPTIONS'])
@@ -180,15 +319,89 @@ def pair_instrument():
         
         # Perform pairing
         instrument.tag_id = tag_id
+        change_feed.record(db.session, 'paired', instrument.dbid, tag_id)
         db.session.commit()
         return jsonify({
             "message": f"Successfully paired tag ID {tag_id} with {instrument.name}",
             "instrument": instrument.to_dict()
         }), 200
     except Exception as e:
-        print(f"Error in pair_instrument: {str(e)}")
+        app.logger.exception("Error in pair_instrument: %s", e)
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/nfc/check_tag/<int:tag_id>', methods=['GET'])
+def check_tag(tag_id):
+    """Check if a tag ID is already paired with an instrument."""
+    instrument = Instrument.query.filter_by(tag_id=tag_id).first()
+    if instrument:
+        return jsonify({
+            "is_paired": True,
+            "instrument": instrument.to_dict()
+        }), 200
+    return jsonify({"is_paired": False}), 200
+
+@app.route('/nfc/search_serial/<string:serial>', methods=['GET'])
+def search_instrument_by_serial(serial):
+    """Search for an instrument by serial number (for pairing process)."""
+    instrument = Instrument.query.filter_by(serial=serial).first()
+    if instrument:
+        return jsonify({
+            "found": True,
+            "instrument": instrument.to_dict(),
+            "is_paired": instrument.tag_id is not None
+        }), 200
+    return jsonify({"found": False}), 200
+
+@app.route('/nfc/search', methods=['GET'])
+def search_instruments():
+    """As-you-type search over name, manufacturer, model and serial, best matches first."""
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    return serializers.json_response({"query": query, "results": search_index.search(db.session, query, limit)})
+
+@app.route('/nfc/allocate_tags', methods=['POST'])
+def allocate_tags():
+    """Reserve `count` free tag ids from the configured ranges, all or none, under a new token."""
+    if not tag_allocator.is_available():
+        return jsonify({"error": "Tag allocation needs the SQLite free list"}), 503
+    count = request.args.get('count', 1, type=int)
+    if not 1 <= count <= tag_allocator.MAX_ALLOCATION:
+        return jsonify({"error": f"count must be between 1 and {tag_allocator.MAX_ALLOCATION}"}), 400
+    token, tag_ids = tag_allocator.allocate(db.session, count, app.config['TAG_RESERVATION_TTL_S'])
+    if len(tag_ids) < count:
+        db.session.rollback()
+        return jsonify({"error": f"Only {len(tag_ids)} free tag IDs left", "requested": count}), 409
+    db.session.commit()
+    return jsonify({"tag_ids": tag_ids, "token": token, "expires_in": app.config['TAG_RESERVATION_TTL_S']}), 200
+
+@app.route('/nfc/release_tags', methods=['POST'])
+def release_tags():
+    """Return ids reserved under `token` that were never paired to the free list."""
+    if not tag_allocator.is_available():
+        return jsonify({"error": "Tag allocation needs the SQLite free list"}), 503
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    token = data.get('token')
+    tag_ids = data.get('tag_ids')
+    if not isinstance(token, str) or not token:
+        return jsonify({"error": "token from /nfc/allocate_tags is required"}), 400
+    # type() rather than isinstance(): True and False are ints too
+    if not isinstance(tag_ids, list) or not all(type(tag_id) is int for tag_id in tag_ids):
+        return jsonify({"error": "tag_ids must be a list of integers"}), 400
+    released = tag_allocator.release(db.session, token, tag_ids)
+    if tag_ids and not released:
+        db.session.rollback()
+        return jsonify({"error": "None of these tag IDs are reserved under this token"}), 403
+    db.session.commit()
+    released_set = set(released)
+    return jsonify({
+        "message": "Tag IDs released",
+        "released": released,
+        "not_released": [tag_id for tag_id in tag_ids if tag_id not in released_set],
+        "free": tag_allocator.free_count(db.session)
+    }), 200
+
 @app.route('/nfc/unpair_tag/<int:tag_id>', methods=['DELETE'])
 def unpair_tag(tag_id):
     """Unpair a tag from its instrument."""
@@ -200,11 +413,28 @@ def unpair_tag(tag_id):
     
     instrument_name = instrument.name
     instrument.tag_id = None
+    change_feed.record(db.session, 'unpaired', instrument.dbid, tag_id)
     db.session.commit()
     return jsonify({
         "message": f"Successfully unpaired tag ID {tag_id} from {instrument_name}"
     }), 200
 
+# Gate Reader Routes
+@app.route('/nfc/scan_events', methods=['POST'])
+def ingest_scan_events():
+    """Take a batch of gate reads as NDJSON lines of {"tag_id", "reader_id", "timestamp"}."""
+    counts = scan_ingestor.ingest(db.session, request.get_data(as_text=True))
+    db.session.commit()
+    return jsonify(counts), 200
+
+@app.route('/nfc/instrument/<int:dbid>/last_seen', methods=['GET'])
+def get_last_seen(dbid):
+    """Where and when a gate reader last saw an instrument."""
+    last_seen = InstrumentLastSeen.query.get(dbid)
+    if not last_seen:
+        return jsonify({"error": "Instrument hasn't been seen by a reader"}), 404
+    return jsonify(last_seen.to_dict()), 200
+
 # Storage Management Routes
 @app.route('/nfc/update_storage/<int:dbid>', methods=['PUT'])
 def update_instrument_storage(dbid):
@@ -224,11 +454,86 @@ def update_instrument_storage(dbid):
         return jsonify({"error": "Storage not found"}), 404
 
     instrument.storage = storage
+    change_feed.record(db.session, 'storage_moved', instrument.dbid, instrument.tag_id,
+                       storage_id=data['storage_id'])
     db.session.commit()
     return jsonify({
         "message": "Instrument storage updated successfully!",
         "instrument": instrument.to_dict()
     }), 200
 
+@app.route('/nfc/update_storage', methods=['PUT'])
+def bulk_update_storage():
+    """Move a list of instruments, by dbid or tag_id, to one storage (or unassign them with null)."""
+    data = request.json
+    if not isinstance(data, dict) or 'storage_id' not in data:
+        return jsonify({"error": "Missing 'storage_id' in request body"}), 400
+    keys = [key for key in ('dbids', 'tag_ids') if key in data]
+    if len(keys) != 1:
+        return jsonify({"error": "Provide exactly one of 'dbids' or 'tag_ids'"}), 400
+    ids = data[keys[0]]
+    # bool is an int subclass; true/false must not move dbid 1/0
+    if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+        return jsonify({"error": f"{keys[0]} must be a list of integers"}), 400
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BULK_MOVE:
+        return jsonify({"error": f"At most {MAX_BULK_MOVE} instruments per request"}), 400
+
+    storage_id = data['storage_id']
+    if storage_id is not None and type(storage_id) is not int:
+        return jsonify({"error": "storage_id must be an integer or null"}), 400
+    if storage_id is not None and Storage.query.get(storage_id) is None:
+        return jsonify({"error": "Storage not found"}), 404
+
+    instrument = Instrument.__table__
+    column = instrument.c.dbid if keys[0] == 'dbids' else instrument.c.tag_id
+    found = set()
+    moved = 0
+    for start in range(0, len(ids), MOVE_CHUNK_SIZE):
+        chunk = ids[start:start + MOVE_CHUNK_SIZE]
+        found.update(db.session.execute(select(column).where(column.in_(chunk))).scalars())
+        # Instruments already in the target storage are matched but not rewritten
+        moved += db.session.execute(
+            instrument.update()
+            .where(column.in_(chunk))
+            .where(instrument.c.storage_id.is_distinct_from(storage_id))
+            .values(storage_id=storage_id)
+        ).rowcount
+    if moved:
+        change_feed.record(db.session, 'storage_moved', storage_id=storage_id, **{keys[0]: sorted(found)})
+    db.session.commit()
+    return jsonify({
+        "message": f"Moved {moved} instruments",
+        "storage_id": storage_id,
+        "requested": len(ids),
+        "matched": len(found),
+        "moved": moved,
+        "unchanged": len(found) - moved,
+        "not_found": [i for i in ids if i not in found]
+    }), 200
+
+@app.route('/nfc/storage/<int:storage_id>/instruments', methods=['GET'])
+def get_storage_instruments(storage_id):
+    """One page of a storage's instruments in dbid order, with its counts; pass `after` from next_after."""
+    storage = Storage.query.get(storage_id)
+    if not storage:
+        return jsonify({"error": "Storage not found"}), 404
+    limit = max(1, min(request.args.get('limit', STORAGE_PAGE_SIZE, type=int), MAX_STORAGE_PAGE_SIZE))
+    after = request.args.get('after', 0, type=int)
+    # One extra row tells whether another page follows
+    rows = db.session.execute(serializers.INSTRUMENT_SELECT
+                              .where(Instrument.storage_id == storage_id, Instrument.dbid > after)
+                              .order_by(Instrument.dbid)
+                              .limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return serializers.json_response({
+        "storage": storage.to_dict(include_instruments=False),
+        "counts": inventory_stats.storage_counts(db.session, storage_id),
+        "instruments": [serializers.instrument_row_to_dict(row) for row in rows],
+        "next_after": rows[-1].dbid if has_more else None
+    })
+
 if __name__ == '__main__':
+    # Development server only; production runs wsgi.py under gunicorn (see gunicorn.conf.py)
     app.run(port=7100, host="0.0.0.0", debug=True)
\ No newline at end of file
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Memory-budget regression suite for the listing, import and OCR paths.
+
+Each case runs in a fresh interpreter (so peak RSS belongs to that case
+alone) against a synthetic SQLite inventory or a synthetic large image. Peak
+RSS comes from a run without tracemalloc, whose own bookkeeping would inflate
+it; a second, traced run gives the tracemalloc peak and the top allocating
+lines. A case fails when it exceeds its budget in memory_budgets.json or has
+no budget, and every run is appended to memory_history.jsonl for trend charts.
+
+    python memory_bench.py --sizes 10000,100000,1000000
+    python memory_bench.py --update-budgets      # record current peaks + headroom
+    python memory_bench.py --trend               # peak RSS per case over past runs
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BUDGETS_FILE = os.path.join(BASE_DIR, 'memory_budgets.json')
+HISTORY_FILE = os.path.join(BASE_DIR, 'memory_history.jsonl')
+BUDGET_HEADROOM = 1.2
+
+def build_image(path, megapixels):
+    """Write a noisy photo-sized JPEG with a white sticker in it."""
+    import cv2
+    import numpy as np
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    image = np.random.default_rng(0).integers(40, 120, (height, width, 3), dtype=np.uint8)
+    cv2.rectangle(image, (width // 3, height // 3), (width // 2, height // 2), (245, 245, 245), -1)
+    cv2.putText(image, "00042", (width // 3 + 20, height // 3 + height // 12),
+                cv2.FONT_HERSHEY_SIMPLEX, width / 1500, (0, 0, 0), max(1, width // 500))
+    cv2.imwrite(path, image)
+
+# Case bodies; each runs inside the child process
+def case_listing(args):
+    from main import app
+    with app.test_client() as client:
+        response = client.get('/nfc/instruments')
+        assert response.status_code == 200, response.status_code
+
+def case_storage(args):
+    from main import app
+    from models import Storage
+    with app.app_context():
+        for storage in Storage.query.all():
+            storage.to_dict()
+
+def case_import(args):
+    from generate_inventory import generate_inventory
+    # Reset, since the traced run loads the same database again
+    generate_inventory('sqlite:///' + args.db, args.rows, reset=True)
+
+def case_ocr(args):
+    if args.with_ocr:
+        from process_example_tags import process_image
+        process_image(args.image)
+    else:
+        import cv2
+        from process_example_tags import find_label_regions
+        find_label_regions(cv2.imread(args.image))
+
+CASES = {
+    'listing': case_listing,
+    'storage_to_dict': case_storage,
+    'import': case_import,
+    'ocr_image': case_ocr
+}
+
+def run_case(args):
+    """Child side: run one case, under tracemalloc with --traced, and print a JSON result."""
+    if args.traced:
+        tracemalloc.start(10)
+    else:
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    CASES[args.run_case](args)
+    elapsed = time.perf_counter() - start
+    if not args.traced:
+        print(json.dumps({
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "baseline_rss_mb": round(baseline_kb / 1024, 1),
+            "seconds": round(elapsed, 3)
+        }))
+        return
+    _, traced_peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+    tracemalloc.stop()
+    print(json.dumps({
+        "traced_peak_mb": round(traced_peak / 2**20, 1),
+        "top_allocators": [
+            {"where": str(stat.traceback[0]), "size_mb": round(stat.size / 2**20, 2), "count": stat.count}
+            for stat in top
+        ]
+    }))
+
+def measure(case, env, **options):
+    """Peak RSS and timing from an untraced run, allocation details from a traced one."""
+    result = spawn(case, env, **options)
+    if 'error' not in result:
+        traced = spawn(case, env, traced=True, **options)
+        result.update(traced if 'error' not in traced else {"traced_error": traced["error"]})
+    return result
+
+def spawn(case, env, **options):
+    cmd = [sys.executable, os.path.abspath(__file__), '--run-case', case]
+    for key, value in options.items():
+        if value is True:
+            cmd.append(f"--{key.replace('_', '-')}")
+        elif value is not None and value is not False:
+            cmd += [f"--{key.replace('_', '-')}", str(value)]
+    proc = subprocess.run(cmd, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def show_trend(limit):
+    runs = []
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE) as f:
+            runs = [json.loads(line) for line in f if line.strip()][-limit:]
+    if not runs:
+        print("No history yet")
+        return
+    cases = sorted({name for run in runs for name in run["results"]})
+    print(f"{'case':<24}" + ''.join(f"{(run['revision'] or '?')[:8]:>10}" for run in runs))
+    for name in cases:
+        cells = []
+        for run in runs:
+            value = run["results"].get(name, {}).get("peak_rss_mb")
+            cells.append(f"{value:>10.1f}" if value is not None else f"{'-':>10}")
+        print(f"{name:<24}" + ''.join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-budget regression suite")
+    parser.add_argument('--sizes', default='10000,100000', help='inventory sizes (comma separated)')
+    parser.add_argument('--megapixels', default='12,48', help='synthetic image sizes (comma separated)')
+    parser.add_argument('--with-ocr', action='store_true', help='run full OCR on the images, not just localization')
+    parser.add_argument('--update-budgets', action='store_true')
+    parser.add_argument('--trend', action='store_true')
+    parser.add_argument('--trend-runs', type=int, default=10)
+    # Child-process options
+    parser.add_argument('--run-case', choices=sorted(CASES), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--image', help=argparse.SUPPRESS)
+    parser.add_argument('--traced', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args)
+        return
+    if args.trend:
+        show_trend(args.trend_runs)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, OCR_WARMUP='0', TRACE_SAMPLE_RATE='0')
+        for rows in [int(n) for n in args.sizes.split(',')]:
+            db_path = os.path.join(tmp, f"inventory_{rows}.db")
+            results[f"import:{rows}"] = measure('import', env, db=db_path, rows=rows)
+            case_env = dict(env, DATABASE_URL='sqlite:///' + db_path)
+            results[f"listing:{rows}"] = measure('listing', case_env)
+            results[f"storage_to_dict:{rows}"] = measure('storage_to_dict', case_env)
+        for megapixels in [float(n) for n in args.megapixels.split(',')]:
+            image_path = os.path.join(tmp, f"image_{megapixels:g}mp.jpg")
+            build_image(image_path, megapixels)
+            results[f"ocr_image:{megapixels:g}mp"] = measure('ocr_image', env, image=image_path,
+                                                             with_ocr=args.with_ocr)
+
+    budgets = load_json(BUDGETS_FILE, {})
+    failures = []
+    unbudgeted = []
+    print(f"{'case':<24} {'peak RSS MB':>12} {'budget MB':>10} {'traced MB':>10} {'seconds':>8}")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<24} ERROR {result['error']}")
+            failures.append(name)
+            continue
+        budget = budgets.get(name)
+        over = budget is not None and result["peak_rss_mb"] > budget
+        traced = f"{result['traced_peak_mb']:>10.1f}" if 'traced_peak_mb' in result else f"{'-':>10}"
+        status = '  OVER BUDGET' if over else '  NO BUDGET' if budget is None else ''
+        print(f"{name:<24} {result['peak_rss_mb']:>12.1f} {budget if budget is not None else '-':>10} "
+              f"{traced} {result['seconds']:>8.2f}{status}")
+        if 'traced_error' in result:
+            print(f"    traced run failed: {result['traced_error']}")
+        if budget is None:
+            unbudgeted.append(name)
+        if over:
+            failures.append(name)
+            for alloc in result.get("top_allocators", [])[:5]:
+                print(f"    {alloc['size_mb']:8.2f} MB  {alloc['where']}")
+
+    with open(HISTORY_FILE, 'a') as f:
+        f.write(json.dumps({
+            "at": datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "results": results
+        }) + '\n')
+
+    if args.update_budgets:
+        for name, result in results.items():
+            if 'error' not in result:
+                budgets[name] = round(result["peak_rss_mb"] * BUDGET_HEADROOM, 1)
+        with open(BUDGETS_FILE, 'w') as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+        print(f"\nBudgets written to {BUDGETS_FILE}")
+    elif failures or unbudgeted:
+        if failures:
+            print(f"\n{len(failures)} case(s) failed: {', '.join(failures)}")
+        if unbudgeted:
+            # A case without a budget checks nothing, so it fails instead of passing silently
+            print(f"\n{len(unbudgeted)} case(s) have no budget in {os.path.basename(BUDGETS_FILE)}: "
+                  f"{', '.join(unbudgeted)}; record them with --update-budgets")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
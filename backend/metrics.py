@@ -0,0 +1,299 @@
+"""
+Minimal Prometheus instrumentation for the Flask API.
+
+Per-route request latency histograms, status counters and in-flight gauges,
+plus SQL query count and DB time per request from SQLAlchemy engine events.
+Everything is exposed in the Prometheus text format at /metrics.
+
+Metrics live in each process. With METRICS_MULTIPROC_DIR set (gunicorn.conf.py
+sets one) every process also writes its rendered metrics, including the
+collectors', to a file there every METRICS_FLUSH_S and when it exits, and
+/metrics sums the files of all processes. Counters and histograms keep the
+files of exited workers, so totals don't drop when a worker is recycled;
+gauges only count live processes.
+"""
+
+import os
+import glob
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for n, v in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        # Counts are stored per bucket and made cumulative at render time
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items()]
+        names = self.label_names + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        """Register a callable returning extra exposition lines at scrape time."""
+        self.collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+logger = logging.getLogger('metrics')
+
+class MultiProcessFiles:
+    """Per-process snapshot files in a directory shared by a server's processes."""
+
+    def __init__(self, directory, flush_s=1.0):
+        self.directory = directory
+        self.flush_s = flush_s
+        self._pid = None
+        self._path = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each process starts its own writer
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # The start time keeps a reused pid from overwriting a dead worker's counters
+                    self._path = os.path.join(self.directory, f"{os.getpid()}-{time.time_ns()}.prom")
+                    threading.Thread(target=self._run, name='metrics-writer', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_s)
+            try:
+                self.write()
+            except Exception:
+                logger.exception("Could not write metrics snapshot")
+
+    def write(self):
+        """Write this process's current metrics to its file."""
+        self._ensure_thread()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(registry.render())
+        os.replace(tmp, self._path)
+
+    def render(self):
+        """All processes' metrics, summed per series, in the text format."""
+        self.write()
+        families = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.prom'))):
+            pid = int(os.path.basename(path).split('-', 1)[0])
+            try:
+                with open(path) as f:
+                    text = f.read()
+            except FileNotFoundError:
+                continue
+            _merge(families, text, _alive(pid))
+        lines = []
+        for name, family in families.items():
+            lines += [f"# HELP {name} {family['help']}", f"# TYPE {name} {family['kind']}"]
+            lines += [f"{series} {_format_value(value)}" for series, value in family['samples'].items()]
+        return '\n'.join(lines) + '\n'
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge(families, text, alive):
+    """Add one process's exposition text into `families`; a dead process's gauges are skipped."""
+    family = None
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            name, _, help = line[7:].partition(' ')
+            family = families.setdefault(name, {'help': help, 'kind': 'untyped', 'samples': {}})
+        elif line.startswith('# TYPE '):
+            name, _, kind = line[7:].partition(' ')
+            family = families.setdefault(name, {'help': '', 'kind': kind, 'samples': {}})
+            family['kind'] = kind
+        elif line and family is not None:
+            if family['kind'] == 'gauge' and not alive:
+                continue
+            series, _, value = line.rpartition(' ')
+            family['samples'][series] = family['samples'].get(series, 0) + float(value)
+
+def _format_value(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+# Set by init_app() when METRICS_MULTIPROC_DIR is configured
+multiprocess = None
+
+REQUEST_LATENCY = registry.add(Histogram(
+    'nfc_request_duration_seconds', 'Request latency by route and method.', ('route', 'method')))
+REQUESTS = registry.add(Counter(
+    'nfc_requests_total', 'Requests by route, method and status code.', ('route', 'method', 'status')))
+IN_FLIGHT = registry.add(Gauge(
+    'nfc_requests_in_flight', 'Requests currently being handled.', ('route',)))
+REQUEST_QUERIES = registry.add(Histogram(
+    'nfc_request_db_queries', 'SQL statements issued per request.', ('route',), QUERY_COUNT_BUCKETS))
+REQUEST_DB_TIME = registry.add(Histogram(
+    'nfc_request_db_seconds', 'Time spent in SQL per request.', ('route',)))
+QUERIES = registry.add(Counter(
+    'nfc_db_queries_total', 'SQL statements executed, including outside requests.'))
+
+def _route():
+    rule = request.url_rule
+    # The rule template, not the concrete path, keeps label cardinality bounded
+    return rule.rule if rule is not None else 'unmatched'
+
+def _before_request():
+    if multiprocess is not None:
+        multiprocess._ensure_thread()
+    route = _route()
+    g._metrics = [time.perf_counter(), route, 0, 0.0, False]
+    IN_FLIGHT.inc((route,))
+
+def _after_request(response):
+    state = g.get('_metrics')
+    if state is not None:
+        _finish(state, response.status_code)
+    return response
+
+def _teardown_request(exc):
+    state = g.get('_metrics')
+    if state is None:
+        return
+    if not state[4]:
+        # The view raised and no response went through after_request
+        _finish(state, 500)
+    IN_FLIGHT.dec((state[1],))
+
+def _finish(state, status):
+    start, route, query_count, db_time, _ = state
+    state[4] = True
+    REQUEST_LATENCY.observe(time.perf_counter() - start, (route, request.method))
+    REQUESTS.inc((route, request.method, status))
+    REQUEST_QUERIES.observe(query_count, (route,))
+    REQUEST_DB_TIME.observe(db_time, (route,))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    QUERIES.inc()
+    if has_request_context():
+        state = g.get('_metrics')
+        if state is not None:
+            state[2] += 1
+            state[3] += elapsed
+
+def metrics_view():
+    body = multiprocess.render() if multiprocess is not None else registry.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+def write_snapshot():
+    """Flush this process's metrics file, e.g. as a worker exits; a no-op without METRICS_MULTIPROC_DIR."""
+    if multiprocess is not None:
+        multiprocess.write()
+
+def init_app(app):
+    """Install request hooks, SQL hooks and the /metrics route."""
+    global multiprocess
+    if app.config.get('METRICS_MULTIPROC_DIR'):
+        multiprocess = MultiProcessFiles(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_S'])
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    # Listening on the Engine class covers every engine the app creates
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -3,6 +3,16 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 class Instrument(db.Model):  # Corrected typo in class name
+    # Tag lookups, the /nfc/instruments filters (manufacturer or storage, each with a year range),
+    # and storage contents paged by dbid (the index's implicit rowid gives that order)
+    __table_args__ = (
+        db.Index('ix_instrument_tag_id', 'tag_id'),
+        db.Index('ix_instrument_storage', 'storage_id'),
+        db.Index('ix_instrument_manufacturer_year', 'manufacturer', 'manufacture_date'),
+        db.Index('ix_instrument_storage_year', 'storage_id', 'manufacture_date'),
+        db.Index('ix_instrument_year', 'manufacture_date'),
+    )
+
     dbid = db.Column(db.Integer, primary_key=True, autoincrement=True)
     tag_id = db.Column(db.Integer, nullable=True)  
     name = db.Column(db.String(30), nullable=False)
@@ -30,10 +40,99 @@ class Storage(db.Model):
     address = db.Column(db.String(100), nullable=False)
     instruments = db.relationship('Instrument', backref='storage', lazy=True)
 
+    def to_dict(self, include_instruments=True):
+        data = {
+            "id": self.id,
+            "name": self.name,
+            "address": self.address
+        }
+        # Large storages should be read page by page from /nfc/storage/<id>/instruments instead
+        if include_instruments:
+            data["instruments"] = [instrument.to_dict() for instrument in self.instruments]
+        return data
+
+class ScanEvent(db.Model):
+    """One tag scan, appended in batches by scan_log.py; dbid is the instrument it resolved to, if any."""
+    __tablename__ = 'scan_event'
+    # Scan history per tag and per instrument, in time order
+    __table_args__ = (
+        db.Index('ix_scan_event_tag_time', 'tag_id', 'scanned_at'),
+        db.Index('ix_scan_event_dbid_time', 'dbid', 'scanned_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    tag_id = db.Column(db.Integer, nullable=False)
+    # No foreign key: history outlives deleted instruments
+    dbid = db.Column(db.Integer, nullable=True)
+    reader_id = db.Column(db.String(64), nullable=True)
+    scanned_at = db.Column(db.Float, nullable=False)  # Unix time
+
     def to_dict(self):
         return {
             "id": self.id,
-            "name": self.name,
-            "address": self.address,
-            "instruments": [instrument.to_dict() for instrument in self.instruments]
-        }
\ No newline at end of file
+            "tag_id": self.tag_id,
+            "dbid": self.dbid,
+            "reader_id": self.reader_id,
+            "scanned_at": self.scanned_at
+        }
+
+class InstrumentLastSeen(db.Model):
+    """Latest gate read per instrument, upserted by scan_ingest.py."""
+    __tablename__ = 'instrument_last_seen'
+
+    dbid = db.Column(db.Integer, primary_key=True)
+    tag_id = db.Column(db.Integer, nullable=False)
+    reader_id = db.Column(db.String(64), nullable=False)
+    seen_at = db.Column(db.Float, nullable=False)  # Unix time
+
+    def to_dict(self):
+        return {
+            "dbid": self.dbid,
+            "tag_id": self.tag_id,
+            "reader_id": self.reader_id,
+            "seen_at": self.seen_at
+        }
+
+class ChangeLog(db.Model):
+    """One change for the /nfc/changes feed (see change_feed.py); seq is the feed position."""
+    __tablename__ = 'change_log'
+    # AUTOINCREMENT: pruning old rows must never let a sequence number be handed out twice
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(30), nullable=False)
+    dbid = db.Column(db.Integer, nullable=True)
+    tag_id = db.Column(db.Integer, nullable=True)
+    data = db.Column(db.Text, nullable=True)  # JSON
+    created_at = db.Column(db.Float, nullable=False)  # Unix time
+
+class ImageBlob(db.Model):
+    """One stored image file, named by its SHA-256 (see image_store.py)."""
+    __tablename__ = 'image_blob'
+    # orphaned_at is only set while refcount is 0, which is what the garbage collector looks for
+    __table_args__ = (
+        db.Index('ix_image_blob_orphaned', 'orphaned_at'),
+    )
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    mimetype = db.Column(db.String(50), nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.Float, nullable=False)  # Unix time
+    orphaned_at = db.Column(db.Float, nullable=True)
+
+class InstrumentImage(db.Model):
+    """The current image of an instrument."""
+    __tablename__ = 'instrument_image'
+    __table_args__ = (
+        db.Index('ix_instrument_image_sha256', 'sha256'),
+    )
+
+    dbid = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+def ensure_indexes(engine):
+    """Create declared indexes missing from an existing database; create_all() skips existing tables."""
+    for table in db.Model.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
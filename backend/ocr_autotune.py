@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Find the fastest OCR worker-process / torch-thread combination for this host.
+
+Sweeps worker counts and torch intra-op threads per worker over the sample
+images and writes the best images/second configuration to
+Config.OCR_TUNING_FILE, which OCRWorkerPool reads at startup.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from config import Config
+from ocr_workers import OCRWorkerPool
+
+def powers_of_two(limit):
+    values = []
+    n = 1
+    while n <= limit:
+        values.append(n)
+        n *= 2
+    if values[-1] != limit:
+        values.append(limit)
+    return values
+
+def candidate_configs(cpu_count, max_oversubscription=1):
+    """Worker/thread pairs that don't use more threads than cores (times the allowed oversubscription)."""
+    budget = cpu_count * max_oversubscription
+    return [
+        (workers, threads)
+        for workers in powers_of_two(cpu_count)
+        for threads in powers_of_two(cpu_count)
+        if workers * threads <= budget
+    ]
+
+def measure(workers, threads, image_paths, rounds):
+    """Images/second for one configuration, excluding pool start-up and warm-up."""
+    with OCRWorkerPool(workers=workers, torch_threads=threads) as pool:
+        workload = image_paths * rounds
+        start = time.perf_counter()
+        pool.process_images(workload)
+        elapsed = time.perf_counter() - start
+    return len(workload) / elapsed
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', default=os.path.join(script_dir, 'Example Instrument Tags'),
+                        help='directory of sample images')
+    parser.add_argument('--rounds', type=int, default=2, help='passes over the sample images per configuration')
+    parser.add_argument('--output', default=Config.OCR_TUNING_FILE, help='where to write the tuned config')
+    parser.add_argument('--oversubscribe', type=int, default=1,
+                        help='allow workers x threads up to this multiple of the core count')
+    args = parser.parse_args()
+
+    image_paths = [
+        os.path.join(args.images, f) for f in sorted(os.listdir(args.images))
+        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    ]
+    if not image_paths:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+
+    cpu_count = os.cpu_count()
+    configs = candidate_configs(cpu_count, args.oversubscribe)
+    print(f"Sweeping {len(configs)} configurations on {cpu_count} CPUs with {len(image_paths)} images x {args.rounds}")
+
+    results = []
+    for workers, threads in configs:
+        rate = measure(workers, threads, image_paths, args.rounds)
+        results.append({'workers': workers, 'torch_threads': threads, 'images_per_second': round(rate, 3)})
+        print(f"  workers={workers:<3} threads={threads:<3} {rate:8.2f} img/s")
+
+    best = max(results, key=lambda r: r['images_per_second'])
+    tuning = {
+        **best,
+        'cpu_count': cpu_count,
+        'tuned_at': datetime.now().isoformat(timespec='seconds'),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(tuning, f, indent=2)
+    print(f"\nBest: {best['workers']} workers x {best['torch_threads']} threads "
+          f"({best['images_per_second']:.2f} img/s), saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
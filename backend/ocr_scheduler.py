@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import queue
+import threading
+from collections import defaultdict
+from contextlib import ExitStack
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import tracing
+from config import Config
+
+class _OCRRequest:
+    """A single queued image waiting to be recognized."""
+    __slots__ = ('image', 'detail', 'allowlist', 'future', 'enqueued_at', 'trace')
+
+    def __init__(self, image, detail, allowlist):
+        self.image = image
+        self.detail = detail
+        self.allowlist = allowlist
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        # Caller's trace, so the batch shows up under each request that was in it
+        self.trace = tracing.current_context()
+
+class OCRScheduler:
+    """Collect concurrent OCR requests into batched EasyOCR recognizer calls.
+
+    Requests are gathered until either `max_batch_size` images are queued or
+    `max_wait_ms` has passed since the first one arrived. Within a batch,
+    images are grouped by size bucket (and OCR options) so each group can go
+    through `reader.readtext_batched` with one common input size. Every caller
+    gets its own result back through a Future.
+
+    `max_wait_ms` is the latency/throughput knob: 0 disables waiting (only
+    requests that are already queued get batched), larger values build bigger
+    batches at the cost of up to that much extra latency per request.
+    """
+
+    def __init__(self, reader=None, max_batch_size=None, max_wait_ms=None, size_bucket=None):
+        self.reader = reader
+        self.max_batch_size = max_batch_size or Config.OCR_BATCH_MAX_SIZE
+        self.max_wait_ms = Config.OCR_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        self.size_bucket = size_bucket or Config.OCR_BATCH_SIZE_BUCKET
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'recognizer_calls': 0,
+            'max_batch': 0
+        }
+
+    def start(self):
+        """Start the background batching thread."""
+        # Concurrent first submits race here; only one of them may start a thread
+        with self._lock:
+            if self._thread is None:
+                if self.reader is None:
+                    from process_example_tags import get_reader
+                    self.reader = get_reader()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='ocr-scheduler', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the batching thread after the queued requests are served."""
+        with self._lock:
+            if self._thread is not None:
+                self._stopping.set()
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, image, detail=0, allowlist=None):
+        """Queue an image (path or BGR array) and return a Future for its OCR result."""
+        if self._thread is None:
+            self.start()
+        # Decode on the caller's thread so image I/O runs in parallel
+        if isinstance(image, str):
+            import cv2
+            path = image
+            image = cv2.imread(path)
+            if image is None:
+                raise FileNotFoundError(f"Could not read image: {path}")
+        request = _OCRRequest(image, detail, allowlist)
+        self._queue.put(request)
+        return request.future
+
+    def readtext(self, image, detail=0, allowlist=None, timeout=None):
+        """Blocking equivalent of `reader.readtext` that goes through the batcher."""
+        return self.submit(image, detail=detail, allowlist=allowlist).result(timeout)
+
+    def _bucket(self, request):
+        """Group key: images of similar size with identical OCR options."""
+        height, width = request.image.shape[:2]
+        step = self.size_bucket
+        return (-(-height // step), -(-width // step), request.detail, request.allowlist)
+
+    def _collect(self, first):
+        """Gather requests until the batch is full or the wait window closes."""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    request = self._queue.get_nowait()
+                else:
+                    request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._stopping.set()
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            if first is None:
+                if self._queue.empty():
+                    return
+                continue
+
+            batch = self._collect(first)
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+
+            groups = defaultdict(list)
+            for request in batch:
+                groups[self._bucket(request)].append(request)
+            for group in groups.values():
+                self._recognize(group)
+
+    def _recognize(self, group):
+        """Run one batched recognizer call and hand each result to its caller."""
+        pending = [r for r in group if r.future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        # Resize the whole group to the largest member; bucketing keeps this small
+        n_height = max(r.image.shape[0] for r in pending)
+        n_width = max(r.image.shape[1] for r in pending)
+        first = pending[0]
+        try:
+            with ExitStack() as spans:
+                for request in pending:
+                    if request.trace is not None and request.trace.sampled:
+                        spans.enter_context(tracing.attach(request.trace))
+                        spans.enter_context(tracing.span('ocr.batch_recognize', batch_size=len(pending)))
+                results = self.reader.readtext_batched(
+                    [r.image for r in pending],
+                    n_width=n_width,
+                    n_height=n_height,
+                    batch_size=len(pending),
+                    detail=first.detail,
+                    allowlist=first.allowlist
+                )
+            self.stats['recognizer_calls'] += 1
+        except Exception as e:
+            for request in pending:
+                request.future.set_exception(e)
+            return
+        for request, result in zip(pending, results):
+            request.future.set_result(result)
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def run_benchmark(image_paths, concurrency=8, rounds=3, wait_values=(0, 5, 20)):
+    """Compare per-image `readtext` with the batched scheduler at several wait windows."""
+    import cv2
+    from process_example_tags import get_reader
+    reader = get_reader()
+    images = [cv2.imread(p) for p in image_paths]
+    workload = images * rounds
+    report = []
+
+    def timed(fn, image):
+        start = time.perf_counter()
+        fn(image)
+        return time.perf_counter() - start
+
+    # Baseline: every caller runs its own recognizer call
+    lock = threading.Lock()
+    def single(image):
+        with lock:  # one reader is not safe to share across threads
+            return reader.readtext(image, detail=0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda img: timed(single, img), workload))
+    elapsed = time.perf_counter() - start
+    report.append(('readtext', len(workload) / elapsed, latencies))
+
+    for wait_ms in wait_values:
+        with OCRScheduler(reader, max_batch_size=concurrency, max_wait_ms=wait_ms) as scheduler:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(lambda img: timed(scheduler.readtext, img), workload))
+            elapsed = time.perf_counter() - start
+            label = f"batched wait={wait_ms}ms (avg batch {scheduler.stats['requests'] / max(1, scheduler.stats['batches']):.1f})"
+            report.append((label, len(workload) / elapsed, latencies))
+
+    print(f"\n{len(workload)} images, {concurrency} concurrent callers")
+    print(f"{'mode':<40} {'img/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for label, throughput, latencies in report:
+        print(f"{label:<40} {throughput:>8.2f} {_percentile(latencies, 50):>8.2f} {_percentile(latencies, 95):>8.2f}")
+    return report
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    example_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(script_dir, 'Example Instrument Tags')
+    image_paths = [
+        os.path.join(example_dir, f) for f in sorted(os.listdir(example_dir))
+        if f.lower().endswith(('.jpg', '.jpeg', '.png'))
+    ]
+    if not image_paths:
+        print(f"No images found in {example_dir}")
+        sys.exit(1)
+    concurrency = int(os.environ.get('OCR_BENCH_CONCURRENCY', 8))
+    run_benchmark(image_paths, concurrency=concurrency)
+
+if __name__ == "__main__":
+    main()
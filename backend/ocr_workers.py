@@ -0,0 +1,175 @@
+import gc
+import os
+import json
+import sys
+import time
+import multiprocessing
+
+import tracing
+from config import Config
+
+# Pool size when neither OCR_WORKERS nor a tuning file gives one
+DEFAULT_WORKERS = 4
+
+# Barrier handed to forked workers so warm-up runs exactly once per worker
+_warmup_barrier = None
+
+def read_pss_kb(pid):
+    """Proportional set size of a process in kB (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def load_tuning(path=None):
+    """Return the autotuned {'workers', 'torch_threads'} config, or {} if there is none."""
+    path = path or Config.OCR_TUNING_FILE
+    try:
+        with open(path) as f:
+            tuning = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # A config tuned on a different machine is not worth trusting
+    if tuning.get('cpu_count') != os.cpu_count():
+        print(f"Ignoring {path}: tuned for {tuning.get('cpu_count')} CPUs, this host has {os.cpu_count()}")
+        return {}
+    return tuning
+
+def _init_worker(preload, torch_threads, barrier):
+    """Per-worker setup run right after fork."""
+    global _warmup_barrier
+    _warmup_barrier = barrier
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+    if not preload:
+        # Each worker loads its own private copy of the weights
+        from process_example_tags import get_reader
+        get_reader()
+
+def _warmup(_):
+    """Run a tiny inference on this worker so its working set is resident."""
+    import numpy as np
+    from process_example_tags import get_reader
+    get_reader().readtext(np.full((64, 256, 3), 255, dtype=np.uint8), detail=0)
+    if _warmup_barrier is not None:
+        _warmup_barrier.wait()
+    return os.getpid(), read_pss_kb(os.getpid())
+
+def _process(job):
+    image_path, trace = job
+    from process_example_tags import process_image
+    # Spans from the worker join the submitting request's trace
+    with tracing.attach(trace):
+        return process_image(image_path)
+
+class OCRWorkerPool:
+    """Process pool for OCR that shares one copy of the EasyOCR weights.
+
+    With `preload=True` the reader is loaded in the parent, the GC-tracked
+    heap is frozen, and workers are forked from it. The weights then live in
+    copy-on-write pages that workers only read, so N workers cost roughly one
+    model plus their own activations instead of N models.
+
+    stop() unfreezes the heap only if start() froze it. gc.unfreeze() releases
+    everything frozen, so a heap already frozen by someone else, such as
+    gunicorn's preloading master, stays frozen.
+    """
+
+    def __init__(self, workers=None, preload=None, torch_threads=None):
+        tuning = load_tuning() if workers is None or torch_threads is None else {}
+        # An explicit argument or OCR_WORKERS beats the tuning file
+        self.workers = workers or Config.OCR_WORKERS or tuning.get('workers') or DEFAULT_WORKERS
+        self.preload = Config.OCR_PRELOAD if preload is None else preload
+        self.torch_threads = torch_threads or tuning.get('torch_threads')
+        self._pool = None
+        self._worker_pids = []
+        self._froze = False
+
+    def start(self):
+        if self._pool is not None:
+            return self
+        if self.preload:
+            from process_example_tags import get_reader
+            get_reader()
+            # Move everything allocated so far into the permanent generation so
+            # the cyclic GC in the children never writes to those pages
+            gc.collect()
+            self._froze = gc.get_freeze_count() == 0
+            gc.freeze()
+        ctx = multiprocessing.get_context('fork')
+        barrier = ctx.Barrier(self.workers)
+        self._pool = ctx.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self.preload, self.torch_threads, barrier)
+        )
+        # One warm-up task per worker; the barrier stops a worker taking two
+        self._worker_pids = [pid for pid, _ in self._pool.map(_warmup, range(self.workers), chunksize=1)]
+        return self
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            if self._froze:
+                gc.unfreeze()
+                self._froze = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def process_images(self, image_paths):
+        """Run `process_image` over the paths in the worker processes."""
+        trace = tracing.current_context()
+        return self._pool.map(_process, [(path, trace) for path in image_paths], chunksize=1)
+
+    def memory_report(self):
+        """PSS of the parent and each worker, in kB."""
+        parent = read_pss_kb(os.getpid()) or 0
+        workers = [read_pss_kb(pid) or 0 for pid in self._worker_pids]
+        return {
+            'parent_pss_kb': parent,
+            'worker_pss_kb': workers,
+            'total_pss_kb': parent + sum(workers)
+        }
+
+def _measure(workers, preload):
+    """Start a pool in a fresh process so parent state doesn't leak between runs."""
+    def child(conn):
+        with OCRWorkerPool(workers=workers, preload=preload, torch_threads=1) as pool:
+            conn.send(pool.memory_report())
+        conn.close()
+    ctx = multiprocessing.get_context('fork')
+    parent_conn, child_conn = ctx.Pipe()
+    proc = ctx.Process(target=child, args=(child_conn,))
+    proc.start()
+    report = parent_conn.recv()
+    proc.join()
+    return report
+
+def main():
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("PSS accounting needs Linux /proc/<pid>/smaps_rollup")
+        sys.exit(1)
+    counts = [int(n) for n in sys.argv[1:]] or [4, 8, 16]
+    print(f"{'workers':>8} {'mode':>10} {'total MB':>10} {'per worker MB':>14}")
+    for workers in counts:
+        for preload in (False, True):
+            start = time.perf_counter()
+            report = _measure(workers, preload)
+            per_worker = sum(report['worker_pss_kb']) / len(report['worker_pss_kb']) / 1024
+            mode = 'preload' if preload else 'per-proc'
+            print(f"{workers:>8} {mode:>10} {report['total_pss_kb'] / 1024:>10.1f} {per_worker:>14.1f}"
+                  f"   ({time.perf_counter() - start:.1f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,24 @@
-import easyocr
-import cv2
 import os
 import re
-import torch
 import platform
+import time
+import threading
+import functools
 from datetime import datetime
 
+import tracing
+from config import Config
+
+# torch, cv2 and easyocr take seconds to import, so they are only imported
+# inside the functions that need them. Importing this module stays cheap for
+# services that never run OCR.
+
 # Configure GPU acceleration based on available hardware
+@functools.lru_cache(maxsize=None)
 def get_device():
+    """Probe for MPS/CUDA once per process and cache the result."""
+    import torch
+
     device_info = {
         "device": "cpu",
         "name": "CPU",
@@ -45,28 +56,78 @@ def get_device():
         print(f"Using CPU only: {device_info['processor']}")
         return device_info
 
-# Get hardware information and set device
-DEVICE_INFO = get_device()
-DEVICE = DEVICE_INFO["device"]
+# Shared OCR reader, created on first use instead of once per image
+_reader = None
+_reader_lock = threading.Lock()
+
+def get_reader():
+    """Return the process-wide EasyOCR reader, loading the weights on first use."""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+                _reader = easyocr.Reader(['en'], gpu=get_device()["device"] != "cpu")
+    return _reader
+
+# Background OCR warm-up, reported by the API's readiness endpoint
+WARMUP_STATUS = {
+    "state": "idle",
+    "device": None,
+    "started_at": None,
+    "finished_at": None,
+    "seconds": None,
+    "error": None
+}
+
+def _warmup(run_inference=True):
+    start = time.perf_counter()
+    try:
+        WARMUP_STATUS["device"] = get_device()["device"]
+        reader = get_reader()
+        if run_inference:
+            # One tiny inference pulls the weights and kernels into memory
+            import numpy as np
+            reader.readtext(np.full((64, 256, 3), 255, dtype=np.uint8), detail=0)
+        WARMUP_STATUS["state"] = "ready"
+    except Exception as e:
+        WARMUP_STATUS["state"] = "failed"
+        WARMUP_STATUS["error"] = str(e)
+    WARMUP_STATUS["finished_at"] = datetime.now().isoformat(timespec='seconds')
+    WARMUP_STATUS["seconds"] = round(time.perf_counter() - start, 3)
+
+def start_ocr_warmup(background=True, run_inference=True):
+    """Import the OCR stack and load the reader, in a daemon thread by default.
+
+    A process that is about to fork workers should call this with
+    background=False and run_inference=False: the weights are then shared
+    copy-on-write and no torch thread pool is running at fork time.
+    """
+    if WARMUP_STATUS["state"] != "idle":
+        return
+    WARMUP_STATUS["state"] = "warming"
+    WARMUP_STATUS["started_at"] = datetime.now().isoformat(timespec='seconds')
+    if background:
+        threading.Thread(target=_warmup, args=(run_inference,), name='ocr-warmup', daemon=True).start()
+    else:
+        _warmup(run_inference)
 
 def clean_text(text_list):
     """Clean and join text, removing spaces and special characters."""
     return ''.join(text_list).replace(' ', '').upper()
 
 def is_valid_tag_id(text):
-    """Check if the text contains a tag ID pattern (00001-00350)."""
+    """Check if the text contains a Config.TAG_ID_DIGITS-digit tag ID (e.g. 00042) inside Config.TAG_ID_RANGES."""
     # First, remove non-alphanumeric characters and convert to uppercase
     cleaned_text = re.sub(r'[^A-Z0-9]', '', text.upper())
     
-    # Search for patterns like "00NNN" where NNN is 1-350
-    matches = re.findall(r'00([0-9]{3})', cleaned_text)
+    # Every window of the label width, overlapping, so "100042" still yields "00042"
+    digits = Config.TAG_ID_DIGITS
+    matches = re.findall(rf'(?=([0-9]{{{digits}}}))', cleaned_text)
     for match in matches:
-        try:
-            num = int(match)
-            if 1 <= num <= 350:
-                return f"00{num:03d}"
-        except ValueError:
-            pass
+        num = int(match)
+        if any(lo <= num <= hi for lo, hi in Config.TAG_ID_RANGES):
+            return f"{num:0{digits}d}"
             
     return None
 
@@ -109,58 +170,238 @@ def is_valid_serial_number(text):
     
     return None
 
-def process_image(image_path):
-    """Process an image to find either a tag ID or serial number."""
+# Label localization tuning: the search runs on a downscaled copy of the photo
+LOCALIZE_WIDTH = 800
+MIN_REGION_FRACTION = 0.002   # smallest sticker, as a fraction of the frame
+MAX_REGION_FRACTION = 0.35    # anything bigger is background, not a label
+MAX_LABEL_REGIONS = 4
+
+def find_label_regions(image, max_regions=MAX_LABEL_REGIONS):
+    """Find bright, sticker-like rectangles in a BGR image.
+
+    Returns up to `max_regions` (x, y, w, h) boxes in full-resolution
+    coordinates, largest first. This is a cheap contour pass: threshold the
+    bright paper of the tag/serial stickers, close gaps between characters,
+    and keep blobs that are roughly rectangular with a label-like aspect.
+    """
+    import cv2
+
+    height, width = image.shape[:2]
+    scale = min(1.0, LOCALIZE_WIDTH / float(width))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    # Stickers are lighter than the wood/finish around them
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    frame_area = float(small.shape[0] * small.shape[1])
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        box_area = w * h
+        if not MIN_REGION_FRACTION <= box_area / frame_area <= MAX_REGION_FRACTION:
+            continue
+        aspect = max(w, h) / float(min(w, h))
+        if aspect > 8:
+            continue
+        # How much of the bounding box the blob fills; labels are near 1
+        if cv2.contourArea(contour) / box_area < 0.6:
+            continue
+        candidates.append((box_area, x, y, w, h))
+
+    regions = []
+    for _, x, y, w, h in sorted(candidates, reverse=True)[:max_regions]:
+        # Pad so characters touching the sticker edge are not clipped
+        pad_x, pad_y = int(w * 0.1), int(h * 0.1)
+        x0 = max(0, int((x - pad_x) / scale))
+        y0 = max(0, int((y - pad_y) / scale))
+        x1 = min(width, int((x + w + pad_x) / scale))
+        y1 = min(height, int((y + h + pad_y) / scale))
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+    return regions
+
+def find_tag_or_serial(text_list):
+    """Look for a tag ID, then a serial number, in a list of OCR strings."""
+    # First, look for tag IDs directly
+    for text in text_list:
+        tag_id = is_valid_tag_id(text)
+        if tag_id:
+            return {
+                "type": "tag_id",
+                "value": tag_id
+            }
+    
+    # Try with merged text - sometimes OCR splits digits across multiple detections
+    merged_text = clean_text(text_list)
+    print(f"Merged text: {merged_text}")
+    tag_id = is_valid_tag_id(merged_text)
+    if tag_id:
+        return {
+            "type": "tag_id",
+            "value": tag_id
+        }
+    
+    # If no tag ID found, look for serial numbers
+    for text in text_list:
+        serial = is_valid_serial_number(text)
+        if serial:
+            return {
+                "type": "serial_number",
+                "value": serial
+            }
+            
+    # Try with merged text
+    serial = is_valid_serial_number(merged_text)
+    if serial:
+        return {
+            "type": "serial_number",
+            "value": serial
+        }
+    
+    return None
+
+def _readtext(image, scheduler, detail=0, allowlist=None):
+    if scheduler is not None:
+        return scheduler.readtext(image, detail=detail, allowlist=allowlist)
+    return get_reader().readtext(image, detail=detail, allowlist=allowlist)
+
+# Cascade tier 1: digits-only recognition on a downscaled image
+TIER1_WIDTH = 640
+TIER1_MIN_CONFIDENCE = 0.6
+
+# Per-tier counters for the OCR cascade, shared by all threads in the process
+_cascade_lock = threading.Lock()
+CASCADE_STATS = {
+    "images": 0,
+    "tier1_hits": 0,
+    "tier2_runs": 0,
+    "tier2_hits": 0,
+    "tier1_time": 0.0,
+    "tier2_time": 0.0
+}
+
+def _record_cascade(**deltas):
+    with _cascade_lock:
+        for key, value in deltas.items():
+            CASCADE_STATS[key] += value
+
+def _downscale(image, max_width):
+    import cv2
+
+    width = image.shape[1]
+    if width <= max_width:
+        return image
+    scale = max_width / float(width)
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def find_tag_id_fast(image, regions=None, scheduler=None, min_confidence=TIER1_MIN_CONFIDENCE):
+    """Cascade tier 1: look for a confident tag ID using a digits-only pass.
+
+    Runs on the label regions when there are any, otherwise on a downscaled
+    copy of the whole frame. Returns the tag ID or None.
+    """
+    crops = [image[y:y + h, x:x + w] for x, y, w, h in regions] if regions else [image]
+    for crop in crops:
+        detections = _readtext(_downscale(crop, TIER1_WIDTH), scheduler, detail=1, allowlist='0123456789')
+        for _, text, confidence in detections:
+            if confidence >= min_confidence:
+                tag_id = is_valid_tag_id(text)
+                if tag_id:
+                    return tag_id
+        # Digits split across boxes: only trust the merge if every piece is confident
+        if detections and min(d[2] for d in detections) >= min_confidence:
+            tag_id = is_valid_tag_id(clean_text([d[1] for d in detections]))
+            if tag_id:
+                return tag_id
+    return None
+
+def cascade_report():
+    """Summarize per-tier hit rates and the estimated time saved by early exits."""
+    with _cascade_lock:
+        stats = dict(CASCADE_STATS)
+    images = stats["images"] or 1
+    avg_tier2 = stats["tier2_time"] / stats["tier2_runs"] if stats["tier2_runs"] else 0.0
+    return {
+        **stats,
+        "tier1_hit_rate": stats["tier1_hits"] / images,
+        "tier2_hit_rate": stats["tier2_hits"] / stats["tier2_runs"] if stats["tier2_runs"] else 0.0,
+        # Every tier-1 hit skipped one full alphanumeric pass
+        "estimated_time_saved": stats["tier1_hits"] * avg_tier2
+    }
+
+def process_image(image_path, scheduler=None, localize=True, cascade=True):
+    """Process an image to find either a tag ID or serial number.
+
+    When an OCRScheduler is given, recognition is queued on it so that
+    concurrent callers share batched recognizer calls. With `localize`,
+    OCR first runs only on sticker-like regions and falls back to the
+    full frame if they yield nothing. With `cascade`, a cheap digits-only
+    pass runs first and returns straight away on a confident tag ID; the
+    full alphanumeric pass only runs when it doesn't.
+    """
     # Check if file exists
     if not os.path.exists(image_path):
         print(f"Error: File {image_path} not found")
         return None
     
+    with tracing.span('ocr.process_image', path=image_path) as span:
+        result = _process_image(image_path, scheduler, localize, cascade)
+        if span is not None:
+            span.set('result_type', result["type"])
+        return result
+
+def _process_image(image_path, scheduler, localize, cascade):
     try:
-        # Initialize OCR reader with GPU support if available
-        gpu = DEVICE != "cpu"
-        reader = easyocr.Reader(['en'], gpu=gpu)
-        
-        # Extract text from image with detail=0 for plain text list
-        text_list = reader.readtext(image_path, detail=0)
-        
-        print(f"Raw OCR results: {text_list}")
-        
-        # First, look for tag IDs directly
-        for text in text_list:
-            tag_id = is_valid_tag_id(text)
+        import cv2
+
+        with tracing.span('ocr.decode'):
+            image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not decode image {image_path}")
+
+        with tracing.span('ocr.localize') as span:
+            regions = find_label_regions(image) if localize else []
+            if span is not None:
+                span.set('regions', len(regions))
+
+        if cascade:
+            start = time.perf_counter()
+            with tracing.span('ocr.tier1_digits'):
+                tag_id = find_tag_id_fast(image, regions, scheduler)
+            _record_cascade(images=1, tier1_time=time.perf_counter() - start)
             if tag_id:
+                _record_cascade(tier1_hits=1)
                 return {
                     "type": "tag_id",
                     "value": tag_id
                 }
-        
-        # Try with merged text - sometimes OCR splits digits across multiple detections
-        merged_text = clean_text(text_list)
-        print(f"Merged text: {merged_text}")
-        tag_id = is_valid_tag_id(merged_text)
-        if tag_id:
-            return {
-                "type": "tag_id",
-                "value": tag_id
-            }
-        
-        # If no tag ID found, look for serial numbers
-        for text in text_list:
-            serial = is_valid_serial_number(text)
-            if serial:
-                return {
-                    "type": "serial_number",
-                    "value": serial
-                }
-                
-        # Try with merged text
-        serial = is_valid_serial_number(merged_text)
-        if serial:
-            return {
-                "type": "serial_number",
-                "value": serial
-            }
+
+        start = time.perf_counter()
+        result = None
+        if regions:
+            with tracing.span('ocr.tier2_regions'):
+                text_list = []
+                for x, y, w, h in regions:
+                    text_list.extend(_readtext(image[y:y + h, x:x + w], scheduler))
+            print(f"Label region OCR results: {text_list}")
+            result = find_tag_or_serial(text_list) if text_list else None
+
+        if not result:
+            # Extract text from the whole frame with detail=0 for plain text list
+            with tracing.span('ocr.tier2_full_frame'):
+                text_list = _readtext(image, scheduler)
+            print(f"Raw OCR results: {text_list}")
+            result = find_tag_or_serial(text_list)
+
+        if cascade:
+            _record_cascade(tier2_runs=1, tier2_hits=1 if result else 0,
+                            tier2_time=time.perf_counter() - start)
+        if result:
+            return result
         
         return {
             "type": "none",
@@ -179,17 +420,49 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     example_dir = os.path.join(script_dir, 'Example Instrument Tags')
     
+    # Load the weights up front so the first image's timing isn't skewed
+    get_reader()
+    # Each step is timed on its own, so the gain of each one shows separately
+    variants = (
+        ('full frame', dict(localize=False, cascade=False)),
+        ('label regions', dict(localize=True, cascade=False)),
+        ('label regions + cascade', dict(localize=True, cascade=True)),
+    )
+    totals = [0.0] * len(variants)
+
     # Process each image in the directory
-    for filename in os.listdir(example_dir):
+    for filename in sorted(os.listdir(example_dir)):
         if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
             image_path = os.path.join(example_dir, filename)
             print(f"\n---\nProcessing {filename}...")
-            
-            result = process_image(image_path)
+
+            results, times = [], []
+            for _, options in variants:
+                start = time.perf_counter()
+                results.append(process_image(image_path, **options))
+                times.append(time.perf_counter() - start)
+            totals = [total + t for total, t in zip(totals, times)]
+            result = results[-1]
+
             if result and result["type"] != "none" and result["type"] != "error":
                 print(f"Found {result['type']}: {result['value']}")
             else:
                 print("No valid tag ID or serial number found")
+            for (name, _), other in zip(variants[:-1], results):
+                if other != result:
+                    print(f"{name.capitalize()} OCR found {other} instead")
+            print(", ".join(f"{name}: {t:.2f}s ({times[0] / t:.1f}x)" for (name, _), t in zip(variants, times)))
+
+    if totals[0]:
+        print("\nOverall: " + ", ".join(f"{name} {total:.2f}s ({totals[0] / total:.1f}x speedup)"
+                                       for (name, _), total in zip(variants, totals)))
+
+        report = cascade_report()
+        print(f"Cascade tier 1 (digits only): {report['tier1_hits']}/{report['images']} hits "
+              f"({report['tier1_hit_rate']:.0%}), {report['tier1_time']:.2f}s total")
+        print(f"Cascade tier 2 (full pass): {report['tier2_hits']}/{report['tier2_runs']} hits "
+              f"({report['tier2_hit_rate']:.0%}), {report['tier2_time']:.2f}s total")
+        print(f"Estimated time saved by early exits: {report['estimated_time_saved']:.2f}s")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
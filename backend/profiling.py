@@ -0,0 +1,157 @@
+"""
+On-demand profiling of a single request.
+
+Send the request with `X-Profile: <Config.PROFILE_TOKEN>` and it is profiled
+without restarting the service; other requests are untouched. Two modes,
+picked with the `X-Profile-Mode` header:
+
+    cprofile (default)  deterministic cProfile, saved as <id>.prof
+                        (pstats; open with snakeviz, flameprof or gprof2dot)
+    sample              wall-clock stack sampler, saved as <id>.folded
+                        (collapsed stacks for flamegraph.pl or speedscope)
+
+Only one cprofile request runs at a time: from Python 3.12 cProfile claims a
+process-wide profiler slot, so a second one gets 409 until the first ends.
+Sampled requests can overlap.
+
+Either way the SQL statements the request issued are saved to <id>.sql.json.
+Files go to Config.PROFILE_DIR and the id is returned in `X-Profile-Id`.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class StackSampler:
+    """Sample one thread's Python stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+# Held while a cProfile request is being profiled
+_cprofile_lock = threading.Lock()
+
+def authorized(token):
+    """True if the request carries `X-Profile: <token>`; always False without a token."""
+    supplied = request.headers.get('X-Profile')
+    return bool(token) and supplied is not None and hmac.compare_digest(supplied, token)
+
+def init_app(app):
+    """Enable header-triggered profiling when PROFILE_TOKEN is configured."""
+    token = app.config['PROFILE_TOKEN']
+    if not token:
+        return
+    output_dir = app.config['PROFILE_DIR']
+    interval = app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000.0
+    os.makedirs(output_dir, exist_ok=True)
+
+    def before_request():
+        if not authorized(token):
+            return
+        mode = request.headers.get('X-Profile-Mode', 'cprofile')
+        if mode != 'sample' and not _cprofile_lock.acquire(blocking=False):
+            return jsonify({"error": "Another cprofile request is being profiled; retry or use X-Profile-Mode: sample"}), 409
+        endpoint = (request.endpoint or 'unmatched').replace('.', '_')
+        state = {
+            "id": f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{endpoint}",
+            "mode": mode,
+            "started": time.perf_counter(),
+            "sql": []
+        }
+        if mode == 'sample':
+            state["profiler"] = StackSampler(threading.get_ident(), interval)
+            state["profiler"].start()
+        else:
+            state["profiler"] = cProfile.Profile()
+            state["profiler"].enable()
+        g._profile = state
+
+    def after_request(response):
+        state = g.pop('_profile', None)
+        if state is None:
+            return response
+        profiler = state["profiler"]
+        base = os.path.join(output_dir, state["id"])
+        if state["mode"] == 'sample':
+            profiler.stop()
+            with open(base + '.folded', 'w') as f:
+                f.write(profiler.folded())
+        else:
+            profiler.disable()
+            _cprofile_lock.release()
+            profiler.dump_stats(base + '.prof')
+        with open(base + '.sql.json', 'w') as f:
+            json.dump({
+                "method": request.method,
+                "path": request.full_path,
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - state["started"]) * 1000, 3),
+                "statements": state["sql"]
+            }, f, indent=2)
+        response.headers['X-Profile-Id'] = state["id"]
+        app.logger.info("Saved request profile %s", base)
+        return response
+
+    def teardown_request(exc):
+        # The view raised before after_request ran; don't leave a profiler running
+        state = g.pop('_profile', None)
+        if state is not None:
+            if state["mode"] == 'sample':
+                state["profiler"].stop()
+            else:
+                state["profiler"].disable()
+                _cprofile_lock.release()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profile_start = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        state = g.get('_profile') if has_request_context() else None
+        if state is not None:
+            state["sql"].append({
+                "statement": statement,
+                "parameters": repr(parameters)[:500],
+                "duration_ms": round((time.perf_counter() - context._profile_start) * 1000, 3)
+            })
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
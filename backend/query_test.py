@@ -8,6 +8,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # Import config
 from config import Config
+import tag_allocator
 
 # Create Flask app
 app = Flask(__name__)
@@ -39,17 +40,13 @@ def test_queries():
             print(f"\nTag ID {tag_id} is not associated with any instrument")
             
         # Test 3: Find available tag IDs (not yet assigned)
-        assigned_tags = [instr.tag_id for instr in Instrument.query.filter(Instrument.tag_id.isnot(None)).all()]
-        print(f"\nTotal number of assigned tags: {len(assigned_tags)}")
-        
-        # Find some available tags (first 5 unassigned tags)
-        available_tags = []
-        for i in range(1, 500):
-            if i not in assigned_tags:
-                available_tags.append(i)
-                if len(available_tags) >= 5:
-                    break
+        assigned_count = Instrument.query.filter(Instrument.tag_id.isnot(None)).count()
+        print(f"\nTotal number of assigned tags: {assigned_count}")
         
+        # The free list hands out the lowest unassigned tags, as /nfc/allocate_tags does
+        tag_allocator.ensure_tag_allocator(db.engine, app.config['TAG_ID_RANGES'])
+        available_tags = tag_allocator.peek(db.session, 5)
+        print(f"Free tag IDs: {tag_allocator.free_count(db.session)}")
         print(f"Sample available tag IDs: {available_tags}")
         
         # Test 4: Find instruments without tag IDs
@@ -5,7 +5,7 @@ Simple script to seed the database with fake instrument data.
 
 import os
 import sys
-from seed_database import seed_database
+import seed_database
 
 if __name__ == "__main__":
     # Check if the user wants to reset the database
@@ -18,6 +18,6 @@ if __name__ == "__main__":
     
     # Run the seed database function
     print("Seeding database with 350 fake instruments...")
-    seed_database()
+    seed_database.main()
     print("Done! The database now contains fake instruments for testing.")
     print("\nYou can now run the main API with: python main.py") 
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Batched ingestion of reads from fixed NFC gate readers.
+
+A gate reports the same tag many times a second while a case passes through
+it. Readers POST their reads to /nfc/scan_events as NDJSON, one
+{"tag_id", "reader_id", "timestamp"} object per line. Each batch goes through
+three steps:
+
+1. `ScanDeduplicator` drops a read when the same (tag_id, reader_id) was
+   seen less than Config.SCAN_DEDUP_WINDOW_MS earlier. The window slides: a
+   tag that sits in front of a reader stays one read until it has been gone
+   for a whole window.
+2. The tags that are left are resolved to instruments in chunked
+   `tag_id IN (...)` queries.
+3. `instrument_last_seen` gets one upsert per instrument for the whole batch.
+   Accepted reads also go to the scan history (scan_log.py).
+
+Dedup state is per process. With several gunicorn workers a duplicate can
+get through when its reads land on different workers. That costs one extra
+history row, and the last-seen upsert ignores older timestamps anyway.
+"""
+
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select, text
+
+import scan_log
+from models import Instrument
+
+RESOLVE_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 10
+
+LAST_SEEN_UPSERT = text("""
+    INSERT INTO instrument_last_seen (dbid, tag_id, reader_id, seen_at)
+    VALUES (:dbid, :tag_id, :reader_id, :seen_at)
+    ON CONFLICT (dbid) DO UPDATE SET
+        tag_id = excluded.tag_id, reader_id = excluded.reader_id, seen_at = excluded.seen_at
+    WHERE excluded.seen_at > instrument_last_seen.seen_at
+""")
+
+class ScanDeduplicator:
+    """Sliding-window duplicate filter keyed by (tag_id, reader_id).
+
+    Keys are kept in last-seen order, so expired ones are evicted from the
+    front; `max_keys` bounds memory if readers report huge numbers of tags.
+    """
+
+    def __init__(self, window_ms=2000, max_keys=100000):
+        self.window = window_ms / 1000.0
+        self.max_keys = max_keys
+        self._last_seen = OrderedDict()
+        self._newest = 0.0
+        self._lock = threading.Lock()
+
+    def filter(self, reads):
+        """The reads in `reads` that aren't duplicates, in order."""
+        accepted = []
+        last_seen = self._last_seen
+        window = self.window
+        with self._lock:
+            for read in reads:
+                key = (read[0], read[1])
+                timestamp = read[2]
+                previous = last_seen.get(key)
+                if previous is not None:
+                    last_seen.move_to_end(key)
+                    if timestamp < previous:
+                        # Late arrival from before the last read: already covered
+                        continue
+                    last_seen[key] = timestamp
+                    if timestamp - previous < window:
+                        continue
+                else:
+                    last_seen[key] = timestamp
+                accepted.append(read)
+                if timestamp > self._newest:
+                    self._newest = timestamp
+            self._evict()
+        return accepted
+
+    def _evict(self):
+        last_seen = self._last_seen
+        horizon = self._newest - self.window
+        while last_seen:
+            key, timestamp = next(iter(last_seen.items()))
+            if timestamp >= horizon and len(last_seen) <= self.max_keys:
+                break
+            del last_seen[key]
+
+    def __len__(self):
+        return len(self._last_seen)
+
+def parse_ndjson(body, max_lines, now=None, max_future_s=300.0, max_age_s=7 * 24 * 3600.0):
+    """(reads, errors): reads are (tag_id, reader_id, timestamp); errors are (line number, message).
+
+    Timestamps must be finite and between `max_age_s` before and
+    `max_future_s` after `now`. json.loads accepts NaN and Infinity, and one
+    read far in the future would hold the dedup window there.
+    """
+    now = time.time() if now is None else now
+    earliest = now - max_age_s
+    latest = now + max_future_s
+    reads = []
+    errors = []
+    loads = json.loads
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        if len(reads) + len(errors) >= max_lines:
+            errors.append((number, f"batch is over {max_lines} lines"))
+            break
+        try:
+            read = loads(line)
+            tag_id = read['tag_id']
+            reader_id = read['reader_id']
+            timestamp = read.get('timestamp', now)
+            if (type(tag_id) is not int or not isinstance(reader_id, str)
+                    or not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool)):
+                raise ValueError("tag_id must be an integer, reader_id a string and timestamp a number")
+            if not math.isfinite(timestamp):
+                raise ValueError("timestamp must be a finite number")
+            if not earliest <= timestamp <= latest:
+                raise ValueError(f"timestamp {timestamp} is too far from the server's time {now:.0f}")
+        except KeyError as e:
+            errors.append((number, f"missing {e}"))
+            continue
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append((number, str(e) if isinstance(e, ValueError) else "not a JSON object"))
+            continue
+        reads.append((tag_id, reader_id, float(timestamp)))
+    return reads, errors
+
+def resolve_tags(conn, tag_ids):
+    """{tag_id: dbid} for the paired tags among `tag_ids`."""
+    instrument = Instrument.__table__
+    tag_ids = list(tag_ids)
+    resolved = {}
+    for start in range(0, len(tag_ids), RESOLVE_CHUNK_SIZE):
+        chunk = tag_ids[start:start + RESOLVE_CHUNK_SIZE]
+        rows = conn.execute(select(instrument.c.tag_id, instrument.c.dbid).where(instrument.c.tag_id.in_(chunk)))
+        resolved.update(rows.all())
+    return resolved
+
+class ScanIngestor:
+    def __init__(self, window_ms=2000, max_keys=100000, max_lines=50000, max_future_s=300.0,
+                 max_age_s=7 * 24 * 3600.0):
+        self.dedup = ScanDeduplicator(window_ms, max_keys)
+        self.max_lines = max_lines
+        self.max_future = max_future_s
+        self.max_age = max_age_s
+        self._lock = threading.Lock()
+        self.stats = {'received': 0, 'invalid': 0, 'duplicates': 0, 'accepted': 0, 'unknown': 0}
+
+    def ingest(self, conn, body):
+        """Process one NDJSON batch; the caller commits. Returns the counts for the response."""
+        reads, errors = parse_ndjson(body, self.max_lines, max_future_s=self.max_future, max_age_s=self.max_age)
+        accepted = self.dedup.filter(reads)
+
+        # Latest accepted read per tag; one resolve and one upsert per instrument
+        latest = {}
+        for read in accepted:
+            current = latest.get(read[0])
+            if current is None or read[2] >= current[2]:
+                latest[read[0]] = read
+        resolved = resolve_tags(conn, latest) if latest else {}
+        if resolved:
+            conn.execute(LAST_SEEN_UPSERT, [
+                {"dbid": dbid, "tag_id": tag_id, "reader_id": latest[tag_id][1], "seen_at": latest[tag_id][2]}
+                for tag_id, dbid in resolved.items()
+            ])
+        for tag_id, reader_id, timestamp in accepted:
+            scan_log.record(tag_id, resolved.get(tag_id), reader_id, timestamp)
+
+        unknown = sorted(tag_id for tag_id in latest if tag_id not in resolved)
+        counts = {
+            "received": len(reads) + len(errors),
+            "invalid": len(errors),
+            "duplicates": len(reads) - len(accepted),
+            "accepted": len(accepted),
+            "unknown": len(unknown)
+        }
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+        counts.update({
+            "instruments_seen": len(resolved),
+            "unknown_tags": unknown[:MAX_REPORTED_ERRORS],
+            "errors": [{"line": number, "error": message} for number, message in errors[:MAX_REPORTED_ERRORS]]
+        })
+        return counts
+
+    def metrics_lines(self):
+        lines = [
+            "# HELP nfc_scan_ingest_reads_total Gate reads received, rejected as invalid, dropped as duplicates "
+            "and accepted; unknown counts unpaired tags once per batch.",
+            "# TYPE nfc_scan_ingest_reads_total counter"
+        ]
+        for outcome in ('received', 'invalid', 'duplicates', 'accepted', 'unknown'):
+            lines.append(f'nfc_scan_ingest_reads_total{{outcome="{outcome}"}} {self.stats[outcome]}')
+        lines += [
+            "# HELP nfc_scan_dedup_keys (tag_id, reader_id) pairs inside the dedup window.",
+            "# TYPE nfc_scan_dedup_keys gauge",
+            f"nfc_scan_dedup_keys {len(self.dedup)}"
+        ]
+        return lines
@@ -0,0 +1,175 @@
+"""
+Write-behind log of tag scans.
+
+`record()` puts a scan (tag, instrument, reader, time) on an in-process queue
+and returns; it costs a few microseconds and never touches the database. A
+background thread writes queued scans to the append-only `scan_event` table,
+one transaction per batch, as soon as Config.SCAN_LOG_BATCH_SIZE scans are
+waiting or Config.SCAN_LOG_FLUSH_MS after the first of them was recorded. So
+/nfc/instrument_by_tag never waits on SQLite's write lock for its own history.
+
+The queue holds at most Config.SCAN_LOG_CAPACITY scans. When the database
+falls that far behind, `record()` waits up to Config.SCAN_LOG_BLOCK_MS for
+room and then drops the scan, counted in nfc_scan_log_events_total. `drain()`
+writes everything recorded so far; it runs at interpreter exit and from
+gunicorn's worker_exit hook.
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+
+from sqlalchemy import create_engine
+
+import metrics
+
+logger = logging.getLogger('scan_log')
+
+class _Drain:
+    """Queue marker: set once every scan queued before it is written."""
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+class ScanLog:
+    def __init__(self, database_url, batch_size=500, flush_ms=250, capacity=20000, block_ms=2):
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.capacity = capacity
+        self.block = block_ms / 1000.0
+        self._pid = None
+        self._queue = None
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'dropped': 0, 'written': 0, 'failed': 0, 'batches': 0}
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each process starts its own writer
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.capacity)
+                    threading.Thread(target=self._run, args=(self._queue,), name='scan-log', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def record(self, tag_id, dbid=None, reader_id=None, scanned_at=None):
+        """Queue one scan; False if it was dropped because the queue stayed full."""
+        self._ensure_thread()
+        event = (tag_id, dbid, reader_id, time.time() if scanned_at is None else scanned_at)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            try:
+                self._queue.put(event, timeout=self.block)
+            except queue.Full:
+                with self._lock:
+                    self.stats['dropped'] += 1
+                return False
+        with self._lock:
+            self.stats['recorded'] += 1
+        return True
+
+    def drain(self, timeout=5.0):
+        """Wait until every scan recorded so far in this process is written; False on timeout."""
+        if self._pid != os.getpid():
+            return True
+        marker = _Drain()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def _run(self, q):
+        from models import ScanEvent
+        insert = ScanEvent.__table__.insert()
+        engine = create_engine(self.database_url)
+        while True:
+            batch = []
+            markers = []
+            item = q.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, _Drain):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(engine, insert, batch)
+            for marker in markers:
+                marker.done.set()
+
+    def _write(self, engine, insert, batch):
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert, [
+                    {"tag_id": tag_id, "dbid": dbid, "reader_id": reader_id, "scanned_at": scanned_at}
+                    for tag_id, dbid, reader_id, scanned_at in batch
+                ])
+        except Exception:
+            self.stats['failed'] += len(batch)
+            logger.exception("Dropped %d scan events", len(batch))
+            return
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+
+    def metrics_lines(self):
+        lines = [
+            "# HELP nfc_scan_log_events_total Scan events recorded, dropped on backpressure, written and failed.",
+            "# TYPE nfc_scan_log_events_total counter"
+        ]
+        for outcome in ('recorded', 'dropped', 'written', 'failed'):
+            lines.append(f'nfc_scan_log_events_total{{outcome="{outcome}"}} {self.stats[outcome]}')
+        lines += [
+            "# HELP nfc_scan_log_batches_total Batched scan log transactions committed.",
+            "# TYPE nfc_scan_log_batches_total counter",
+            f"nfc_scan_log_batches_total {self.stats['batches']}",
+            "# HELP nfc_scan_log_queue_depth Scan events waiting to be written.",
+            "# TYPE nfc_scan_log_queue_depth gauge",
+            f"nfc_scan_log_queue_depth {self._queue.qsize() if self._pid == os.getpid() else 0}"
+        ]
+        return lines
+
+# Set by init_app(); None while scan logging is disabled
+_log = None
+
+def record(tag_id, dbid=None, reader_id=None, scanned_at=None):
+    """Queue a scan for the log; a no-op when it's disabled."""
+    if _log is not None:
+        _log.record(tag_id, dbid, reader_id, scanned_at)
+
+def drain(timeout=5.0):
+    """Write out queued scans, e.g. before the process exits."""
+    return _log.drain(timeout) if _log is not None else True
+
+def configure(settings):
+    """Create the process's scan log from a settings mapping, flushed at exit; None while disabled."""
+    global _log
+    if not settings['SCAN_LOG_ENABLED']:
+        return None
+    _log = ScanLog(
+        settings['SQLALCHEMY_DATABASE_URI'],
+        batch_size=settings['SCAN_LOG_BATCH_SIZE'],
+        flush_ms=settings['SCAN_LOG_FLUSH_MS'],
+        capacity=settings['SCAN_LOG_CAPACITY'],
+        block_ms=settings['SCAN_LOG_BLOCK_MS']
+    )
+    atexit.register(drain)
+    return _log
+
+def init_app(app):
+    """Create the app's scan log from its config, exported at /metrics."""
+    log = configure(app.config)
+    if log is not None:
+        metrics.registry.add_collector(log.metrics_lines)
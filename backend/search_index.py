@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Full-text and prefix search over instruments with SQLite FTS5.
+
+`instrument_fts` is an external-content FTS5 index over name, manufacturer,
+model and serial, kept in sync with the instrument table by triggers, so
+every write path (ORM, Core, raw SQL) updates it. Every word of a query must
+match a whole word in one of those columns, except the last, which is still
+being typed and only has to match the start of one ("gibson j", "2105");
+prefix indexes for 1-6 characters keep that cheap while typing.
+
+Each keystroke does a bounded amount of work, however common the words are:
+the newest MAX_CANDIDATES matches are taken from the index twice, once
+matching only in manufacturer, model and serial and once in any column, and
+only those are scored in Python with per-column weights. bm25() would need
+each term's document frequency, which means reading its whole doclist (every
+Gibson in the inventory) on every keystroke.
+
+    python search_index.py --rows 1000000       # latency benchmark at 1M rows
+"""
+
+import os
+import re
+import functools
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+from sqlalchemy import text
+
+from serializers import instrument_row_to_dict
+
+FTS_TABLE = 'instrument_fts'
+# Ranking weight of a word found in each column
+COLUMN_WEIGHTS = (('model', 3.0), ('manufacturer', 3.0), ('serial', 2.0), ('name', 1.0))
+# Columns whose matches are always among the candidates, however many newer name-only ones there are
+STRONG_COLUMNS = ('manufacturer', 'model', 'serial')
+PREFIX_LENGTHS = (1, 2, 3, 4, 5, 6)
+MAX_CANDIDATES = 200
+MAX_QUERY_TOKENS = 8
+
+SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, manufacturer, model, serial,
+        content='instrument', content_rowid='dbid',
+        prefix='{' '.join(str(n) for n in PREFIX_LENGTHS)}'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON instrument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, manufacturer, model, serial)
+        VALUES (new.dbid, new.name, new.manufacturer, new.model, new.serial);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON instrument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, manufacturer, model, serial)
+        VALUES ('delete', old.dbid, old.name, old.manufacturer, old.model, old.serial);
+    END""",
+    # Pairing and storage moves only touch tag_id/storage_id and skip this
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, manufacturer, model, serial
+        ON instrument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, manufacturer, model, serial)
+        VALUES ('delete', old.dbid, old.name, old.manufacturer, old.model, old.serial);
+        INSERT INTO {FTS_TABLE}(rowid, name, manufacturer, model, serial)
+        VALUES (new.dbid, new.name, new.manufacturer, new.model, new.serial);
+    END"""
+]
+
+RESULT_COLUMNS = """i.dbid, i.tag_id, i.name, i.manufacturer, i.model, i.serial, i.manufacture_date,
+    s.name AS storage_name"""
+
+# Newest matches only: FTS5 walks the doclists backwards and stops at :candidates
+SEARCH_SQL = text(f"""
+    WITH hits AS (
+        SELECT rowid FROM (
+            SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :strong ORDER BY rowid DESC LIMIT :candidates)
+        UNION
+        SELECT rowid FROM (
+            SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rowid DESC LIMIT :candidates)
+    )
+    SELECT {RESULT_COLUMNS}
+    FROM hits
+    JOIN instrument i ON i.dbid = hits.rowid
+    LEFT JOIN storage s ON s.id = i.storage_id
+""")
+
+# Used where FTS5 isn't available (another database, or SQLite built without it).
+# Cruder than the index: only the first query word is used, and it has to
+# match the start of a column's value, not of any word in it.
+FALLBACK_SQL = text(f"""
+    SELECT {RESULT_COLUMNS}
+    FROM instrument i
+    LEFT JOIN storage s ON s.id = i.storage_id
+    WHERE i.serial LIKE :prefix OR i.name LIKE :prefix OR i.manufacturer LIKE :prefix OR i.model LIKE :prefix
+    ORDER BY i.dbid DESC
+    LIMIT :candidates
+""")
+
+# Set by ensure_search_index(); None until then
+_available = None
+
+def tokenize(value):
+    """Lowercased alphanumeric words, matching FTS5's unicode61 tokenizer closely enough."""
+    return re.findall(r'[^\W_]+', (value or '').lower())
+
+def match_expression(tokens):
+    """FTS5 query requiring every token as a whole word, and the last one, still being typed, as a prefix.
+
+    A last token longer than the longest prefix index is cut to that length:
+    FTS5 would otherwise merge the doclists of every term it starts, in full,
+    before the LIMIT applies. score() drops the extra matches this lets in.
+    """
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] = f'"{tokens[-1][:max(PREFIX_LENGTHS)]}"*'
+    return ' '.join(terms)
+
+@functools.lru_cache(maxsize=65536)
+def _words(value):
+    # Manufacturer and model values repeat across candidates, so most of these are hits
+    return tuple(tokenize(value))
+
+def score(row, tokens):
+    """Relevance of one candidate, or None if a token doesn't match: each token's best column weight, doubled for a whole word."""
+    total = 0.0
+    fields = [(_words(getattr(row, column)), weight) for column, weight in COLUMN_WEIGHTS]
+    last = len(tokens) - 1
+    for n, token in enumerate(tokens):
+        best = 0.0
+        for words, weight in fields:
+            if token in words:
+                best = max(best, 2 * weight)
+            elif n == last and any(w.startswith(token) for w in words):
+                best = max(best, weight)
+        if best == 0.0:
+            return None
+        total += best
+    return total
+
+def search(conn, query, limit=20):
+    """Best `limit` instruments for `query`; `conn` is a SQLAlchemy Connection or Session."""
+    tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+    if _available:
+        match = match_expression(tokens)
+        rows = conn.execute(SEARCH_SQL, {
+            "match": match,
+            "strong": f"{{{' '.join(STRONG_COLUMNS)}}} : ({match})",
+            "candidates": MAX_CANDIDATES
+        })
+    else:
+        rows = conn.execute(FALLBACK_SQL, {"prefix": tokens[0] + '%', "candidates": MAX_CANDIDATES})
+    scored = []
+    for row in rows:
+        s = score(row, tokens)
+        if s is not None:
+            scored.append((-s, -row.dbid, row))
+    # Best score first, ties to the newest
+    scored.sort(key=lambda item: item[:2])
+    return [instrument_row_to_dict(row) for _, _, row in scored[:limit]]
+
+def ensure_search_index(engine):
+    """Create the index and triggers if missing (filling it from instrument); False without FTS5."""
+    global _available
+    if engine.dialect.name != 'sqlite':
+        _available = False
+        return False
+    with engine.begin() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)).first()
+        try:
+            for statement in SCHEMA:
+                conn.exec_driver_sql(statement)
+        except Exception as e:
+            if 'fts5' not in str(e):
+                raise
+            print(f"FTS5 not available ({e}); search falls back to LIKE prefix matching")
+            _available = False
+            return False
+        if not exists:
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _available = True
+    return True
+
+def drop_search_index(engine):
+    """Remove the index and its triggers, e.g. before a bulk load; ensure_search_index() rebuilds it."""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        for suffix in ('ai', 'ad', 'au'):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+def rebuild_search_index(engine):
+    """Recreate the index from the instrument table."""
+    drop_search_index(engine)
+    return ensure_search_index(engine)
+
+def typing_sequences(conn, count, seed):
+    """Keystroke-by-keystroke queries for random instruments: 'manufacturer model' and serials."""
+    rng = random.Random(seed)
+    max_dbid = conn.exec_driver_sql("SELECT max(dbid) FROM instrument").scalar() or 0
+    queries = []
+    for _ in range(count):
+        row = conn.exec_driver_sql(
+            "SELECT manufacturer, model, serial FROM instrument WHERE dbid >= ? LIMIT 1",
+            (rng.randint(1, max_dbid),)).first()
+        if row is None:
+            continue
+        phrase = f"{row.manufacturer} {row.model}".lower()
+        queries += [phrase[:n] for n in range(1, len(phrase) + 1)]
+        queries += [row.serial[:n] for n in range(2, len(row.serial) + 1)]
+    return queries
+
+def main():
+    from sqlalchemy import create_engine
+    from generate_inventory import generate_inventory
+    from load_test import percentile
+
+    parser = argparse.ArgumentParser(description="Search latency benchmark")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='existing SQLite inventory (default: generate one in a temp dir)')
+    parser.add_argument('--sequences', type=int, default=50, help='instruments to type queries for')
+    parser.add_argument('--target-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'search_bench.db')
+        if not args.db:
+            print(f"Generating {args.rows} instruments...")
+            generate_inventory('sqlite:///' + db_path, args.rows, args.seed)
+        engine = create_engine('sqlite:///' + db_path)
+        start = time.perf_counter()
+        if not ensure_search_index(engine):
+            sys.exit(1)
+        print(f"Index ready in {time.perf_counter() - start:.1f}s")
+
+        with engine.connect() as conn:
+            queries = typing_sequences(conn, args.sequences, args.seed)
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                search(conn, query)
+                latencies.append(time.perf_counter() - start)
+        engine.dispose()
+
+    p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+    print(f"{len(queries)} queries: p50 {p50:.2f} ms  p95 {p95:.2f} ms  p99 {p99:.2f} ms  "
+          f"max {max(latencies) * 1000:.2f} ms")
+    if p99 > args.target_ms:
+        print(f"p99 is over the {args.target_ms:g} ms target")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,11 @@ from models import db, Instrument
 from main import app
 import random
 
-def generate_serial():
+def generate_serial(rng=random):
     manufacturers = ['F', 'G', 'M', 'I', 'Y', 'T', 'S', 'R', 'P', 'C']
-    return f"{random.choice(manufacturers)}{random.randint(100000, 999999)}"
+    return f"{rng.choice(manufacturers)}{rng.randint(100000, 999999)}"
 
-def generate_instrument():
+def generate_instrument(rng=random):
     manufacturers = ['Fender', 'Gibson', 'Martin', 'Ibanez', 'Yamaha', 'Taylor', 'Seagull', 'Rickenbacker', 'PRS', 'Cort']
     models = {
         'Fender': ['Stratocaster', 'Telecaster', 'Jazzmaster', 'Mustang', 'Precision Bass'],
@@ -21,27 +21,29 @@ def generate_instrument():
         'Cort': ['G', 'CR', 'L', 'X', 'Earth']
     }
     
-    manufacturer = random.choice(manufacturers)
-    model = random.choice(models[manufacturer])
+    manufacturer = rng.choice(manufacturers)
+    model = rng.choice(models[manufacturer])
     name = f"{manufacturer} {model}"
     
     return Instrument(
         name=name,
         manufacturer=manufacturer,
         model=model,
-        serial=generate_serial(),
-        manufacture_date=random.randint(2010, 2024),
+        serial=generate_serial(rng),
+        manufacture_date=rng.randint(2010, 2024),
         storage=None,
         tag_id=None
     )
 
-def seed_database():
+def seed_database(seed=None):
+    # Same seed, same instruments
+    rng = random.Random(seed)
     with app.app_context():
         # Clear existing data
         Instrument.query.delete()
         
         # Generate 350 instruments
-        instruments = [generate_instrument() for _ in range(350)]
+        instruments = [generate_instrument(rng) for _ in range(350)]
         
         # Add all instruments to the database
         db.session.add_all(instruments)
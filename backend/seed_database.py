@@ -5,6 +5,7 @@ import sys
 from datetime import datetime
 from flask import Flask
 from models import db, Instrument, Storage
+from inventory_stats import inventory_stats
 
 # Path manipulation to ensure we can import from the current directory
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
@@ -12,11 +13,6 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 # Import config
 from config import Config
 
-# Create Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
-
 # Guitar manufacturers and their common models
 manufacturers = {
     "Taylor": [
@@ -59,29 +55,29 @@ manufacturers = {
     ]
 }
 
-# Generate random serial numbers based on manufacturer
-def generate_serial(manufacturer, year):
+# Generate random serial numbers based on manufacturer; pass a seeded random.Random for reproducible data
+def generate_serial(manufacturer, year, rng=random):
     if manufacturer == "Taylor":
         # 10-digit format (2009-present)
         if year >= 2009:
-            factory = random.choice(["1", "2"])  # 1 for El Cajon, 2 for Mexico
+            factory = rng.choice(["1", "2"])  # 1 for El Cajon, 2 for Mexico
             y1 = str(year)[2]  # Third digit of year
             y2 = str(year)[3]  # Fourth digit of year
-            month = f"{random.randint(1, 12):02d}"
-            day = f"{random.randint(1, 28):02d}"
-            sequence = f"{random.randint(0, 999):03d}"
+            month = f"{rng.randint(1, 12):02d}"
+            day = f"{rng.randint(1, 28):02d}"
+            sequence = f"{rng.randint(0, 999):03d}"
             return f"{factory}{y1}{month}{day}{y2}{sequence}"
         # 9-digit format (1993-1999)
         elif 1993 <= year <= 1999:
             yy = str(year)[2:]  # Last two digits
-            month = f"{random.randint(1, 12):02d}"
-            day = f"{random.randint(1, 28):02d}"
-            series = random.choice(["0", "1", "2", "3", "7", "8"])
-            sequence = f"{random.randint(0, 99):02d}"
+            month = f"{rng.randint(1, 12):02d}"
+            day = f"{rng.randint(1, 28):02d}"
+            series = rng.choice(["0", "1", "2", "3", "7", "8"])
+            sequence = f"{rng.randint(0, 99):02d}"
             return f"{yy}{month}{day}{series}{sequence}"
         # 5-digit format (classic)
         else:
-            return f"{random.randint(5000, 17000)}"
+            return f"{rng.randint(5000, 17000)}"
     
     elif manufacturer == "Martin":
         # Standard Martin format
@@ -95,38 +91,40 @@ def generate_serial(manufacturer, year):
                 2020: 2366881, 2021: 2440000, 2022: 2576416, 2023: 2711441
             }.get(year, 2800000)
             
-            offset = random.randint(0, 50000)
+            offset = rng.randint(0, 50000)
             return f"{base + offset}"
         else:
-            return f"{random.randint(300000, 700000)}"
+            return f"{rng.randint(300000, 700000)}"
     
     elif manufacturer == "Gibson":
         if year >= 2000:
             # Modern Gibson YDDDYRRRRR format (Y=last digit of year, DDD=day of year, RRRRR=ranking number)
             y = str(year)[-1]
-            ddd = f"{random.randint(1, 365):03d}"
-            rrrrr = f"{random.randint(1, 999):03d}"
+            ddd = f"{rng.randint(1, 365):03d}"
+            rrrrr = f"{rng.randint(1, 999):03d}"
             return f"{y}{ddd}{y}{rrrrr}"
         else:
             # Historical format
-            return ''.join(random.choices(string.digits, k=8))
+            return ''.join(rng.choices(string.digits, k=8))
     
     else:
         # Generic serial number with year prefix
         year_prefix = str(year)[-2:]
-        return f"{year_prefix}{random.randint(100000, 999999)}"
+        return f"{year_prefix}{rng.randint(100000, 999999)}"
 
 # Generate a random name for an instrument
-def generate_name(manufacturer, model):
+def generate_name(manufacturer, model, rng=random):
     adjectives = ["Vintage", "Classic", "Custom", "Special", "Signature", "Elite", "Premium", "Standard", "Professional", "Deluxe"]
-    if random.random() < 0.7:  # 70% chance to get a name
-        return f"{random.choice(adjectives)} {manufacturer} {model}"
+    if rng.random() < 0.7:  # 70% chance to get a name
+        return f"{rng.choice(adjectives)} {manufacturer} {model}"
     else:
         # Just use manufacturer and model
         return f"{manufacturer} {model}"
 
 # Main function to seed the database
-def seed_database():
+def seed_database(app, seed=None):
+    # Same seed, same instruments; generate_inventory.py builds larger datasets
+    rng = random.Random(seed)
     with app.app_context():
         print("Clearing existing data...")
         # Clear existing data
@@ -153,15 +151,15 @@ def seed_database():
         instruments = []
         
         for i in range(350):
-            manufacturer = random.choice(list(manufacturers.keys()))
-            model = random.choice(manufacturers[manufacturer])
-            year = random.randint(1980, 2023)
-            serial = generate_serial(manufacturer, year)
+            manufacturer = rng.choice(list(manufacturers.keys()))
+            model = rng.choice(manufacturers[manufacturer])
+            year = rng.randint(1980, 2023)
+            serial = generate_serial(manufacturer, year, rng)
             
             # No storage or tag_id assigned initially
             instrument = Instrument(
                 tag_id=None,  # No tag_id assigned
-                name=generate_name(manufacturer, model),
+                name=generate_name(manufacturer, model, rng),
                 manufacturer=manufacturer,
                 model=model,
                 serial=serial,
@@ -177,16 +175,22 @@ def seed_database():
         
         print(f"Successfully added 350 instruments to the database.")
         
-        # Display some stats
-        tagged_count = db.session.query(Instrument).filter(Instrument.tag_id.isnot(None)).count()
-        untagged_count = db.session.query(Instrument).filter(Instrument.tag_id.is_(None)).count()
-        print(f"Tagged instruments: {tagged_count}")
-        print(f"Untagged instruments: {untagged_count}")
+        # Display some stats (one grouped query, the same numbers /nfc/stats serves)
+        stats = inventory_stats(db.session)
+        print(f"Tagged instruments: {stats['tagged']}")
+        print(f"Untagged instruments: {stats['untagged']}")
         
         # Manufacturers count
         for manufacturer in manufacturers.keys():
-            count = db.session.query(Instrument).filter_by(manufacturer=manufacturer).count()
-            print(f"{manufacturer}: {count} instruments")
+            print(f"{manufacturer}: {stats['by_manufacturer'].get(manufacturer, 0)} instruments")
+
+def main(seed=None):
+    """Seed the configured database through a minimal Flask app."""
+    # Built here rather than at import, so generate_inventory.py can reuse the tables above without one
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    seed_database(app, seed)
 
 if __name__ == "__main__":
-    seed_database() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Column-tuple serialization for bulk instrument responses.
+
+Instrument.to_dict() on ORM objects pays for building each object, putting it
+in the identity map and lazy-loading its storage before a dict is made. For
+listings that is most of the CPU time. Bulk endpoints instead select just the
+columns they return as row tuples, with the storage name joined in, and
+encode them to JSON bytes in one call. orjson is used when it is installed
+and the standard json module otherwise.
+
+    python serializers.py --rows 100000     # compare against the to_dict() path
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+
+from sqlalchemy import select
+
+from models import Instrument, Storage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+instrument_table = Instrument.__table__
+storage_table = Storage.__table__
+
+# Instrument columns plus the storage name, the same fields as Instrument.to_dict()
+INSTRUMENT_SELECT = select(
+    instrument_table.c.dbid,
+    instrument_table.c.tag_id,
+    instrument_table.c.name,
+    instrument_table.c.manufacturer,
+    instrument_table.c.model,
+    instrument_table.c.serial,
+    instrument_table.c.manufacture_date,
+    storage_table.c.name.label('storage_name')
+).select_from(
+    instrument_table.outerjoin(storage_table, instrument_table.c.storage_id == storage_table.c.id)
+)
+
+def listing_criteria(args):
+    """WHERE criteria for /nfc/instruments' query-string filters; ValueError names a bad one.
+
+    Shared by main.py and asgi_app.py. An unparsable filter is an error rather
+    than silently ignored, which would list everything.
+    """
+    criteria = []
+    manufacturer = args.get('manufacturer')
+    if manufacturer:
+        criteria.append(instrument_table.c.manufacturer == manufacturer)
+    storage_id = args.get('storage_id')
+    if storage_id:
+        if storage_id == 'none':
+            criteria.append(instrument_table.c.storage_id.is_(None))
+        elif storage_id.isdigit():
+            criteria.append(instrument_table.c.storage_id == int(storage_id))
+        else:
+            raise ValueError("storage_id must be an integer or 'none'")
+    year_from = args.get('year_from')
+    if year_from:
+        if not year_from.isdigit():
+            raise ValueError("year_from must be an integer")
+        criteria.append(instrument_table.c.manufacture_date >= int(year_from))
+    year_to = args.get('year_to')
+    if year_to:
+        if not year_to.isdigit():
+            raise ValueError("year_to must be an integer")
+        criteria.append(instrument_table.c.manufacture_date <= int(year_to))
+    tagged = args.get('tagged')
+    if tagged in ('true', '1'):
+        criteria.append(instrument_table.c.tag_id.isnot(None))
+    elif tagged in ('false', '0'):
+        criteria.append(instrument_table.c.tag_id.is_(None))
+    elif tagged:
+        raise ValueError("tagged must be one of true, false, 1 or 0")
+    return criteria
+
+def instrument_row_to_dict(row):
+    """Same shape as Instrument.to_dict(), from a row with a storage_name column."""
+    return {
+        "dbid": row.dbid,
+        "tag_id": row.tag_id,
+        "name": row.name,
+        "manufacturer": row.manufacturer,
+        "model": row.model,
+        "serial": row.serial,
+        "manufacture_date": row.manufacture_date,
+        "storage": row.storage_name if row.storage_name is not None else "Unassigned"
+    }
+
+def dumps(payload):
+    """JSON bytes for `payload`."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def json_response(payload, status=200):
+    """Flask response for `payload`, encoded with dumps() instead of jsonify()."""
+    from flask import Response
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+def main():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from generate_inventory import generate_inventory
+
+    parser = argparse.ArgumentParser(description="to_dict() vs column-tuple serialization benchmark")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='best of this many runs per path')
+    parser.add_argument('--db', help='existing SQLite inventory (default: generate one in a temp dir)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'serialize_bench.db')
+        if not args.db:
+            print(f"Generating {args.rows} instruments...")
+            generate_inventory('sqlite:///' + db_path, args.rows, search_index=False)
+        engine = create_engine('sqlite:///' + db_path)
+
+        def orm_path():
+            with Session(engine) as session:
+                return json.dumps([i.to_dict() for i in session.query(Instrument).all()]).encode()
+
+        def tuple_path():
+            with engine.connect() as conn:
+                return dumps([instrument_row_to_dict(row) for row in conn.execute(INSTRUMENT_SELECT)])
+
+        results = {}
+        for name, path in (('to_dict + json', orm_path), ('tuples + ' + ('orjson' if orjson else 'json'), tuple_path)):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                body = path()
+                timings.append(time.perf_counter() - start)
+            results[name] = min(timings)
+            print(f"{name:<18} {min(timings) * 1000:8.0f} ms  {len(body) / 1e6:6.1f} MB")
+        engine.dispose()
+
+    baseline, fast = results.values()
+    print(f"Column tuples are {baseline / fast:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import copy
+import threading
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs `fn`; callers that arrive while it is
+    still running wait for it and receive the same result. If it raises,
+    each waiter raises its own copy of the exception, chained to the
+    original, so concurrent raises never share one traceback. Nothing is cached once the call finishes, so results are never stale.
+    Shared results are handed to several requests and must not be mutated.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {
+            'calls': 0,
+            'executions': 0,
+            'coalesced': 0,
+            'errors': 0
+        }
+
+    def do(self, key, fn):
+        with self._lock:
+            self.stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats['executions'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                # Raising the leader's exception object itself would append every
+                # waiter's frames to its one shared __traceback__
+                raise copy.copy(call.error) from call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, 'in_flight': len(self._calls)}
@@ -0,0 +1,133 @@
+"""
+Slow-query log for the SQLAlchemy engine.
+
+Statements slower than Config.SLOW_QUERY_THRESHOLD_MS are recorded with their
+bound parameters, the route that issued them and SQLite's EXPLAIN QUERY PLAN,
+in a fixed-size ring buffer shown at /nfc/debug/slow_queries. The parameters
+hold serials and tag ids, so the endpoint answers only requests carrying
+the profiling token (`X-Profile: <Config.PROFILE_TOKEN>`). On hot routes
+every distinct statement is also explained once, however fast it was, so
+full-table scans get flagged before the table is big enough to be slow.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import jsonify, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from profiling import authorized
+
+logger = logging.getLogger('slow_query')
+
+def _short(value, limit=200):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+def is_full_table_scan(plan):
+    """True if any step of an EXPLAIN QUERY PLAN scans a table without an index."""
+    for detail in plan:
+        # FTS5 lookups show up as "SCAN <table> VIRTUAL TABLE INDEX ..." but use the full-text index
+        if (detail.startswith('SCAN') and 'USING' not in detail and 'CONSTANT ROW' not in detail
+                and 'VIRTUAL TABLE' not in detail):
+            return True
+    return False
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=100.0, capacity=200, hot_routes=()):
+        self.threshold = threshold_ms / 1000.0
+        self.hot_routes = set(hot_routes)
+        self.entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        # (route, statement) pairs already explained on hot routes
+        self._checked = set()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._slowlog_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._slowlog_start
+        route = None
+        if has_request_context() and request.url_rule is not None:
+            route = request.url_rule.rule
+
+        slow = elapsed >= self.threshold
+        check_hot = False
+        if route in self.hot_routes:
+            key = (route, statement)
+            with self._lock:
+                if key not in self._checked:
+                    self._checked.add(key)
+                    check_hot = True
+        if not slow and not check_hot:
+            return
+
+        plan = []
+        if not executemany and conn.dialect.name == 'sqlite' and statement.lstrip().upper().startswith('SELECT'):
+            plan = self.explain(conn, statement, parameters)
+        full_scan = is_full_table_scan(plan)
+        if not slow and not full_scan:
+            return
+
+        entry = {
+            "at": datetime.now().isoformat(timespec='milliseconds'),
+            "duration_ms": round(elapsed * 1000, 3),
+            "route": route,
+            "statement": statement,
+            "parameters": _short(parameters),
+            "plan": plan,
+            "full_table_scan": full_scan,
+            "slow": slow
+        }
+        with self._lock:
+            self.entries.append(entry)
+        if full_scan and route in self.hot_routes:
+            logger.warning("Full table scan on hot route %s: %s | plan: %s", route, statement, '; '.join(plan))
+        elif slow:
+            logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, statement)
+
+    def explain(self, conn, statement, parameters):
+        """EXPLAIN QUERY PLAN on the raw DBAPI connection, bypassing engine events."""
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                return [row[3] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+
+    def snapshot(self):
+        with self._lock:
+            entries = list(self.entries)
+        entries.reverse()
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "hot_routes": sorted(self.hot_routes),
+            "entries": entries,
+            "full_table_scans": [e for e in entries if e["full_table_scan"]]
+        }
+
+def init_app(app):
+    """Attach the slow-query log to all engines and add /nfc/debug/slow_queries."""
+    log = SlowQueryLog(
+        threshold_ms=app.config['SLOW_QUERY_THRESHOLD_MS'],
+        capacity=app.config['SLOW_QUERY_LOG_SIZE'],
+        hot_routes=app.config['SLOW_QUERY_HOT_ROUTES']
+    )
+    event.listen(Engine, 'before_cursor_execute', log._before)
+    event.listen(Engine, 'after_cursor_execute', log._after)
+
+    def slow_queries():
+        """Recent slow statements and flagged full-table scans, newest first."""
+        if not authorized(app.config['PROFILE_TOKEN']):
+            return jsonify({"error": "Send X-Profile with the PROFILE_TOKEN"}), 403
+        return jsonify(log.snapshot()), 200
+
+    app.add_url_rule('/nfc/debug/slow_queries', 'slow_queries', slow_queries, methods=['GET'])
+    return log
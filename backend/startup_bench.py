@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure cold-start time of the API module and check it against a budget.
+
+Each run imports the module in a fresh interpreter with `-X importtime`, so
+nothing is cached in-process. Reports wall time per run and the slowest
+imports by cumulative time, and exits non-zero when the median run is over
+Config.STARTUP_BUDGET_MS.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+from config import Config
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (cumulative_us, self_us, module) tuples."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+def cold_start(module, env):
+    """Import `module` in a new interpreter; return wall seconds and import timings."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+        raise SystemExit(f"Importing {module} failed")
+    return elapsed, parse_importtime(proc.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the API")
+    parser.add_argument('--module', default='main', help='module to import (default: main)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='how many of the slowest imports to list')
+    parser.add_argument('--budget-ms', type=float, default=Config.STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    # The warm-up thread runs after import, but don't let it compete with the measurement
+    env = dict(os.environ, OCR_WARMUP='0')
+    times = []
+    imports = []
+    for run in range(args.runs):
+        elapsed, imports = cold_start(args.module, env)
+        times.append(elapsed)
+        print(f"run {run + 1}: {elapsed * 1000:.0f} ms")
+
+    median_ms = statistics.median(times) * 1000
+    print(f"\nSlowest imports (cumulative, last run):")
+    top_level = {}
+    for cumulative_us, _, name in imports:
+        # Nested imports are indented; keep the top-level package entries
+        if not name.startswith('  '):
+            top_level[name.strip()] = cumulative_us
+    for name, cumulative_us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    print(f"\nMedian cold start: {median_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    loaded = {name.strip() for _, _, name in imports}
+    for heavy in ('torch', 'easyocr', 'cv2'):
+        if heavy in loaded:
+            print(f"WARNING: {heavy} is imported at startup")
+    if median_ms > args.budget_ms:
+        print("Over budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Free-list allocator for NFC tag ids.
+
+`free_tag` holds every id inside the configured ranges (Config.TAG_ID_RANGES,
+mirrored in `tag_range`) that no instrument is paired with. Triggers on the
+instrument table keep it exact inside each write's transaction: pairing
+removes the id, and unpairing or deleting the instrument puts it back. Each
+of those is a primary-key insert or delete.
+
+`allocate(conn, count)` takes the lowest free ids with a single
+`DELETE ... RETURNING`, so concurrent callers (threads or gunicorn workers)
+never get the same id, and records them in `tag_reservation` under a new
+random token. Pairing a reserved id consumes its reservation. `release()`
+hands back only the ids reserved under the caller's token, and reservations
+still unpaired after Config.TAG_RESERVATION_TTL_S return to the free list on
+the next allocation. Rebuilding the list after a range change leaves
+reserved ids out of it.
+"""
+
+import time
+import secrets
+import sqlite3
+
+from sqlalchemy import text
+
+FREE_TABLE = 'free_tag'
+RANGE_TABLE = 'tag_range'
+RESERVATION_TABLE = 'tag_reservation'
+MAX_ALLOCATION = 1000
+
+TRIGGERS = ('ai', 'ad', 'au')
+
+# Put an id back if it's in a configured range and no other instrument still holds it
+_RELEASE_OLD = f"""
+        INSERT OR IGNORE INTO {FREE_TABLE} (tag_id)
+        SELECT old.tag_id
+        WHERE EXISTS (SELECT 1 FROM {RANGE_TABLE} WHERE old.tag_id BETWEEN lo AND hi)
+          AND NOT EXISTS (SELECT 1 FROM instrument WHERE tag_id = old.tag_id)
+          AND NOT EXISTS (SELECT 1 FROM {RESERVATION_TABLE} WHERE tag_id = old.tag_id);"""
+
+# Pairing an id takes it off the free list and consumes any reservation of it
+_CLAIM_NEW = f"""
+        DELETE FROM {FREE_TABLE} WHERE tag_id = new.tag_id;
+        DELETE FROM {RESERVATION_TABLE} WHERE tag_id = new.tag_id;"""
+
+SCHEMA = [
+    f"CREATE TABLE IF NOT EXISTS {FREE_TABLE} (tag_id INTEGER PRIMARY KEY)",
+    f"CREATE TABLE IF NOT EXISTS {RANGE_TABLE} (lo INTEGER NOT NULL, hi INTEGER NOT NULL)",
+    f"""CREATE TABLE IF NOT EXISTS {RESERVATION_TABLE} (
+        tag_id INTEGER PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)""",
+    f"CREATE INDEX IF NOT EXISTS ix_{RESERVATION_TABLE}_expires ON {RESERVATION_TABLE} (expires_at)",
+    f"""CREATE TRIGGER IF NOT EXISTS {FREE_TABLE}_ai AFTER INSERT ON instrument
+        WHEN new.tag_id IS NOT NULL BEGIN
+        {_CLAIM_NEW}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FREE_TABLE}_ad AFTER DELETE ON instrument
+        WHEN old.tag_id IS NOT NULL BEGIN
+        {_RELEASE_OLD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FREE_TABLE}_au AFTER UPDATE OF tag_id ON instrument
+        WHEN old.tag_id IS NOT new.tag_id BEGIN
+        {_CLAIM_NEW}
+        {_RELEASE_OLD}
+    END"""
+]
+
+# Every id in [:lo, :hi] that isn't paired or reserved
+_FILL_RANGE = f"""
+    WITH RECURSIVE ids(tag_id) AS (SELECT ? UNION ALL SELECT tag_id + 1 FROM ids WHERE tag_id < ?)
+    INSERT OR IGNORE INTO {FREE_TABLE} (tag_id)
+    SELECT tag_id FROM ids
+    WHERE NOT EXISTS (SELECT 1 FROM instrument i WHERE i.tag_id = ids.tag_id)
+      AND NOT EXISTS (SELECT 1 FROM {RESERVATION_TABLE} r WHERE r.tag_id = ids.tag_id)
+"""
+
+ALLOCATE_SQL = text(f"""
+    DELETE FROM {FREE_TABLE}
+    WHERE tag_id IN (SELECT tag_id FROM {FREE_TABLE} ORDER BY tag_id LIMIT :count)
+    RETURNING tag_id
+""")
+CANDIDATES_SQL = text(f"SELECT tag_id FROM {FREE_TABLE} ORDER BY tag_id LIMIT :count")
+CLAIM_SQL = text(f"DELETE FROM {FREE_TABLE} WHERE tag_id = :tag_id")
+RESERVE_SQL = text(f"INSERT INTO {RESERVATION_TABLE} (tag_id, token, expires_at) VALUES (:tag_id, :token, :expires_at)")
+UNRESERVE_SQL = text(f"DELETE FROM {RESERVATION_TABLE} WHERE tag_id = :tag_id AND token = :token")
+RELEASE_SQL = text(f"""
+    INSERT OR IGNORE INTO {FREE_TABLE} (tag_id)
+    SELECT :tag_id
+    WHERE EXISTS (SELECT 1 FROM {RANGE_TABLE} WHERE :tag_id BETWEEN lo AND hi)
+      AND NOT EXISTS (SELECT 1 FROM instrument WHERE tag_id = :tag_id)
+""")
+# Expired reservations go back to the free list (unless the id left the ranges), then are dropped
+RECLAIM_SQL = text(f"""
+    INSERT OR IGNORE INTO {FREE_TABLE} (tag_id)
+    SELECT r.tag_id FROM {RESERVATION_TABLE} r
+    WHERE r.expires_at < :now
+      AND EXISTS (SELECT 1 FROM {RANGE_TABLE} WHERE r.tag_id BETWEEN lo AND hi)
+      AND NOT EXISTS (SELECT 1 FROM instrument WHERE tag_id = r.tag_id)
+""")
+EXPIRE_SQL = text(f"DELETE FROM {RESERVATION_TABLE} WHERE expires_at < :now")
+FREE_COUNT_SQL = text(f"SELECT count(*) FROM {FREE_TABLE}")
+
+# RETURNING arrived in SQLite 3.35
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Set by ensure_tag_allocator(); None until then
+_available = None
+
+def is_available():
+    """True once ensure_tag_allocator() has set up the free list."""
+    return bool(_available)
+
+def ensure_tag_allocator(engine, ranges):
+    """Create the free list and triggers, and resync it when the configured ranges changed."""
+    global _available
+    if engine.dialect.name != 'sqlite':
+        _available = False
+        return False
+    ranges = sorted((int(lo), int(hi)) for lo, hi in ranges)
+    with engine.begin() as conn:
+        # Recreated every start, so databases set up by an older version get the current triggers
+        for suffix in TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FREE_TABLE}_{suffix}")
+        for statement in SCHEMA:
+            conn.exec_driver_sql(statement)
+        stored = sorted(tuple(row) for row in conn.exec_driver_sql(f"SELECT lo, hi FROM {RANGE_TABLE}"))
+        if stored != ranges:
+            conn.exec_driver_sql(f"DELETE FROM {RANGE_TABLE}")
+            conn.exec_driver_sql(f"DELETE FROM {FREE_TABLE}")
+            for lo, hi in ranges:
+                conn.exec_driver_sql(f"INSERT INTO {RANGE_TABLE} (lo, hi) VALUES (?, ?)", (lo, hi))
+                conn.exec_driver_sql(_FILL_RANGE, (lo, hi))
+        reclaim_expired(conn)
+    _available = True
+    return True
+
+def drop_tag_allocator(engine):
+    """Remove the free list and its triggers, e.g. before a bulk load; reservations are kept."""
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        for suffix in TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FREE_TABLE}_{suffix}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FREE_TABLE}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {RANGE_TABLE}")
+
+def reclaim_expired(conn, now=None):
+    """Return reservations past their expiry to the free list; the caller commits."""
+    now = time.time() if now is None else now
+    conn.execute(RECLAIM_SQL, {"now": now})
+    return conn.execute(EXPIRE_SQL, {"now": now}).rowcount
+
+def allocate(conn, count, ttl_s=86400.0):
+    """(token, ids): reserve up to `count` of the lowest free ids for `ttl_s` seconds; the caller commits."""
+    reclaim_expired(conn)
+    if HAS_RETURNING:
+        allocated = sorted(conn.execute(ALLOCATE_SQL, {"count": count}).scalars().all())
+    else:
+        # Without RETURNING: claim candidates one by one; a delete that hits no row lost a race
+        allocated = []
+        while len(allocated) < count:
+            candidates = conn.execute(CANDIDATES_SQL, {"count": count - len(allocated)}).scalars().all()
+            if not candidates:
+                break
+            for tag_id in candidates:
+                if conn.execute(CLAIM_SQL, {"tag_id": tag_id}).rowcount == 1:
+                    allocated.append(tag_id)
+        allocated.sort()
+    token = secrets.token_urlsafe(16)
+    if allocated:
+        expires_at = time.time() + ttl_s
+        conn.execute(RESERVE_SQL, [{"tag_id": tag_id, "token": token, "expires_at": expires_at}
+                                   for tag_id in allocated])
+    return token, allocated
+
+def release(conn, token, tag_ids):
+    """Hand ids reserved under `token` and still unpaired back to the free list; the caller commits.
+
+    Returns the ids released. Ids reserved under another token, already
+    paired (which consumes the reservation) or never reserved are left alone.
+    """
+    released = []
+    for tag_id in tag_ids:
+        if conn.execute(UNRESERVE_SQL, {"tag_id": tag_id, "token": token}).rowcount == 1:
+            conn.execute(RELEASE_SQL, {"tag_id": tag_id})
+            released.append(tag_id)
+    return released
+
+def peek(conn, count):
+    """The lowest `count` free ids, without reserving them."""
+    return conn.execute(CANDIDATES_SQL, {"count": count}).scalars().all()
+
+def free_count(conn):
+    return conn.execute(FREE_COUNT_SQL).scalar()
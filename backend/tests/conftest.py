@@ -0,0 +1,46 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Config reads the environment when it is first imported, so point everything
+# the app writes at a scratch directory before any test imports it
+_SCRATCH = tempfile.mkdtemp(prefix='nfc-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_SCRATCH, 'app.db'),
+    'UPLOAD_FOLDER': os.path.join(_SCRATCH, 'userImages'),
+    'TRACE_EXPORT_PATH': os.path.join(_SCRATCH, 'traces.jsonl'),
+    'PROFILE_DIR': os.path.join(_SCRATCH, 'profiles'),
+    'TRACE_SAMPLE_RATE': '0',
+    'OCR_WARMUP': '0',
+    'SCAN_LOG_ENABLED': '0',
+    'IMAGE_GC_INTERVAL_S': '0'
+})
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh SQLite database with the app's tables."""
+    from sqlalchemy import create_engine
+    from models import db
+
+    engine = create_engine('sqlite:///' + str(tmp_path / 'test.db'), connect_args={'timeout': 30})
+    db.Model.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(scope='session')
+def app():
+    from main import app
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,64 @@
+import json
+import asyncio
+
+import scan_log
+
+async def _get(app, path, query='', headers=()):
+    """Minimal ASGI client: (status, JSON body) of one GET."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+        'client': ('127.0.0.1', 5000), 'server': ('testserver', 80)
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+    body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+    return status, json.loads(body)
+
+def test_async_routes_match_the_flask_app(app, client, monkeypatch):
+    import asgi_app
+    from models import db, Instrument
+
+    with app.app_context():
+        first = Instrument(name='Guitar', manufacturer='Asynctone', model='A', serial='ASGI-1', manufacture_date=1985)
+        db.session.add(first)
+        db.session.flush()
+        # Tagged with a number that is also the first instrument's dbid
+        paired = Instrument(tag_id=first.dbid, name='Bass', manufacturer='Asynctone', model='B',
+                            serial='ASGI-2', manufacture_date=2015)
+        db.session.add(paired)
+        db.session.commit()
+        tag_id, paired_dbid = first.dbid, paired.dbid
+
+    recorded = []
+    monkeypatch.setattr(scan_log, 'record', lambda *args: recorded.append(args))
+
+    async def run():
+        try:
+            for query in ('manufacturer=Asynctone', 'manufacturer=Asynctone&year_from=2000',
+                          'manufacturer=Asynctone&tagged=false', 'year_to=abc', 'tagged=maybe', 'storage_id=x'):
+                status, body = await _get(asgi_app.app, '/nfc/instruments', query)
+                flask_response = client.get(f'/nfc/instruments?{query}')
+                assert status == flask_response.status_code
+                assert body == flask_response.get_json()
+            assert status == 400
+
+            status, body = await _get(asgi_app.app, f'/nfc/instrument_by_tag/{tag_id}', headers=[('X-Reader-Id', 'dock-1')])
+            assert status == 200
+            assert body == client.get(f'/nfc/instrument_by_tag/{tag_id}').get_json()
+        finally:
+            await asgi_app.engine.dispose()
+
+    asyncio.run(run())
+    # One from each app, both against the instrument paired with the tag
+    assert recorded[0] == (tag_id, paired_dbid, 'dock-1')
+    assert [args[:2] for args in recorded] == [(tag_id, paired_dbid)] * 2
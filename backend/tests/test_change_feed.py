@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import change_feed
+
+def _record(engine, count):
+    with engine.begin() as conn:
+        for n in range(count):
+            change_feed.record(conn, 'paired', dbid=n, tag_id=n)
+
+def _seq(message):
+    return int(message.split('\n', 1)[0][len('id: '):])
+
+def _run(engine, test, **options):
+    """Run `test(feed)` against a ChangeFeed on the same database file as `engine`."""
+    async def main():
+        async_engine = create_async_engine(str(engine.url).replace('sqlite:///', 'sqlite+aiosqlite:///', 1))
+        feed = change_feed.ChangeFeed(async_engine, **{'poll_ms': 10, **options})
+        try:
+            return await test(feed)
+        finally:
+            await feed.close()
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+async def _until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+@pytest.mark.parametrize('since', [0, 2, 3, 5, 6, 7])
+def test_replay_crosses_batch_boundaries(engine, monkeypatch, since):
+    monkeypatch.setattr(change_feed, 'BATCH_SIZE', 3)
+    _record(engine, 7)
+
+    async def test(feed):
+        return await feed.replay(since)
+
+    events, pruned = _run(engine, test)
+    assert [seq for seq, _ in events] == list(range(since + 1, 8))
+    assert [_seq(message) for _, message in events] == list(range(since + 1, 8))
+    assert not pruned
+
+def test_replay_reports_pruned_changes(engine):
+    _record(engine, 10)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM change_log WHERE seq <= 4"))
+
+    async def test(feed):
+        return {since: (await feed.replay(since))[1] for since in (0, 3, 4, 5, 10)}
+
+    # Resuming after 4 needs 5 onwards, which is all still there
+    assert _run(engine, test) == {0: True, 3: True, 4: False, 5: False, 10: False}
+
+def test_stream_sends_reset_when_resuming_from_pruned_changes(engine):
+    _record(engine, 5)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM change_log WHERE seq <= 2"))
+
+    async def test(feed):
+        stream = feed.stream(await feed.subscribe(), since=1)
+        messages = [await stream.__anext__() for _ in range(5)]
+        await stream.aclose()
+        return messages
+
+    retry, reset, *events = _run(engine, test)
+    assert retry.startswith('retry:')
+    assert reset.startswith('event: reset\n')
+    assert [_seq(message) for message in events] == [3, 4, 5]
+
+def test_subscriber_that_falls_behind_is_dropped(engine):
+    async def test(feed):
+        subscriber = await feed.subscribe()
+        # Three events for a queue of two, with nobody reading
+        _record(engine, 3)
+        await _until(lambda: feed.stats['events'] == 3)
+        assert subscriber.overflowed
+        assert feed.stats['overflows'] == 1
+        assert subscriber not in feed._subscribers
+
+        # The stream ends at the next event instead of sending what fit, so the
+        # client reconnects and resumes from its last event
+        stream = feed.stream(subscriber)
+        assert (await stream.__anext__()).startswith('retry:')
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+        # Subscribers that keep up aren't affected
+        keeping_up = await feed.subscribe()
+        _record(engine, 2)
+        await _until(lambda: feed.stats['events'] == 5)
+        return keeping_up.overflowed, [seq for seq, _ in [keeping_up.queue.get_nowait() for _ in range(2)]]
+
+    assert _run(engine, test, queue_size=2) == (False, [4, 5])
+
+def test_no_duplicate_or_missed_events_between_replay_and_live(engine):
+    _record(engine, 3)
+
+    async def test(feed):
+        subscriber = await feed.subscribe()
+        # Published to the queue before the stream's replay reads them again
+        _record(engine, 3)
+        await _until(lambda: feed._head == 6)
+
+        stream = feed.stream(subscriber, since=1)
+        assert (await stream.__anext__()).startswith('retry:')
+        seqs = [_seq(await stream.__anext__()) for _ in range(5)]
+        # Live events after the replay
+        _record(engine, 2)
+        seqs += [_seq(await stream.__anext__()) for _ in range(2)]
+        await stream.aclose()
+        return seqs, len(feed._subscribers)
+
+    assert _run(engine, test) == ([2, 3, 4, 5, 6, 7, 8], 0)
+
+def test_live_stream_starts_at_the_head(engine):
+    _record(engine, 3)
+
+    async def test(feed):
+        stream = feed.stream(await feed.subscribe())
+        assert (await stream.__anext__()).startswith('retry:')
+        _record(engine, 1)
+        message = await stream.__anext__()
+        await stream.aclose()
+        return _seq(message)
+
+    assert _run(engine, test) == 4
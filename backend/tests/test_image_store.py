@@ -0,0 +1,171 @@
+import io
+import os
+import time
+import threading
+
+from sqlalchemy import text
+
+import image_store
+
+def _store(tmp_path):
+    return image_store.ImageStore(str(tmp_path / 'images'))
+
+def _put(store, engine, dbid, data):
+    with engine.begin() as conn:
+        return store.put(conn, dbid, io.BytesIO(data), 'image/png')
+
+def _blob(engine, sha256):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT refcount, orphaned_at FROM image_blob WHERE sha256 = :sha256"),
+                            {"sha256": sha256}).first()
+
+def test_identical_uploads_share_one_counted_blob(engine, tmp_path):
+    store = _store(tmp_path)
+    first = _put(store, engine, 1, b'same photo')
+    second = _put(store, engine, 2, b'same photo')
+    assert first == second
+    assert _blob(engine, first).refcount == 2
+
+    # Uploading the same image again for the same instrument adds no reference
+    _put(store, engine, 1, b'same photo')
+    assert _blob(engine, first).refcount == 2
+
+    with engine.begin() as conn:
+        assert store.release(conn, 1) == first
+    blob = _blob(engine, first)
+    assert blob.refcount == 1 and blob.orphaned_at is None
+    assert store.collect(engine, grace_s=0) == 0
+    assert os.path.exists(store.blob_path(first))
+
+def test_replacing_an_image_orphans_the_old_blob(engine, tmp_path):
+    store = _store(tmp_path)
+    old = _put(store, engine, 1, b'old photo')
+    new = _put(store, engine, 1, b'new photo')
+
+    assert _blob(engine, old).refcount == 0
+    assert _blob(engine, old).orphaned_at is not None
+    assert _blob(engine, new).refcount == 1
+    with engine.connect() as conn:
+        assert store.resolve(conn, 1) == (new, store.blob_path(new), 'image/png')
+
+def test_delete_then_gc_removes_the_file_after_the_grace_period(engine, tmp_path):
+    store = _store(tmp_path)
+    sha256 = _put(store, engine, 1, b'photo')
+    with engine.begin() as conn:
+        store.release(conn, 1)
+        assert store.resolve(conn, 1) is None
+
+    assert store.collect(engine, grace_s=3600) == 0
+    assert os.path.exists(store.blob_path(sha256))
+
+    assert store.collect(engine, grace_s=0) == 1
+    assert not os.path.exists(store.blob_path(sha256))
+    assert _blob(engine, sha256) is None
+
+def test_upload_racing_gc_keeps_the_blob(engine, tmp_path):
+    store = _store(tmp_path)
+    sha256 = _put(store, engine, 1, b'photo')
+    with engine.begin() as conn:
+        store.release(conn, 1)
+    time.sleep(0.01)
+
+    # An upload of the same content is mid-transaction, holding the write lock,
+    # when the collector picks the blob as garbage
+    conn = engine.connect()
+    transaction = conn.begin()
+    store.put(conn, 2, io.BytesIO(b'photo'), 'image/png')
+    collected = []
+    collector = threading.Thread(target=lambda: collected.append(store.collect(engine, grace_s=0)))
+    collector.start()
+    time.sleep(0.2)
+    transaction.commit()
+    conn.close()
+    collector.join()
+
+    assert collected == [0]
+    assert _blob(engine, sha256).refcount == 1
+    assert os.path.exists(store.blob_path(sha256))
+
+def test_gc_removes_files_left_by_a_failed_commit(engine, tmp_path):
+    store = _store(tmp_path)
+    kept = _put(store, engine, 1, b'kept photo')
+
+    # The file is renamed into place before the commit, which then fails
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        lost = store.put(conn, 2, io.BytesIO(b'lost photo'), 'image/png')
+        transaction.rollback()
+    assert _blob(engine, lost) is None
+    assert os.path.exists(store.blob_path(lost))
+
+    assert store.collect(engine, grace_s=3600) == 0
+    assert os.path.exists(store.blob_path(lost))
+
+    time.sleep(0.01)
+    assert store.collect(engine, grace_s=0) == 1
+    assert not os.path.exists(store.blob_path(lost))
+    assert os.path.exists(store.blob_path(kept))
+    with engine.connect() as conn:
+        assert store.resolve(conn, 1) == (kept, store.blob_path(kept), 'image/png')
+
+def test_migrate_resolves_legacy_files_by_dbid_then_tag(engine, tmp_path):
+    store = _store(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO instrument (dbid, tag_id, name, manufacturer, model, serial, manufacture_date)
+            VALUES (1, 42, 'Guitar', 'Martin', 'D-28', 'SN1', 2001)
+        """))
+    for name in ('42.jpg', '99.jpg'):
+        with open(os.path.join(store.root, name), 'wb') as f:
+            f.write(b'legacy photo')
+
+    assert store.migrate_legacy(engine) == (1, 0, 1)
+    with engine.connect() as conn:
+        assert store.resolve(conn, 1) is not None
+    assert os.path.exists(os.path.join(store.root, '99.jpg'))
+
+def test_image_routes_accept_a_tag_id(app, client):
+    from models import db, Instrument
+
+    with app.app_context():
+        instrument = Instrument(tag_id=7001, name='Guitar', manufacturer='Taylor', model='814ce',
+                                serial='IMG-7001', manufacture_date=2015)
+        db.session.add(instrument)
+        db.session.commit()
+        dbid = instrument.dbid
+
+    response = client.post('/nfc/upload_image/7001', data={'file': (io.BytesIO(b'png bytes'), 'photo.png')})
+    assert response.status_code == 201
+    assert response.get_json()['dbid'] == dbid
+
+    response = client.get('/nfc/check_image/7001')
+    assert response.status_code == 200
+    assert response.data == b'png bytes'
+    assert response.mimetype == 'image/png'
+
+    assert client.get('/nfc/check_image/987654').status_code == 404
+    response = client.post('/nfc/upload_image/987654', data={'file': (io.BytesIO(b'x'), 'photo.png')})
+    assert response.status_code == 404
+
+def test_check_image_streams_with_conditional_and_range_requests(app, client):
+    from models import db, Instrument
+
+    with app.app_context():
+        instrument = Instrument(name='Guitar', manufacturer='Gibson', model='J-45',
+                                serial='IMG-RANGE', manufacture_date=1960)
+        db.session.add(instrument)
+        db.session.commit()
+        dbid = instrument.dbid
+
+    data = bytes(range(256)) * 64
+    assert client.post(f'/nfc/upload_image/{dbid}', data={'file': (io.BytesIO(data), 'photo.png')}).status_code == 201
+
+    response = client.get(f'/nfc/check_image/{dbid}')
+    assert response.status_code == 200
+    assert response.data == data
+    etag = response.headers['ETag']
+
+    assert client.get(f'/nfc/check_image/{dbid}', headers={'If-None-Match': etag}).status_code == 304
+    response = client.get(f'/nfc/check_image/{dbid}', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == data[10:20]
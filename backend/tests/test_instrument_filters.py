@@ -0,0 +1,30 @@
+import pytest
+
+@pytest.mark.parametrize('query', [
+    'year_from=abc', 'year_to=20x0', 'year_from=1999.5', 'tagged=yes', 'tagged=TRUE', 'storage_id=two'
+])
+def test_invalid_filters_are_rejected(client, query):
+    response = client.get(f'/nfc/instruments?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_valid_filters_apply(app, client):
+    from models import db, Instrument
+
+    with app.app_context():
+        db.session.add_all([
+            Instrument(name='Old', manufacturer='Filtertone', model='A', serial='FLT-1', manufacture_date=1985),
+            Instrument(tag_id=880001, name='New', manufacturer='Filtertone', model='B', serial='FLT-2',
+                       manufacture_date=2015)
+        ])
+        db.session.commit()
+
+    def serials(query):
+        response = client.get(f'/nfc/instruments?manufacturer=Filtertone&{query}')
+        assert response.status_code == 200
+        return [instrument['serial'] for instrument in response.get_json()]
+
+    assert serials('year_from=2000') == ['FLT-2']
+    assert serials('year_to=2000') == ['FLT-1']
+    assert serials('tagged=0') == ['FLT-1']
+    assert serials('tagged=true&year_from=') == ['FLT-2']
@@ -0,0 +1,49 @@
+import os
+
+import metrics
+
+def _dead_pid():
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+def test_multiprocess_render_sums_processes_and_drops_dead_gauges(tmp_path):
+    dead = _dead_pid()
+    (tmp_path / f'{dead}-1.prom').write_text('\n'.join([
+        '# HELP nfc_requests_total Requests.',
+        '# TYPE nfc_requests_total counter',
+        'nfc_requests_total{route="/a",method="GET",status="200"} 5',
+        '# HELP nfc_requests_in_flight In flight.',
+        '# TYPE nfc_requests_in_flight gauge',
+        'nfc_requests_in_flight{route="/a"} 3',
+        '# HELP nfc_request_duration_seconds Latency.',
+        '# TYPE nfc_request_duration_seconds histogram',
+        'nfc_request_duration_seconds_bucket{route="/a",le="0.1"} 4',
+        'nfc_request_duration_seconds_sum{route="/a"} 0.25',
+        ''
+    ]))
+    files = metrics.MultiProcessFiles(str(tmp_path), flush_s=3600)
+    counter = metrics.Counter('nfc_requests_total', 'Requests.', ('route', 'method', 'status'))
+    gauge = metrics.Gauge('nfc_requests_in_flight', 'In flight.', ('route',))
+    histogram = metrics.Histogram('nfc_request_duration_seconds', 'Latency.', ('route',), buckets=(0.1,))
+    original = metrics.registry.metrics
+    metrics.registry.metrics = [counter, gauge, histogram]
+    try:
+        counter.inc(('/a', 'GET', 200), 2)
+        gauge.inc(('/a',))
+        histogram.observe(0.05, ('/a',))
+        text = files.render()
+    finally:
+        metrics.registry.metrics = original
+
+    lines = text.splitlines()
+    assert 'nfc_requests_total{route="/a",method="GET",status="200"} 7' in lines
+    # The exited process's in-flight requests are gone with it
+    assert 'nfc_requests_in_flight{route="/a"} 1' in lines
+    assert 'nfc_request_duration_seconds_bucket{route="/a",le="0.1"} 5' in lines
+    assert 'nfc_request_duration_seconds_sum{route="/a"} 0.3' in lines
+    assert lines.count('# TYPE nfc_requests_total counter') == 1
+    # This process's own file is there for the next scrape from another worker
+    assert len(list(tmp_path.glob('*.prom'))) == 2
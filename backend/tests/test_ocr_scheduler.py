@@ -0,0 +1,23 @@
+import threading
+
+from ocr_scheduler import OCRScheduler
+
+def test_concurrent_starts_run_one_batching_thread():
+    scheduler = OCRScheduler(reader=object())
+    barrier = threading.Barrier(16)
+
+    def start():
+        barrier.wait()
+        scheduler.start()
+
+    threads = [threading.Thread(target=start) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        assert sum(thread.name == 'ocr-scheduler' for thread in threading.enumerate()) == 1
+    finally:
+        scheduler.stop()
+    assert scheduler._thread is None
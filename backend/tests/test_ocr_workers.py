@@ -0,0 +1,51 @@
+import gc
+import os
+import json
+
+import ocr_workers
+import process_example_tags
+from config import Config
+
+def _tuning(tmp_path, monkeypatch):
+    path = tmp_path / 'ocr_tuning.json'
+    path.write_text(json.dumps({'workers': 3, 'torch_threads': 2, 'cpu_count': os.cpu_count()}))
+    monkeypatch.setattr(Config, 'OCR_TUNING_FILE', str(path))
+
+def test_tuning_file_sets_workers_when_ocr_workers_is_unset(tmp_path, monkeypatch):
+    _tuning(tmp_path, monkeypatch)
+    monkeypatch.setattr(Config, 'OCR_WORKERS', None)
+    pool = ocr_workers.OCRWorkerPool(preload=False)
+    assert (pool.workers, pool.torch_threads) == (3, 2)
+
+def test_explicit_ocr_workers_beats_the_tuning_file(tmp_path, monkeypatch):
+    _tuning(tmp_path, monkeypatch)
+    monkeypatch.setattr(Config, 'OCR_WORKERS', 6)
+    pool = ocr_workers.OCRWorkerPool(preload=False)
+    assert (pool.workers, pool.torch_threads) == (6, 2)
+    assert ocr_workers.OCRWorkerPool(workers=1, preload=False).workers == 1
+
+def test_default_workers_without_either(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'OCR_TUNING_FILE', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(Config, 'OCR_WORKERS', None)
+    assert ocr_workers.OCRWorkerPool(preload=False).workers == ocr_workers.DEFAULT_WORKERS
+
+def _fake_warmup(_):
+    return os.getpid(), None
+
+def test_stop_only_unfreezes_a_heap_the_pool_froze(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'OCR_TUNING_FILE', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(process_example_tags, 'get_reader', lambda: None)
+    monkeypatch.setattr(ocr_workers, '_warmup', _fake_warmup)
+
+    # Frozen beforehand, as gunicorn's master does
+    gc.freeze()
+    try:
+        with ocr_workers.OCRWorkerPool(workers=1, preload=True):
+            pass
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+
+    with ocr_workers.OCRWorkerPool(workers=1, preload=True):
+        assert gc.get_freeze_count() > 0
+    assert gc.get_freeze_count() == 0
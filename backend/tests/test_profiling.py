@@ -0,0 +1,42 @@
+import threading
+
+from flask import Flask
+
+import profiling
+
+def test_one_cprofile_request_at_a_time(tmp_path):
+    app = Flask(__name__)
+    app.config.update(PROFILE_TOKEN='secret', PROFILE_DIR=str(tmp_path), PROFILE_SAMPLE_INTERVAL_MS=5)
+    profiling.init_app(app)
+    entered = threading.Event()
+    release = threading.Event()
+
+    @app.route('/slow')
+    def slow():
+        entered.set()
+        release.wait(5)
+        return 'ok'
+
+    @app.route('/fast')
+    def fast():
+        return 'ok'
+
+    profile = {'X-Profile': 'secret'}
+    statuses = []
+    first = threading.Thread(target=lambda: statuses.append(app.test_client().get('/slow', headers=profile).status_code))
+    first.start()
+    assert entered.wait(5)
+    try:
+        client = app.test_client()
+        assert client.get('/fast', headers=profile).status_code == 409
+        # Sampling and unprofiled requests aren't held up
+        assert client.get('/fast', headers={**profile, 'X-Profile-Mode': 'sample'}).status_code == 200
+        assert client.get('/fast').status_code == 200
+    finally:
+        release.set()
+        first.join()
+
+    assert statuses == [200]
+    response = app.test_client().get('/fast', headers=profile)
+    assert response.status_code == 200
+    assert (tmp_path / (response.headers['X-Profile-Id'] + '.prof')).exists()
@@ -0,0 +1,15 @@
+import os
+import sys
+import subprocess
+
+def test_ocr_warmup_is_off_by_default():
+    env = {k: v for k, v in os.environ.items() if k != 'OCR_WARMUP'}
+    out = subprocess.run([sys.executable, '-c', 'from config import Config; print(Config.OCR_WARMUP)'],
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         env=env, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == 'False'
+
+def test_ready_without_ocr_warmup(client):
+    response = client.get('/nfc/ready')
+    assert response.status_code == 200
+    assert response.get_json()['ready'] is True
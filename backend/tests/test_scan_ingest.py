@@ -0,0 +1,90 @@
+import json
+
+from scan_ingest import ScanDeduplicator, parse_ndjson
+
+NOW = 1718000000.0
+
+def _ndjson(*reads):
+    return '\n'.join(read if isinstance(read, str) else json.dumps(read) for read in reads)
+
+def test_parse_ndjson_reads_valid_lines():
+    body = _ndjson(
+        {"tag_id": 101, "reader_id": "dock-1", "timestamp": NOW - 1},
+        '',
+        {"tag_id": 102, "reader_id": "dock-2"}
+    )
+    reads, errors = parse_ndjson(body, 100, now=NOW)
+    assert reads == [(101, 'dock-1', NOW - 1), (102, 'dock-2', NOW)]
+    assert errors == []
+
+def test_parse_ndjson_reports_invalid_lines_by_number():
+    body = _ndjson(
+        'not json',
+        {"reader_id": "dock-1"},
+        {"tag_id": "101", "reader_id": "dock-1"},
+        {"tag_id": True, "reader_id": "dock-1"},
+        {"tag_id": 101, "reader_id": "dock-1", "timestamp": False},
+        '[1, 2]',
+        {"tag_id": 101, "reader_id": "dock-1", "timestamp": NOW}
+    )
+    reads, errors = parse_ndjson(body, 100, now=NOW)
+    assert reads == [(101, 'dock-1', NOW)]
+    assert [number for number, _ in errors] == [1, 2, 3, 4, 5, 6]
+    assert errors[1] == (2, "missing 'tag_id'")
+
+def test_parse_ndjson_rejects_non_finite_timestamps():
+    body = '\n'.join(f'{{"tag_id": 1, "reader_id": "r", "timestamp": {value}}}'
+                     for value in ('NaN', 'Infinity', '-Infinity'))
+    reads, errors = parse_ndjson(body, 100, now=NOW)
+    assert reads == []
+    assert [message for _, message in errors] == ["timestamp must be a finite number"] * 3
+
+def test_parse_ndjson_rejects_timestamps_far_from_now():
+    body = _ndjson(
+        {"tag_id": 1, "reader_id": "r", "timestamp": NOW + 301},
+        {"tag_id": 2, "reader_id": "r", "timestamp": NOW + 299},
+        {"tag_id": 3, "reader_id": "r", "timestamp": NOW - 3601},
+        {"tag_id": 4, "reader_id": "r", "timestamp": NOW - 3599}
+    )
+    reads, errors = parse_ndjson(body, 100, now=NOW, max_future_s=300, max_age_s=3600)
+    assert [read[0] for read in reads] == [2, 4]
+    assert [number for number, _ in errors] == [1, 3]
+
+def test_parse_ndjson_stops_at_max_lines():
+    body = _ndjson(*({"tag_id": n, "reader_id": "r"} for n in range(5)))
+    reads, errors = parse_ndjson(body, 3, now=NOW)
+    assert len(reads) == 3
+    assert errors == [(4, "batch is over 3 lines")]
+
+def test_dedup_drops_repeats_inside_the_window():
+    dedup = ScanDeduplicator(window_ms=2000)
+    reads = [(1, 'a', NOW), (1, 'a', NOW + 0.5), (1, 'b', NOW + 0.5), (2, 'a', NOW + 1), (1, 'a', NOW + 3)]
+    assert dedup.filter(reads) == [(1, 'a', NOW), (1, 'b', NOW + 0.5), (2, 'a', NOW + 1), (1, 'a', NOW + 3)]
+
+def test_dedup_window_slides_while_the_tag_stays():
+    dedup = ScanDeduplicator(window_ms=2000)
+    # Read every second for five seconds: one read, since no gap reaches the window
+    assert dedup.filter([(1, 'a', NOW + n) for n in range(6)]) == [(1, 'a', NOW)]
+    assert dedup.filter([(1, 'a', NOW + 8)]) == [(1, 'a', NOW + 8)]
+
+def test_dedup_drops_late_arrivals_and_keeps_state_across_batches():
+    dedup = ScanDeduplicator(window_ms=2000)
+    assert dedup.filter([(1, 'a', NOW + 10)]) == [(1, 'a', NOW + 10)]
+    assert dedup.filter([(1, 'a', NOW + 5), (1, 'a', NOW + 11)]) == []
+
+def test_dedup_evicts_expired_and_excess_keys():
+    dedup = ScanDeduplicator(window_ms=2000, max_keys=3)
+    dedup.filter([(n, 'a', NOW) for n in range(5)])
+    assert len(dedup) == 3
+    dedup.filter([(99, 'a', NOW + 10)])
+    assert len(dedup) == 1
+    # An evicted key counts as new again
+    assert dedup.filter([(0, 'a', NOW + 10.5)]) == [(0, 'a', NOW + 10.5)]
+
+def test_scan_events_route_survives_a_nan_timestamp(client):
+    body = '{"tag_id": 5, "reader_id": "dock-1", "timestamp": NaN}\n{"tag_id": 5, "reader_id": "dock-1"}\n'
+    response = client.post('/nfc/scan_events', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    counts = response.get_json()
+    assert counts['invalid'] == 1
+    assert counts['accepted'] == 1
@@ -0,0 +1,41 @@
+import threading
+
+import scan_log
+
+def test_by_tag_scan_records_the_instrument_paired_with_the_tag(app, client, monkeypatch):
+    from models import db, Instrument
+
+    with app.app_context():
+        # dbid 1 exists, and a different instrument is paired with tag 1
+        first = Instrument(name='Guitar', manufacturer='Martin', model='D-28', serial='SCAN-1', manufacture_date=2001)
+        db.session.add(first)
+        db.session.flush()
+        paired = Instrument(tag_id=first.dbid, name='Bass', manufacturer='Fender', model='Precision',
+                            serial='SCAN-2', manufacture_date=1999)
+        db.session.add(paired)
+        db.session.commit()
+        tag_id, paired_dbid = first.dbid, paired.dbid
+
+    recorded = []
+    monkeypatch.setattr(scan_log, 'record', lambda *args: recorded.append(args))
+    assert client.get(f'/nfc/instrument_by_tag/{tag_id}', headers={'X-Reader-Id': 'dock-1'}).status_code == 200
+    assert recorded == [(tag_id, paired_dbid, 'dock-1')]
+
+def test_concurrent_records_are_all_counted(tmp_path):
+    log = scan_log.ScanLog('sqlite:///' + str(tmp_path / 'scans.db'), capacity=1, block_ms=0)
+    # No writer, so the queue fills after the first scan and the rest are dropped
+    log._ensure_thread = lambda: None
+    log._queue = scan_log.queue.Queue(maxsize=1)
+
+    def worker():
+        for n in range(1000):
+            log.record(n)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert log.stats['recorded'] == 1
+    assert log.stats['dropped'] == 7999
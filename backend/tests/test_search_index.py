@@ -0,0 +1,48 @@
+from sqlalchemy import text
+
+import search_index
+
+def _add(conn, name, manufacturer, model, serial):
+    conn.execute(text("""
+        INSERT INTO instrument (name, manufacturer, model, serial, manufacture_date)
+        VALUES (:name, :manufacturer, :model, :serial, 2001)
+    """), {"name": name, "manufacturer": manufacturer, "model": model, "serial": serial})
+
+def test_match_expression_only_expands_the_last_word():
+    assert search_index.match_expression(['gibson', 'j']) == '"gibson" "j"*'
+    # Cut to the longest prefix index; search() filters on the whole word
+    assert search_index.match_expression(['martinez']) == '"martin"*'
+
+def test_search_ranks_every_match_before_the_limit(engine):
+    assert search_index.ensure_search_index(engine)
+    with engine.begin() as conn:
+        # The best match is the oldest row, behind 150 newer ones that only match on name
+        _add(conn, 'Acoustic', 'Gibson', 'J-45', 'G100')
+        for n in range(150):
+            _add(conn, f'Gibson copy {n}', 'Epiphone', 'EJ-200', f'E{n}')
+
+    with engine.connect() as conn:
+        results = search_index.search(conn, 'gibson', limit=5)
+        assert len(results) == 5
+        assert results[0]['serial'] == 'G100'
+
+        assert [r['serial'] for r in search_index.search(conn, 'gibson j')] == ['G100']
+        # Earlier words are whole words: "gib" doesn't match gibson once another word follows
+        assert search_index.search(conn, 'gib j') == []
+        # Prefixes longer than the indexed lengths still match
+        assert search_index.search(conn, 'epiphon')[0]['manufacturer'] == 'Epiphone'
+        assert search_index.search(conn, 'epiphonx') == []
+
+def test_strong_matches_stay_candidates_behind_newer_name_matches(engine, monkeypatch):
+    monkeypatch.setattr(search_index, 'MAX_CANDIDATES', 20)
+    assert search_index.ensure_search_index(engine)
+    with engine.begin() as conn:
+        _add(conn, 'Acoustic', 'Gibson', 'J-45', 'G100')
+        for n in range(100):
+            _add(conn, f'Gibson copy {n}', 'Epiphone', 'EJ-200', f'E{n}')
+
+    with engine.connect() as conn:
+        results = search_index.search(conn, 'gibso', limit=5)
+        assert results[0]['serial'] == 'G100'
+        # The rest are the newest name-only matches
+        assert [r['serial'] for r in results[1:]] == ['E99', 'E98', 'E97', 'E96']
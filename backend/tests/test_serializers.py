@@ -0,0 +1,29 @@
+import json
+
+from sqlalchemy.orm import Session
+
+import serializers
+from models import Instrument, Storage
+
+def test_row_dicts_match_to_dict_with_and_without_storage(engine):
+    with Session(engine) as session:
+        storage = Storage(name='Back Room', address='1 Test St')
+        session.add(storage)
+        session.flush()
+        session.add_all([
+            Instrument(tag_id=12, name='Stored', manufacturer='Martin', model='D-28', serial='SER-1',
+                       manufacture_date=1999, storage_id=storage.id),
+            Instrument(tag_id=None, name='Loose', manufacturer='Gibson', model='J-45', serial='SER-2',
+                       manufacture_date=2010, storage_id=None)
+        ])
+        session.commit()
+
+        expected = [i.to_dict() for i in session.query(Instrument).order_by(Instrument.dbid)]
+        rows = session.execute(serializers.INSTRUMENT_SELECT.order_by(Instrument.dbid)).all()
+        actual = [serializers.instrument_row_to_dict(row) for row in rows]
+
+    assert actual == expected
+    assert [i['storage'] for i in actual] == ['Back Room', 'Unassigned']
+    # Same keys in the same order, so the encoded bodies match too
+    assert [list(i) for i in actual] == [list(i) for i in expected]
+    assert json.loads(serializers.dumps(actual)) == expected
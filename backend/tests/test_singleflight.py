@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+def test_waiters_raise_their_own_copy_of_the_leaders_exception():
+    flight = SingleFlight('test')
+    release = threading.Event()
+    original = []
+
+    def fail():
+        release.wait(5)
+        error = ValueError('lookup failed')
+        original.append(error)
+        raise error
+
+    raised = []
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            raised.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.stats['coalesced'] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    leader, = original
+    assert len(raised) == 3 and leader in raised
+    waiters = [e for e in raised if e is not leader]
+    assert len(waiters) == 2 and waiters[0] is not waiters[1]
+    for error in waiters:
+        assert error.args == ('lookup failed',)
+        assert error.__cause__ is leader
+    # The leader's traceback ends in fail(), with no waiter frames appended
+    tb = leader.__traceback__
+    while tb.tb_next:
+        tb = tb.tb_next
+    assert tb.tb_frame.f_code.co_name == 'fail'
+    assert flight.snapshot() == {'calls': 3, 'executions': 1, 'coalesced': 2, 'errors': 1, 'in_flight': 0}
+
+def test_nothing_is_cached_once_a_call_finishes():
+    flight = SingleFlight('test')
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flight.do('key', lambda: {}['missing'])
+    assert flight.do('key', lambda: 3) == 3
@@ -0,0 +1,10 @@
+def test_slow_queries_needs_the_profile_token(app, client, monkeypatch):
+    assert client.get('/nfc/debug/slow_queries').status_code == 403
+    # Without a configured token nothing unlocks it
+    assert client.get('/nfc/debug/slow_queries', headers={'X-Profile': ''}).status_code == 403
+
+    monkeypatch.setitem(app.config, 'PROFILE_TOKEN', 'secret')
+    assert client.get('/nfc/debug/slow_queries', headers={'X-Profile': 'wrong'}).status_code == 403
+    response = client.get('/nfc/debug/slow_queries', headers={'X-Profile': 'secret'})
+    assert response.status_code == 200
+    assert 'entries' in response.get_json()
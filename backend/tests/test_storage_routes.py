@@ -0,0 +1,87 @@
+import pytest
+
+import inventory_stats
+
+@pytest.fixture
+def storages(app):
+    """Two new storages: 3 tagged and 2 untagged instruments in the first, none in the second."""
+    from models import db, Instrument, Storage
+
+    with app.app_context():
+        first = Storage(name='Bulk A', address='1 Test St')
+        second = Storage(name='Bulk B', address='2 Test St')
+        db.session.add_all([first, second])
+        db.session.flush()
+        instruments = [
+            Instrument(tag_id=990000 + n if n < 3 else None, name=f'Bulk {n}', manufacturer='Bulktone',
+                       model='M', serial=f'BULK-{first.id}-{n}', manufacture_date=2000, storage_id=first.id)
+            for n in range(5)
+        ]
+        db.session.add_all(instruments)
+        db.session.commit()
+        yield first.id, second.id, [i.dbid for i in instruments], [i.tag_id for i in instruments[:3]]
+        Instrument.query.filter(Instrument.manufacturer == 'Bulktone').delete()
+        db.session.commit()
+
+def _counters_match_a_recount(app):
+    from models import db
+
+    assert inventory_stats._available
+    with app.app_context():
+        maintained = inventory_stats.inventory_stats(db.session)
+        # The same numbers aggregated from the instrument table itself
+        inventory_stats._available, available = False, inventory_stats._available
+        try:
+            assert inventory_stats.inventory_stats(db.session) == maintained
+        finally:
+            inventory_stats._available = available
+
+def test_storage_page_walks_all_instruments_with_next_after(client, storages):
+    first, _, dbids, _ = storages
+    seen = []
+    after = 0
+    while after is not None:
+        body = client.get(f'/nfc/storage/{first}/instruments?limit=2&after={after}').get_json()
+        assert len(body['instruments']) <= 2
+        seen += [i['dbid'] for i in body['instruments']]
+        after = body['next_after']
+    assert seen == dbids
+    assert body['counts'] == {"instruments": 5, "tagged": 3, "untagged": 2}
+    assert body['storage']['name'] == 'Bulk A'
+
+    assert client.get('/nfc/storage/987654/instruments').status_code == 404
+
+def test_bulk_move_reports_each_outcome(app, client, storages):
+    first, second, dbids, tag_ids = storages
+    response = client.put('/nfc/update_storage', json={"storage_id": second, "dbids": dbids[:2] + [dbids[0], 987654]})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "message": "Moved 2 instruments", "storage_id": second, "requested": 3,
+        "matched": 2, "moved": 2, "unchanged": 0, "not_found": [987654]
+    }
+
+    # By tag: two of them are already there
+    body = client.put('/nfc/update_storage', json={"storage_id": second, "tag_ids": tag_ids}).get_json()
+    assert (body['matched'], body['moved'], body['unchanged'], body['not_found']) == (3, 1, 2, [])
+
+    first_page = client.get(f'/nfc/storage/{first}/instruments').get_json()
+    second_page = client.get(f'/nfc/storage/{second}/instruments').get_json()
+    assert first_page['counts'] == {"instruments": 2, "tagged": 0, "untagged": 2}
+    assert second_page['counts'] == {"instruments": 3, "tagged": 3, "untagged": 0}
+    assert [i['dbid'] for i in second_page['instruments']] == dbids[:3]
+    _counters_match_a_recount(app)
+
+    body = client.put('/nfc/update_storage', json={"storage_id": None, "dbids": dbids}).get_json()
+    assert body['moved'] == 5
+    _counters_match_a_recount(app)
+
+@pytest.mark.parametrize('payload', [
+    {"storage_id": 1, "dbids": [True]},
+    {"storage_id": 1, "dbids": [1, False]},
+    {"storage_id": True, "dbids": [1]},
+    {"storage_id": 1, "dbids": "1"},
+    {"storage_id": 1, "dbids": [1], "tag_ids": [1]},
+    {"dbids": [1]}
+])
+def test_bulk_move_rejects_non_integer_ids(client, payload):
+    assert client.put('/nfc/update_storage', json=payload).status_code == 400
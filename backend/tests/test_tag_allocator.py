@@ -0,0 +1,115 @@
+import threading
+
+from sqlalchemy import text
+
+import tag_allocator
+
+def _add_instrument(conn, serial, tag_id=None):
+    conn.execute(text("""
+        INSERT INTO instrument (tag_id, name, manufacturer, model, serial, manufacture_date)
+        VALUES (:tag_id, 'Guitar', 'Martin', 'D-28', :serial, 2001)
+    """), {"tag_id": tag_id, "serial": serial})
+
+def _free(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT tag_id FROM free_tag ORDER BY tag_id")).scalars().all()
+
+def test_allocate_release_round_trip(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 10)])
+    with engine.begin() as conn:
+        token, tag_ids = tag_allocator.allocate(conn, 3)
+    assert tag_ids == [1, 2, 3]
+    assert _free(engine) == list(range(4, 11))
+
+    with engine.begin() as conn:
+        assert tag_allocator.release(conn, token, tag_ids) == [1, 2, 3]
+    assert _free(engine) == list(range(1, 11))
+
+def test_release_with_wrong_token_frees_nothing(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 10)])
+    with engine.begin() as conn:
+        token, tag_ids = tag_allocator.allocate(conn, 2)
+        _, other_ids = tag_allocator.allocate(conn, 2)
+
+    with engine.begin() as conn:
+        assert tag_allocator.release(conn, 'not-the-token', tag_ids) == []
+        # Someone else's reservation, and an id nobody reserved
+        assert tag_allocator.release(conn, token, other_ids + [9]) == []
+    assert _free(engine) == list(range(5, 11))
+
+def test_release_skips_paired_ids(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 10)])
+    with engine.begin() as conn:
+        token, tag_ids = tag_allocator.allocate(conn, 2)
+        _add_instrument(conn, 'SN1', tag_id=tag_ids[0])
+
+    with engine.begin() as conn:
+        assert tag_allocator.release(conn, token, tag_ids) == [tag_ids[1]]
+    assert tag_ids[0] not in _free(engine)
+
+def test_concurrent_allocations_never_share_an_id(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 500)])
+    results = []
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(10):
+                with engine.begin() as conn:
+                    results.append(tag_allocator.allocate(conn, 5))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    allocated = [tag_id for _, tag_ids in results for tag_id in tag_ids]
+    assert len(allocated) == 400
+    assert len(set(allocated)) == 400
+    assert len({token for token, _ in results}) == 80
+    assert _free(engine) == list(range(401, 501))
+
+def test_range_change_keeps_reserved_ids_out_of_the_free_list(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 10)])
+    with engine.begin() as conn:
+        token, tag_ids = tag_allocator.allocate(conn, 3)
+
+    tag_allocator.ensure_tag_allocator(engine, [(1, 20)])
+    assert _free(engine) == list(range(4, 21))
+    with engine.begin() as conn:
+        _, more = tag_allocator.allocate(conn, 3)
+    assert more == [4, 5, 6]
+
+def test_expired_reservations_return_to_the_free_list(engine):
+    tag_allocator.ensure_tag_allocator(engine, [(1, 10)])
+    with engine.begin() as conn:
+        tag_allocator.allocate(conn, 2)
+        token, tag_ids = tag_allocator.allocate(conn, 3, ttl_s=-1)
+
+    with engine.begin() as conn:
+        assert tag_allocator.reclaim_expired(conn) == 3
+    assert _free(engine) == list(range(3, 11))
+    with engine.begin() as conn:
+        # The expired token no longer releases anything
+        assert tag_allocator.release(conn, token, tag_ids) == []
+
+def test_release_tags_route_requires_the_token(client):
+    response = client.post('/nfc/allocate_tags?count=2')
+    assert response.status_code == 200
+    body = response.get_json()
+    tag_ids, token = body['tag_ids'], body['token']
+
+    response = client.post('/nfc/release_tags', json={"tag_ids": tag_ids})
+    assert response.status_code == 400
+    response = client.post('/nfc/release_tags', json={"token": token, "tag_ids": [True]})
+    assert response.status_code == 400
+    response = client.post('/nfc/release_tags', json={"token": "wrong", "tag_ids": tag_ids})
+    assert response.status_code == 403
+
+    response = client.post('/nfc/release_tags', json={"token": token, "tag_ids": tag_ids})
+    assert response.status_code == 200
+    assert response.get_json()['released'] == tag_ids
@@ -0,0 +1,31 @@
+import os
+import time
+import threading
+
+import tracing
+
+def _exporter_threads():
+    return sum(thread.name == 'trace-exporter' for thread in threading.enumerate())
+
+def test_concurrent_first_exports_start_one_writer(monkeypatch):
+    pid = os.getpid()
+    def slow_getpid():
+        # Widens the gap between the pid check and the thread start
+        time.sleep(0.005)
+        return pid
+    monkeypatch.setattr(tracing.os, 'getpid', slow_getpid)
+    exporter = tracing._Exporter()
+    before = _exporter_threads()
+    barrier = threading.Barrier(16)
+
+    def first_export():
+        barrier.wait()
+        exporter._ensure_thread()
+
+    threads = [threading.Thread(target=first_export) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert _exporter_threads() - before == 1
@@ -0,0 +1,333 @@
+"""
+Lightweight span-based request tracing.
+
+A root span is opened per request (or per OCR job), with child spans for DB
+statements, file I/O and OCR stages. The active span lives in a contextvar;
+`current_context()` / `attach()` carry it into threads and worker processes.
+
+Only a sampled fraction of traces (Config.TRACE_SAMPLE_RATE, or an upstream
+`traceparent` header with the sampled flag) record anything; for the rest a
+span costs one contextvar lookup. Finished spans are queued and written by a
+background thread as JSON lines, either to Config.TRACE_EXPORT_PATH or over
+UDP to a collector at Config.TRACE_COLLECTOR_ADDR. A stand-in collector that
+prints span trees is included:
+
+    python tracing.py collect [--port 6831] [--out traces.jsonl]
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import socket
+import argparse
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+from config import Config
+
+class SpanContext:
+    """The part of a span that crosses thread and process boundaries."""
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id, span_id, sampled):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def __reduce__(self):
+        return (SpanContext, (self.trace_id, self.span_id, self.sampled))
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, header):
+        """Parse a W3C traceparent header; None if it's missing or malformed."""
+        try:
+            version, trace_id, span_id, flags = header.strip().split('-')
+            int(trace_id, 16), int(span_id, 16)
+            if len(trace_id) != 32 or len(span_id) != 16:
+                return None
+            return cls(trace_id, span_id, int(flags, 16) & 1 == 1)
+        except (AttributeError, ValueError):
+            return None
+
+class Span:
+    __slots__ = ('name', 'context', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'status')
+
+    def __init__(self, name, context, parent_id, attributes):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.status = 'ok'
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+            "pid": os.getpid()
+        }
+
+_current = contextvars.ContextVar('nfc_trace_span', default=None)
+_UNSAMPLED = SpanContext('0' * 32, '0' * 16, False)
+
+def _new_id(nbytes):
+    return '%0*x' % (nbytes * 2, random.getrandbits(nbytes * 8))
+
+class _Exporter:
+    """Background writer for finished spans; drops spans rather than block."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=10000)
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each process starts its own writer
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=10000)
+                    threading.Thread(target=self._run, args=(self._queue,), name='trace-exporter', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def export(self, span):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self, q):
+        sock = None
+        addr = None
+        if Config.TRACE_COLLECTOR_ADDR:
+            host, port = Config.TRACE_COLLECTOR_ADDR.rsplit(':', 1)
+            addr = (host, int(port))
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while True:
+            batch = [q.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(s, default=str) for s in batch]
+            try:
+                if sock is not None:
+                    for line in lines:
+                        sock.sendto(line.encode(), addr)
+                else:
+                    with open(Config.TRACE_EXPORT_PATH, 'a') as f:
+                        f.write('\n'.join(lines) + '\n')
+            except OSError:
+                self.dropped += len(lines)
+
+_exporter = _Exporter()
+
+def current_context():
+    """Context of the active span (picklable), for handing to another thread or process."""
+    span = _current.get()
+    return span.context if span is not None else None
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Open a child of the active span (or of `parent`), or a new root span.
+
+    Yields the Span, or None when the trace isn't sampled.
+    """
+    current = _current.get()
+    parent_ctx = parent if parent is not None else (current.context if current is not None else None)
+    if parent_ctx is None:
+        sampled = random.random() < Config.TRACE_SAMPLE_RATE
+        trace_id = _new_id(16) if sampled else _UNSAMPLED.trace_id
+        parent_id = None
+    else:
+        sampled = parent_ctx.sampled
+        trace_id = parent_ctx.trace_id
+        parent_id = parent_ctx.span_id
+
+    if not sampled:
+        # Keep the unsampled decision in context so children skip cheaply too
+        if current is not None and not current.context.sampled:
+            yield None
+            return
+        token = _current.set(Span(name, SpanContext(trace_id, _UNSAMPLED.span_id, False), None, None))
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+
+    s = Span(name, SpanContext(trace_id, _new_id(8), True), parent_id, attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _exporter.export(s)
+
+@contextmanager
+def attach(context):
+    """Make `context` (from current_context()) the parent for spans in this block."""
+    if context is None:
+        yield
+        return
+    token = _current.set(Span('remote', context, None, None))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def wrap(fn):
+    """Bind `fn` to the current trace context, for running on another thread."""
+    context = current_context()
+    def wrapped(*args, **kwargs):
+        with attach(context):
+            return fn(*args, **kwargs)
+    return wrapped
+
+def init_app(app):
+    """Trace every request and every SQL statement issued while it runs."""
+    from flask import g, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    def before_request():
+        parent = SpanContext.from_traceparent(request.headers.get('traceparent'))
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        cm = span(f"{request.method} {rule}", parent=parent, path=request.path)
+        g._trace_span = cm.__enter__()
+        g._trace_cm = cm
+
+    def after_request(response):
+        s = g.get('_trace_span')
+        if s is not None:
+            s.set('status_code', response.status_code)
+            response.headers['traceparent'] = s.context.traceparent()
+        return response
+
+    def teardown_request(exc):
+        cm = g.pop('_trace_cm', None)
+        if cm is not None:
+            if exc is not None:
+                cm.__exit__(type(exc), exc, exc.__traceback__)
+            else:
+                cm.__exit__(None, None, None)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        current = _current.get()
+        if current is not None and current.context.sampled:
+            cm = span('db.query', statement=statement[:500], executemany=executemany)
+            cm.__enter__()
+            context._trace_cm = cm
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        cm = getattr(context, '_trace_cm', None)
+        if cm is not None:
+            cm.__exit__(None, None, None)
+            context._trace_cm = None
+
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        cm = getattr(context, '_trace_cm', None) if context is not None else None
+        if cm is not None:
+            exc = exception_context.original_exception
+            cm.__exit__(type(exc), exc, exc.__traceback__)
+            context._trace_cm = None
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', handle_error)
+
+def _print_trace(spans):
+    children = defaultdict(list)
+    for s in spans:
+        children[s['parent_id']].append(s)
+    ids = {s['span_id'] for s in spans}
+    roots = [s for s in spans if s['parent_id'] not in ids]
+
+    def walk(s, depth):
+        attrs = {k: v for k, v in s['attributes'].items() if k != 'statement'}
+        label = s['attributes'].get('statement', '')[:80] if s['name'] == 'db.query' else attrs
+        print(f"{'  ' * depth}{s['name']:<30} {s['duration_ms']:>9.2f} ms  pid={s['pid']}  {label}")
+        for child in sorted(children[s['span_id']], key=lambda c: c['start_ns']):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda r: r['start_ns']):
+        walk(root, 0)
+
+def collect(port, out):
+    """Local collector stand-in: receive spans over UDP, append to `out`, print finished traces."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', port))
+    sock.settimeout(1.0)
+    pending = defaultdict(list)
+    last_seen = {}
+    print(f"Collecting spans on udp://127.0.0.1:{port}, writing {out}")
+    with open(out, 'a') as f:
+        while True:
+            try:
+                data, _ = sock.recvfrom(65535)
+                f.write(data.decode() + '\n')
+                s = json.loads(data)
+                pending[s['trace_id']].append(s)
+                last_seen[s['trace_id']] = time.time()
+            except socket.timeout:
+                pass
+            f.flush()
+            # A trace is printed once no span has arrived for it for 2 seconds
+            for trace_id in [t for t, seen in last_seen.items() if time.time() - seen > 2]:
+                print(f"\ntrace {trace_id}")
+                _print_trace(pending.pop(trace_id))
+                del last_seen[trace_id]
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace collector stand-in")
+    sub = parser.add_subparsers(dest='command', required=True)
+    c = sub.add_parser('collect', help='receive spans over UDP')
+    c.add_argument('--port', type=int, default=6831)
+    c.add_argument('--out', default='traces.jsonl')
+    s = sub.add_parser('show', help='print span trees from a JSON-lines export')
+    s.add_argument('path', nargs='?', default=Config.TRACE_EXPORT_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        collect(args.port, args.out)
+    else:
+        traces = defaultdict(list)
+        with open(args.path) as f:
+            for line in f:
+                if line.strip():
+                    s = json.loads(line)
+                    traces[s['trace_id']].append(s)
+        for trace_id, spans in traces.items():
+            print(f"\ntrace {trace_id}")
+            _print_trace(spans)
+
+if __name__ == "__main__":
+    main()
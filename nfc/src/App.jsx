@@ -7,8 +7,10 @@ import './App.css';
 
 // Define server URL outside components
 const SERVER_URL = "http://localhost:7100";
+// The change feed is served by the async app (backend/asgi_app.py)
+const CHANGES_URL = "http://localhost:7102";
 
-const App = ({ server }) => {
+const App = ({ server, changesServer }) => {
   const [guitarExists, setGuitarExists] = useState(null);
   const location = useLocation();
 
@@ -40,7 +42,7 @@ const App = ({ server }) => {
   const nfcTagInt = new URLSearchParams(location.search).get('nfc');
   return (
     <div className='mainApp'>
-      <GuitarApp server={server} tag_id={nfcTagInt} guitarExists={guitarExists} />
+      <GuitarApp server={server} changesServer={changesServer} tag_id={nfcTagInt} guitarExists={guitarExists} />
     </div>
   );
 };
@@ -56,7 +58,7 @@ const MainApp = () => (
   <Router>
     <Routes>
       <Route path="/" element={<Home />} />
-      <Route path="/nfc_tag" element={<App server={`${SERVER_URL}/nfc`} />} />
+      <Route path="/nfc_tag" element={<App server={`${SERVER_URL}/nfc`} changesServer={`${CHANGES_URL}/nfc`} />} />
       <Route path="*" element={<Navigate to="/" />} />
     </Routes>
   </Router>
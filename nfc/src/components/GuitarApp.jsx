@@ -16,7 +16,7 @@ const INITIAL_INSTRUMENT_STATE = {
   manufacture_date: ''
 };
 
-const InstrumentApp = ({ server, tag_id, guitarExists }) => {
+const InstrumentApp = ({ server, changesServer = server, tag_id, guitarExists }) => {
   // State Management
   const [instrument, setInstrument] = useState({ ...INITIAL_INSTRUMENT_STATE, tag_id: tag_id || '' });
   const [serialInput, setSerialInput] = useState('');
@@ -161,6 +161,31 @@ const InstrumentApp = ({ server, tag_id, guitarExists }) => {
     checkImage();
   }, [server, tag_id, guitarExists, fetchInstrument, checkImage]);
 
+  // Live updates: refetch when this tag's instrument changes elsewhere. EventSource
+  // reconnects on its own and resumes from the last event it received.
+  useEffect(() => {
+    if (!tag_id) return undefined;
+    const source = new EventSource(`${changesServer}/changes`);
+    const concernsThisTag = (change) =>
+      String(change.tag_id) === String(tag_id) ||
+      (instrument.dbid !== undefined && change.dbid === instrument.dbid) ||
+      (change.data.tag_ids || []).map(String).includes(String(tag_id)) ||
+      (change.data.dbids || []).includes(instrument.dbid);
+
+    const onInstrumentChange = (e) => {
+      if (concernsThisTag(JSON.parse(e.data))) fetchInstrument();
+    };
+    const onImageChange = (e) => {
+      if (concernsThisTag(JSON.parse(e.data))) checkImage();
+    };
+
+    ['paired', 'unpaired', 'storage_moved', 'instrument_deleted'].forEach((kind) =>
+      source.addEventListener(kind, onInstrumentChange));
+    source.addEventListener('image_uploaded', onImageChange);
+    source.addEventListener('reset', fetchInstrument);
+    return () => source.close();
+  }, [changesServer, tag_id, instrument.dbid, fetchInstrument, checkImage]);
+
   // Render Helpers
   const renderPairingForm = () => (
     <Form onSubmit={handlePairSubmit}>